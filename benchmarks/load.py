@@ -0,0 +1,497 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from benchmarks.pipeline import MEDIA_DIR, _percentile
+from benchmarks.standins import (
+    UPLOAD_METHODS,
+    FakeBotApi,
+    MediaSource,
+    SourceVideo,
+    build_application,
+    configure_environment,
+    have_ffmpeg,
+    message_update,
+    synthetic_video,
+)
+
+KINDS = ("valid", "duplicate", "invalid", "oversized")
+# A step is saturated once jobs finish slower than this share of the rate
+# they were offered at, or its p95 time-to-delivery grows past this
+# multiple of the first step's.
+_SATURATED_THROUGHPUT = 0.9
+_SATURATED_LATENCY = 3.0
+_TELEGRAM_RETRIES = 3
+
+
+@dataclass
+class Sent:
+    kind: str
+    update_id: int
+    chat_id: int
+    sent: float
+    step: int
+
+
+class FoldedStackSampler:
+    # Samples every thread's Python stack and writes them in the folded
+    # format flamegraph.pl and speedscope read ("a;b;c <count>").
+    def __init__(self, path: str, interval: float = 0.005):
+        self.path = path
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                                 f":{code.co_firstlineno})")
+                    frame = frame.f_back
+                thread = names.get(ident) or str(ident)
+                self.samples[";".join([thread, *reversed(stack)])] += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with open(self.path, "w", encoding="utf-8") as handle:
+            for stack, count in self.samples.most_common():
+                handle.write(f"{stack} {count}\n")
+
+
+class Traffic:
+    # Produces the update mix. Duplicates redeliver an earlier update with
+    # the same update_id, like Telegram does when a webhook ack is late.
+    def __init__(self, mix: dict[str, float], source: MediaSource, catalogue: int,
+                 users: int, seed: int):
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.source = source
+        self.catalogue = catalogue
+        self.users = users
+        self.random = random.Random(seed)
+        self.next_update_id = 1
+        self.deliverable: list[dict] = []
+
+    def next(self) -> tuple[str, dict]:
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        if kind == "duplicate" and self.deliverable:
+            return kind, self.random.choice(self.deliverable)
+        if kind == "duplicate":
+            kind = "valid"
+        update_id = self.next_update_id
+        self.next_update_id += 1
+        user_id = self.random.randrange(self.users) + 1
+        if kind == "invalid":
+            text = self.random.choice((
+                "https://example.com/watch?v=abc",
+                "hello there",
+                "https://vimeo.com/123456",
+            ))
+        elif kind == "oversized":
+            text = self.source.url(f"big{self.random.randrange(self.catalogue):03d}")
+        else:
+            text = self.source.url(f"clip{self.random.randrange(self.catalogue):03d}")
+        update = message_update(update_id, chat_id=-user_id, user_id=user_id, text=text)
+        if kind != "invalid":
+            self.deliverable.append(update)
+        return kind, update
+
+
+class ProcessUpdateDriver:
+    # Feeds updates straight into Application.process_update, the path
+    # polling mode uses.
+    name = "process_update"
+
+    def __init__(self, application, concurrency: int):
+        self.application = application
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.tasks: set[asyncio.Task] = set()
+        self.errors = 0
+
+    async def start(self) -> None:
+        await self.application.initialize()
+
+    async def _process(self, data: dict) -> None:
+        from telegram import Update
+
+        async with self.semaphore:
+            try:
+                await self.application.process_update(
+                    Update.de_json(data, self.application.bot))
+            except Exception:
+                self.errors += 1
+
+    def send(self, data: dict) -> None:
+        task = asyncio.create_task(self._process(data))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def settle(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    async def stop(self) -> None:
+        await self.application.shutdown()
+
+    def stats(self) -> dict:
+        return {"handler_errors": self.errors}
+
+
+class WebhookDriver:
+    # POSTs updates to the native webhook server, retrying 503s the way
+    # Telegram does.
+    name = "webhook"
+
+    def __init__(self, application, concurrency: int):
+        # Imported late: src/ reads its configuration at import time.
+        from benchmarks.webhook_ingest import _post
+        from src.http_server import HttpServer
+        from src.webhook import UpdateIngress
+
+        self._post_update = _post
+        self.application = application
+        self.ingress = UpdateIngress(application, secret_token=None)
+        self.server = HttpServer("127.0.0.1", 0)
+        self.server.add_route("/hook", self.ingress.handle_webhook, methods=("POST",))
+        self.connections: asyncio.Queue = asyncio.Queue()
+        self.concurrency = concurrency
+        self.tasks: set[asyncio.Task] = set()
+        self.statuses: Counter[int] = Counter()
+        self.ack_seconds: list[float] = []
+
+    async def start(self) -> None:
+        await self.application.initialize()
+        await self.server.start()
+        self.ingress.start()
+        for _ in range(self.concurrency):
+            self.connections.put_nowait(None)
+
+    async def _post(self, data: dict) -> None:
+        body = json.dumps(data).encode()
+        host = f"127.0.0.1:{self.server.bound_port}"
+        for _ in range(_TELEGRAM_RETRIES + 1):
+            connection = await self.connections.get()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection(
+                        "127.0.0.1", self.server.bound_port)
+                started = time.monotonic()
+                status, keep_alive = await self._post_update(*connection, host, body)
+                self.ack_seconds.append(time.monotonic() - started)
+                if not keep_alive:
+                    connection[1].close()
+                    connection = None
+            except OSError:
+                status, connection = 0, None
+            finally:
+                self.connections.put_nowait(connection)
+            self.statuses[status] += 1
+            if status == 200:
+                return
+            await asyncio.sleep(1)
+
+    def send(self, data: dict) -> None:
+        task = asyncio.create_task(self._post(data))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def settle(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+        await self.ingress.queue.join()
+
+    async def stop(self) -> None:
+        await self.ingress.stop()
+        await self.server.stop()
+        while not self.connections.empty():
+            connection = self.connections.get_nowait()
+            if connection is not None:
+                connection[1].close()
+        await self.application.shutdown()
+
+    def stats(self) -> dict:
+        acks = self.ack_seconds
+        return {
+            "ack_statuses": dict(self.statuses),
+            "ack_p99_ms": round(_percentile(acks, 0.99) * 1000, 2) if acks else None,
+            "duplicates_dropped": self.ingress.duplicates_dropped,
+            "rejected_full": self.ingress.rejected_full,
+        }
+
+
+def _outcomes(api: FakeBotApi, sent: list[Sent]) -> dict[int, dict]:
+    # Ties the bot's API calls back to the update that caused them: replies
+    # quote the request, edits and deletes target the status message.
+    replies: dict[tuple[int, int], list] = defaultdict(list)
+    status_owner: dict[tuple[int, int], tuple[int, int]] = {}
+    for call in api.calls:
+        if call.reply_to is not None and call.chat_id is not None:
+            replies[(call.chat_id, call.reply_to)].append(call)
+            if call.method == "sendMessage" and call.message_id is not None:
+                status_owner[(call.chat_id, call.message_id)] = (call.chat_id, call.reply_to)
+    edits: dict[tuple[int, int], list] = defaultdict(list)
+    for call in api.calls:
+        if call.method == "editMessageText" and call.chat_id is not None:
+            owner = status_owner.get((call.chat_id, call.message_id))
+            if owner is not None:
+                edits[owner].append(call)
+
+    results = {}
+    for item in sent:
+        if item.kind == "duplicate":
+            continue
+        key = (item.chat_id, item.update_id)
+        calls = sorted(replies[key] + edits[key], key=lambda call: call.finished)
+        first = next((call for call in calls if call.method == "sendMessage"), None)
+        documents = [call for call in calls if call.method in UPLOAD_METHODS]
+        texts = [call.text or "" for call in calls if call.text]
+        if documents:
+            outcome, done = "delivered", documents[0].finished
+        elif texts and texts[-1].startswith("✋"):
+            outcome, done = "refused", calls[-1].finished
+        elif texts and texts[-1].startswith("❌"):
+            outcome = "rejected" if item.kind == "invalid" else "failed"
+            done = calls[-1].finished
+        else:
+            outcome, done = "no_response", None
+        results[item.update_id] = {
+            "kind": item.kind,
+            "step": item.step,
+            "outcome": outcome,
+            "first_response": first.finished - item.sent if first else None,
+            "delivery": done - item.sent if done is not None else None,
+            "extra_documents": max(0, len(documents) - 1),
+        }
+    return results
+
+
+def _latency(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    return {f"p{int(q * 100)}_s": round(_percentile(samples, q), 3) for q in (0.5, 0.95, 0.99)}
+
+
+def _step_report(rate: float, window_planned: float, window: float,
+                 results: list[dict]) -> dict:
+    outcomes = Counter(result["outcome"] for result in results)
+    wanted = [r for r in results if r["kind"] != "invalid"]
+    delivered = [r for r in wanted if r["outcome"] == "delivered"]
+    answered = [r for r in wanted if r["outcome"] != "no_response"]
+    errors = sum(1 for r in wanted if r["outcome"] in ("failed", "no_response"))
+    return {
+        "offered_rate": rate,
+        "updates": len(results),
+        "outcomes": dict(outcomes),
+        "error_rate": round(errors / len(wanted), 3) if wanted else 0.0,
+        # The window runs until the step's backlog is cleared, so a bot that
+        # keeps up finishes jobs as fast as they are offered.
+        "offered_jobs_per_s": round(len(wanted) / window_planned, 3),
+        "finished_jobs_per_s": round(len(answered) / window, 3) if window > 0 else 0.0,
+        "delivered_per_s": round(len(delivered) / window, 3) if window > 0 else 0.0,
+        "duplicate_deliveries": sum(r["extra_documents"] for r in results),
+        "time_to_first_response": _latency(
+            [r["first_response"] for r in results if r["first_response"] is not None]),
+        "time_to_delivery": _latency([r["delivery"] for r in delivered]),
+    }
+
+
+def _saturation(steps: list[dict]) -> float | None:
+    baseline = steps[0]["time_to_delivery"].get("p95_s") if steps else None
+    for step in steps:
+        offered = step["offered_jobs_per_s"]
+        p95 = step["time_to_delivery"].get("p95_s")
+        if offered and step["finished_jobs_per_s"] < offered * _SATURATED_THROUGHPUT:
+            return step["offered_rate"]
+        if baseline and p95 and p95 > baseline * _SATURATED_LATENCY:
+            return step["offered_rate"]
+    return None
+
+
+async def _run(args, api: FakeBotApi, source: MediaSource, mix: dict[str, float]) -> dict:
+    application = build_application()
+    driver_class = WebhookDriver if args.target == "webhook" else ProcessUpdateDriver
+    driver = driver_class(application, args.concurrency)
+    traffic = Traffic(mix, source, args.catalogue, args.users, args.seed)
+    sent: list[Sent] = []
+    windows: list[float] = []
+    await driver.start()
+    try:
+        for step, rate in enumerate(args.rates):
+            peak = step == len(args.rates) - 1
+            sampler = FoldedStackSampler(args.flamegraph) if peak and args.flamegraph else None
+            profiler = None
+            if peak and args.profile_command:
+                profiler = subprocess.Popen(shlex.split(args.profile_command.format(
+                    pid=os.getpid(), seconds=int(args.step_seconds) + 1)))
+            if sampler is not None:
+                sampler.start()
+            step_began = time.monotonic()
+            total = max(1, int(rate * args.step_seconds))
+            for index in range(total):
+                due = step_began + (index / rate)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                kind, data = traffic.next()
+                sent.append(Sent(kind, data["update_id"], data["message"]["chat"]["id"],
+                                 time.monotonic(), step))
+                driver.send(data)
+            await driver.settle()
+            windows.append(time.monotonic() - step_began)
+            if sampler is not None:
+                sampler.stop()
+            if profiler is not None:
+                profiler.wait()
+            print(f"step {step + 1}/{len(args.rates)}: {total} updates at {rate:g}/s "
+                  f"settled in {windows[-1]:.1f}s", flush=True)
+    finally:
+        await driver.stop()
+
+    outcomes = _outcomes(api, sent)
+    steps = []
+    for step, rate in enumerate(args.rates):
+        results = [result for result in outcomes.values() if result["step"] == step]
+        step_sent = [item for item in sent if item.step == step]
+        report = _step_report(rate, args.step_seconds, windows[step], results)
+        report["duplicates_sent"] = sum(1 for item in step_sent if item.kind == "duplicate")
+        steps.append(report)
+    return {
+        "target": driver.name,
+        "steps": steps,
+        "saturation_rate": _saturation(steps),
+        "driver": driver.stats(),
+        "api_calls": dict(api.methods),
+    }
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown update kind {kind!r}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def _print_report(report: dict) -> None:
+    print(f"target: {report['target']}")
+    for step in report["steps"]:
+        ttfr, ttd = step["time_to_first_response"], step["time_to_delivery"]
+        print(
+            f"{step['offered_rate']:6g}/s  n={step['updates']:4d}  "
+            f"jobs offered {step['offered_jobs_per_s']:.2f}/s finished {step['finished_jobs_per_s']:.2f}/s "
+            f"delivered {step['delivered_per_s']:.2f}/s  "
+            f"errors {step['error_rate']:.1%}  dup deliveries {step['duplicate_deliveries']}"
+        )
+        if ttfr:
+            print(f"          first response p50={ttfr['p50_s']:.3f}s p95={ttfr['p95_s']:.3f}s "
+                  f"p99={ttfr['p99_s']:.3f}s")
+        if ttd:
+            print(f"          delivery       p50={ttd['p50_s']:.3f}s p95={ttd['p95_s']:.3f}s "
+                  f"p99={ttd['p99_s']:.3f}s")
+        print(f"          outcomes {step['outcomes']}")
+    saturation = report["saturation_rate"]
+    print(f"saturation point: {f'{saturation:g} updates/s' if saturation else 'not reached'}")
+    print(f"driver: {report['driver']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Step load test of the bot against a local Bot API and media source.")
+    parser.add_argument("--target", choices=("process_update", "webhook"),
+                        default="process_update")
+    parser.add_argument("--rates", type=lambda v: [float(r) for r in v.split(",")],
+                        default=[0.5, 1, 2, 4], help="Updates per second for each step.")
+    parser.add_argument("--step-seconds", type=float, default=15)
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Updates in flight (process_update) or webhook connections.")
+    parser.add_argument("--mix", type=_parse_mix,
+                        default=_parse_mix("valid=0.6,duplicate=0.1,invalid=0.2,oversized=0.1"))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--catalogue", type=int, default=20)
+    parser.add_argument("--max-jobs", type=int, default=2, help="MAX_CONCURRENT_JOBS.")
+    parser.add_argument("--video-seconds", type=float, default=10)
+    parser.add_argument("--video-mb", type=float, default=4)
+    parser.add_argument("--upload-limit-mb", type=int, default=50)
+    parser.add_argument("--api-mbps", type=float, default=200)
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    parser.add_argument("--source-mbps", type=float, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--flamegraph", metavar="PATH",
+                        help="Write folded stacks sampled during the last (peak) step.")
+    parser.add_argument("--profile-command", metavar="CMD",
+                        help="Run during the peak step, e.g. "
+                             "'py-spy record -o flame.svg -p {pid} -d {seconds}'.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.mix.get("oversized") and not have_ffmpeg():
+        print("ffmpeg not found: oversized videos are placeholders and will fail to compress")
+
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    regular = synthetic_video(MEDIA_DIR, args.video_seconds, args.video_mb)
+    oversized = synthetic_video(MEDIA_DIR, args.video_seconds * 4, args.upload_limit_mb * 1.5)
+    api = FakeBotApi(bandwidth_mbps=args.api_mbps, latency_ms=args.api_latency_ms)
+    source = MediaSource(bandwidth_mbps=args.source_mbps)
+    api.start()
+    source.start()
+    for index in range(args.catalogue):
+        source.add(SourceVideo(f"clip{index:03d}", regular, f"Clip {index}",
+                               duration=args.video_seconds))
+        source.add(SourceVideo(f"big{index:03d}", oversized, f"Long clip {index}",
+                               duration=args.video_seconds * 4))
+
+    with tempfile.TemporaryDirectory(prefix="bench-load-") as workdir:
+        configure_environment(
+            api, source, workdir,
+            MAX_CONCURRENT_JOBS=args.max_jobs,
+            MAX_UPLOAD_SIZE_MB=args.upload_limit_mb,
+            MEDIA_CACHE_MAX_MB=0,
+            DISK_RESERVE_MB=0,
+        )
+        import src.main  # noqa: F401  (configures logging)
+        from src.downloader import warm_up_extractor
+
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        warm_up_extractor()
+        try:
+            report = asyncio.run(_run(args, api, source, args.mix))
+        finally:
+            api.stop()
+            source.stop()
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
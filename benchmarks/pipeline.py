@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.standins import (
+    UPLOAD_METHODS,
+    FakeBotApi,
+    MediaSource,
+    SourceVideo,
+    build_application,
+    configure_environment,
+    have_ffmpeg,
+    message_update,
+    synthetic_video,
+)
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "results", "pipeline.jsonl")
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), "tg-download-bot-bench")
+STAGES = ("queue", "download", "compress", "fused", "remux", "upload", "total")
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _summary(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_s": round(statistics.fmean(samples), 3),
+        "p50_s": round(_percentile(samples, 0.5), 3),
+        "p95_s": round(_percentile(samples, 0.95), 3),
+        "max_s": round(max(samples), 3),
+    }
+
+
+def _disk_write_bytes() -> int | None:
+    try:
+        with open("/proc/self/io", encoding="ascii") as handle:
+            for line in handle:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _git_revision() -> tuple[str, bool]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    check=True, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def _instrument(stages: dict[str, list[float]], started: dict[int, float]) -> None:
+    # Times the pipeline stages by wrapping them where handle_download
+    # looks them up, so the code under test runs unchanged.
+    import src.main
+
+    download_video = src.main.download_video
+    compress = src.main._compress_video_to_limit
+    remux = src.main._remux_faststart
+    fused = src.main._fused_transcode
+    download_and_send = src.main._download_and_send
+
+    def timed_download(*args, **kwargs):
+        began = time.monotonic()
+        try:
+            return download_video(*args, **kwargs)
+        finally:
+            stages["download"].append(time.monotonic() - began)
+
+    async def timed_compress(*args, **kwargs):
+        began = time.monotonic()
+        try:
+            return await compress(*args, **kwargs)
+        finally:
+            stages["compress"].append(time.monotonic() - began)
+
+    async def timed_fused(*args, **kwargs):
+        began = time.monotonic()
+        try:
+            return await fused(*args, **kwargs)
+        finally:
+            stages["fused"].append(time.monotonic() - began)
+
+    async def timed_remux(*args, **kwargs):
+        began = time.monotonic()
+        try:
+            return await remux(*args, **kwargs)
+        finally:
+            stages["remux"].append(time.monotonic() - began)
+
+    async def timed_download_and_send(msg, *args, **kwargs):
+        if msg.message_id in started:
+            stages["queue"].append(time.monotonic() - started[msg.message_id])
+        return await download_and_send(msg, *args, **kwargs)
+
+    src.main.download_video = timed_download
+    src.main._compress_video_to_limit = timed_compress
+    src.main._remux_faststart = timed_remux
+    src.main._fused_transcode = timed_fused
+    src.main._download_and_send = timed_download_and_send
+
+
+async def _run(args, api: FakeBotApi, source: MediaSource, urls: list[str]) -> dict:
+    from telegram import Update
+
+    application = build_application()
+    stages: dict[str, list[float]] = defaultdict(list)
+    started: dict[int, float] = {}
+    _instrument(stages, started)
+    await application.initialize()
+
+    async def submit(index: int, url: str) -> None:
+        update_id = index + 1
+        update = Update.de_json(
+            message_update(update_id, chat_id=-(1000 + index % args.chats),
+                           user_id=index % args.users + 1, text=url),
+            application.bot)
+        started[update_id] = time.monotonic()
+        await application.process_update(update)
+        stages["total"].append(time.monotonic() - started[update_id])
+
+    cpu_before, disk_before = _cpu_seconds(), _disk_write_bytes()
+    began = time.monotonic()
+    try:
+        await asyncio.gather(*(submit(index, url) for index, url in enumerate(urls)))
+    finally:
+        elapsed = time.monotonic() - began
+        await application.shutdown()
+    disk_after = _disk_write_bytes()
+
+    uploads = [call for call in api.calls if call.method in UPLOAD_METHODS]
+    stages["upload"] = [call.finished - call.started for call in uploads]
+    delivered = len(uploads)
+    return {
+        "jobs": len(urls),
+        "delivered": delivered,
+        "failed": len(urls) - delivered,
+        "elapsed_s": round(elapsed, 2),
+        "jobs_per_min": round(delivered / elapsed * 60, 2),
+        "cpu_s": round(_cpu_seconds() - cpu_before, 2),
+        "bytes": {
+            "downloaded": source.bytes_served,
+            "uploaded": sum(call.upload_bytes for call in uploads),
+            "disk_written": (disk_after - disk_before
+                             if disk_before is not None and disk_after is not None else None),
+            "api_requests": sum(api.methods.values()),
+        },
+        "stages": {stage: _summary(stages[stage]) for stage in STAGES},
+    }
+
+
+def _store(record: dict, path: str) -> dict | None:
+    # Appends the run and returns the latest earlier run with the same
+    # parameters, for comparison across commits.
+    previous = None
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                entry = json.loads(line)
+                if entry.get("params") == record["params"]:
+                    previous = entry
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write(json.dumps(record) + "\n")
+    return previous
+
+
+def _print_report(record: dict, previous: dict | None) -> None:
+    result = record["results"]
+    print(f"commit {record['commit']}{' (dirty)' if record['dirty'] else ''}: "
+          f"{result['delivered']}/{result['jobs']} delivered in {result['elapsed_s']}s, "
+          f"{result['jobs_per_min']} jobs/min, CPU {result['cpu_s']}s")
+    for stage in STAGES:
+        summary = result["stages"][stage]
+        if summary["count"]:
+            print(f"{stage:>9}: p50={summary['p50_s']:7.3f}s  p95={summary['p95_s']:7.3f}s  "
+                  f"max={summary['max_s']:7.3f}s  n={summary['count']}")
+    copied = result["bytes"]
+    mb = 1024 * 1024
+    disk = (f"{copied['disk_written'] / mb:.1f}MB"
+            if copied["disk_written"] is not None else "n/a")
+    print(f"    bytes: downloaded {copied['downloaded'] / mb:.1f}MB, "
+          f"uploaded {copied['uploaded'] / mb:.1f}MB, disk writes {disk}, "
+          f"{copied['api_requests']} Bot API requests")
+    if previous is not None:
+        before = previous["results"]["jobs_per_min"]
+        change = (result["jobs_per_min"] - before) / before * 100 if before else 0.0
+        print(f"vs {previous['commit']} ({previous['timestamp']}): "
+              f"{before} -> {result['jobs_per_min']} jobs/min ({change:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="End-to-end pipeline benchmark against a local Bot API and media source.")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2,
+                        help="MAX_CONCURRENT_JOBS for the bot.")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--video-seconds", type=float, default=20)
+    parser.add_argument("--video-mb", type=float, default=8)
+    parser.add_argument("--oversized-every", type=int, default=4,
+                        help="Every Nth job exceeds the upload limit and is compressed (0 = none).")
+    parser.add_argument("--upload-limit-mb", type=int, default=50)
+    parser.add_argument("--delivery", choices=("document", "stream"), default="document",
+                        help="VIDEO_DELIVERY for the bot.")
+    parser.add_argument("--no-fused", action="store_true",
+                        help="FUSED_TRANSCODE=0: download oversized videos before compressing.")
+    parser.add_argument("--api-mbps", type=float, default=200,
+                        help="Bot API upload bandwidth (0 = unlimited).")
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    parser.add_argument("--source-mbps", type=float, default=400,
+                        help="Media source bandwidth per connection (0 = unlimited).")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    oversized_every = args.oversized_every
+    if oversized_every and not have_ffmpeg():
+        print("ffmpeg not found: using placeholder media and skipping the compression stage")
+        oversized_every = 0
+
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    regular = synthetic_video(MEDIA_DIR, args.video_seconds, args.video_mb)
+    oversized = (synthetic_video(MEDIA_DIR, args.video_seconds * 4, args.upload_limit_mb * 1.5)
+                 if oversized_every else None)
+
+    api = FakeBotApi(bandwidth_mbps=args.api_mbps, latency_ms=args.api_latency_ms)
+    source = MediaSource(bandwidth_mbps=args.source_mbps)
+    api.start()
+    source.start()
+    urls = []
+    for index in range(args.jobs):
+        video_id = f"bench{index:04d}"
+        big = oversized_every and (index + 1) % oversized_every == 0
+        source.add(SourceVideo(
+            video_id,
+            oversized if big else regular,
+            title=f"Benchmark clip {index}",
+            duration=args.video_seconds * (4 if big else 1),
+        ))
+        urls.append(source.url(video_id))
+
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as workdir:
+        configure_environment(
+            api, source, workdir,
+            MAX_CONCURRENT_JOBS=args.concurrency,
+            MAX_UPLOAD_SIZE_MB=args.upload_limit_mb,
+            VIDEO_DELIVERY=args.delivery,
+            FUSED_TRANSCODE=0 if args.no_fused else 1,
+            MAX_PENDING_JOBS_PER_USER=0,
+            MEDIA_CACHE_MAX_MB=0,
+            DISK_RESERVE_MB=0,
+        )
+        import src.main  # noqa: F401  (configures logging)
+        from src.downloader import warm_up_extractor
+
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+        # Like the health server does at start-up; also loads the plugins
+        # once instead of racing in the first concurrent downloads.
+        warm_up_extractor()
+        try:
+            results = asyncio.run(_run(args, api, source, urls))
+        finally:
+            api.stop()
+            source.stop()
+
+    commit, dirty = _git_revision()
+    params = {key: value for key, value in vars(args).items()
+              if key not in ("results", "label", "verbose")}
+    params["oversized_every"] = oversized_every
+    record = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "label": args.label,
+        "params": params,
+        "results": results,
+    }
+    previous = _store(record, args.results)
+    _print_report(record, previous)
+
+
+if __name__ == "__main__":
+    main()
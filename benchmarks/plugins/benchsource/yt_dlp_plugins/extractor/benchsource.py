@@ -0,0 +1,45 @@
+from yt_dlp.extractor.common import InfoExtractor
+
+
+class BenchSourceIE(InfoExtractor):
+    # Resolves links served by benchmarks.standins.MediaSource. Only loaded
+    # when a benchmark adds benchmarks/plugins to yt-dlp's plugin dirs.
+    IE_NAME = "benchsource"
+    _VALID_URL = r"https?://127\.0\.0\.1:(?P<port>\d+)/youtube\.com/watch\?v=(?P<id>[\w-]+)"
+
+    def _real_extract(self, url):
+        port, video_id = self._match_valid_url(url).group("port", "id")
+        base = f"http://127.0.0.1:{port}"
+        meta = self._download_json(f"{base}/api/videos/{video_id}", video_id)
+        if meta.get("audio_filesize"):
+            formats = [{
+                "format_id": "video",
+                "url": f"{base}/media/{video_id}.mp4",
+                "ext": "mp4",
+                "filesize": meta["filesize"],
+                "vcodec": "avc1",
+                "acodec": "none",
+            }, {
+                "format_id": "audio",
+                "url": f"{base}/media/{video_id}.m4a",
+                "ext": "m4a",
+                "filesize": meta["audio_filesize"],
+                "vcodec": "none",
+                "acodec": "mp4a",
+            }]
+        else:
+            formats = [{
+                "format_id": "mp4",
+                "url": f"{base}/media/{video_id}.mp4",
+                "ext": "mp4",
+                "filesize": meta["filesize"],
+                "vcodec": "avc1",
+                "acodec": "mp4a",
+            }]
+        return {
+            "id": video_id,
+            "title": meta["title"],
+            "uploader": meta["uploader"],
+            "duration": meta["duration"],
+            "formats": formats,
+        }
@@ -0,0 +1,545 @@
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+# yt-dlp --plugin-dirs layout: <dir>/<package>/yt_dlp_plugins/extractor/.
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+BOT_TOKEN = "123456:BENCHMARK"
+# Bot API methods that deliver a finished download, by the field the sent
+# message carries the file in.
+UPLOAD_METHODS = {"sendDocument": "document", "sendVideo": "video", "sendAudio": "audio"}
+
+_BYTES_PER_MBIT = 125_000
+_FIELD_HEAD_LIMIT = 256 * 1024
+
+
+class _Pacer:
+    # Sleeps just long enough that `rate` bytes/s is never exceeded.
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self.started = time.monotonic()
+        self.sent = 0
+
+    def delay(self, amount: int) -> float:
+        self.sent += amount
+        if self.bytes_per_second <= 0:
+            return 0.0
+        return max(0.0, self.started + self.sent / self.bytes_per_second - time.monotonic())
+
+
+def _multipart_fields(head: bytes, boundary: bytes) -> tuple[dict[str, str], int]:
+    # Form fields sent before the first file part (httpx always writes them
+    # first), and where that file's content starts within `head`.
+    fields: dict[str, str] = {}
+    delimiter = b"--" + boundary
+    position = head.find(delimiter)
+    while position >= 0:
+        header_end = head.find(b"\r\n\r\n", position)
+        if header_end < 0:
+            break
+        headers = head[position + len(delimiter):header_end].decode("latin-1")
+        content_start = header_end + 4
+        disposition = next((line for line in headers.split("\r\n")
+                            if line.lower().startswith("content-disposition")), "")
+        if "filename=" in disposition:
+            return fields, content_start
+        next_position = head.find(b"\r\n" + delimiter, content_start)
+        if next_position < 0:
+            break
+        name = disposition.partition('name="')[2].partition('"')[0]
+        fields[name] = head[content_start:next_position].decode("utf-8", "replace")
+        position = next_position + 2
+    return fields, -1
+
+
+@dataclass
+class ApiCall:
+    method: str
+    chat_id: int | None
+    reply_to: int | None
+    message_id: int | None
+    started: float
+    finished: float
+    upload_bytes: int = 0
+    text: str | None = None
+
+
+class FakeBotApi:
+    # Local stand-in for the Bot API. Answers the methods the bot uses with
+    # plausible objects, reads uploads at `bandwidth_mbps` and adds
+    # `latency_ms` to every response. Every call is recorded with its chat,
+    # the message it replies to and its timing.
+    def __init__(self, bandwidth_mbps: float = 0.0, latency_ms: float = 0.0):
+        self.bytes_per_second = bandwidth_mbps * _BYTES_PER_MBIT
+        self.latency = latency_ms / 1000
+        self.calls: list[ApiCall] = []
+        self.methods: Counter[str] = Counter()
+        self.bytes_received = 0
+        self.port = 0
+        self._message_ids = itertools.count(100_000)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def start(self) -> int:
+        # Runs on its own loop thread so the server does not compete with
+        # the bot's event loop being measured.
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, "127.0.0.1", 0))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self.port
+
+    def stop(self) -> None:
+        if self._loop is None or self._server is None:
+            return
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _read_body(self, reader, headers: dict[str, str]) -> tuple[bytes, int]:
+        # Returns the first _FIELD_HEAD_LIMIT bytes and the total length;
+        # upload content beyond that is counted and dropped.
+        pacer = _Pacer(self.bytes_per_second)
+        head = bytearray()
+        total = 0
+
+        async def consume(chunk: bytes) -> None:
+            nonlocal total
+            total += len(chunk)
+            if len(head) < _FIELD_HEAD_LIMIT:
+                head.extend(chunk[:_FIELD_HEAD_LIMIT - len(head)])
+            delay = pacer.delay(len(chunk))
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                remaining = size
+                while remaining:
+                    chunk = await reader.read(min(remaining, 256 * 1024))
+                    if not chunk:
+                        raise ConnectionError("client went away")
+                    remaining -= len(chunk)
+                    await consume(chunk)
+                await reader.readline()
+        else:
+            remaining = int(headers.get("content-length", "0"))
+            while remaining:
+                chunk = await reader.read(min(remaining, 256 * 1024))
+                if not chunk:
+                    raise ConnectionError("client went away")
+                remaining -= len(chunk)
+                await consume(chunk)
+        return bytes(head), total
+
+    def _fields(self, headers: dict[str, str], head: bytes, total: int) -> tuple[dict[str, str], int]:
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            boundary = content_type.partition("boundary=")[2].strip('"').encode()
+            fields, file_start = _multipart_fields(head, boundary)
+            # Content minus the closing delimiter line.
+            upload = max(0, total - file_start - len(boundary) - 8) if file_start >= 0 else 0
+            return fields, upload
+        if content_type.startswith("application/json"):
+            payload = json.loads(head or b"{}")
+            return {key: value if isinstance(value, str) else json.dumps(value)
+                    for key, value in payload.items()}, 0
+        return {key: values[-1] for key, values in
+                parse_qs(head.decode("utf-8", "replace")).items()}, 0
+
+    def _message(self, method: str, fields: dict[str, str], message_id: int) -> dict[str, Any]:
+        chat_id = int(fields.get("chat_id") or 0)
+        message: dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Benchmark"},
+        }
+        if "text" in fields:
+            message["text"] = fields["text"]
+        if "caption" in fields:
+            message["caption"] = fields["caption"]
+        if method in UPLOAD_METHODS:
+            message[UPLOAD_METHODS[method]] = {
+                "file_id": f"file{message_id}",
+                "file_unique_id": f"u{message_id}",
+                # Required by Video and Audio; Document ignores them.
+                "width": int(fields.get("width") or 0),
+                "height": int(fields.get("height") or 0),
+                "duration": int(fields.get("duration") or 0),
+            }
+        return message
+
+    def _result(self, method: str, fields: dict[str, str]) -> tuple[Any, int | None]:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Benchmark",
+                    "username": "benchmark_bot", "can_join_groups": True,
+                    "can_read_all_group_messages": False,
+                    "supports_inline_queries": True}, None
+        if method == "sendMessage" or method in UPLOAD_METHODS:
+            message_id = next(self._message_ids)
+            return self._message(method, fields, message_id), message_id
+        if method == "editMessageText":
+            message_id = int(fields.get("message_id") or 0)
+            return self._message(method, fields, message_id), message_id
+        return True, None
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                target = request_line.split()[1].decode("latin-1")
+                headers: dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                started = time.monotonic()
+                head, total = await self._read_body(reader, headers)
+                fields, upload = self._fields(headers, head, total)
+                method = urlsplit(target).path.rsplit("/", 1)[-1]
+                result, message_id = self._result(method, fields)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                reply_to = fields.get("reply_to_message_id")
+                if "reply_parameters" in fields:
+                    reply_to = json.loads(fields["reply_parameters"]).get("message_id")
+                self.methods[method] += 1
+                self.bytes_received += total
+                self.calls.append(ApiCall(
+                    method=method,
+                    chat_id=int(fields["chat_id"]) if fields.get("chat_id") else None,
+                    reply_to=int(reply_to) if reply_to else None,
+                    message_id=message_id,
+                    started=started,
+                    finished=time.monotonic(),
+                    upload_bytes=upload,
+                    text=fields.get("text"),
+                ))
+                body = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+        except (ConnectionError, ValueError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+
+@dataclass
+class SourceVideo:
+    video_id: str
+    path: str
+    title: str
+    uploader: str = "Benchmark Channel"
+    duration: float = 0.0
+    # With an audio stream, `path` is video only and the pair is offered
+    # as separate DASH-style formats, like YouTube's.
+    audio_path: str | None = None
+    size: int = field(init=False)
+    audio_size: int = field(init=False)
+
+    def __post_init__(self):
+        self.size = os.path.getsize(self.path)
+        self.audio_size = os.path.getsize(self.audio_path) if self.audio_path else 0
+
+
+class MediaSource:
+    # Local stand-in for YouTube: /youtube.com/watch?v=<id> links resolve
+    # through the "benchsource" yt-dlp extractor to /api/videos/<id> and
+    # /media/<id>.mp4 (plus /media/<id>.m4a for split streams), served at
+    # `bandwidth_mbps` per connection. /ping
+    # answers like the bgutil PO token provider.
+    def __init__(self, bandwidth_mbps: float = 0.0):
+        self.bytes_per_second = bandwidth_mbps * _BYTES_PER_MBIT
+        self.videos: dict[str, SourceVideo] = {}
+        self.bytes_served = 0
+        self.requests: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_port if self._server else 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def url(self, video_id: str) -> str:
+        return f"{self.base_url}/youtube.com/watch?v={video_id}"
+
+    def add(self, video: SourceVideo) -> None:
+        self.videos[video.video_id] = video
+
+    def start(self) -> int:
+        source = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                with source._lock:
+                    source.requests[path.split("/")[1]] += 1
+                if path == "/ping":
+                    self._json({"version": "benchmark"})
+                elif path.startswith("/api/videos/"):
+                    video = source.videos.get(path.rsplit("/", 1)[-1])
+                    if video is None:
+                        self._json({"error": "not found"}, status=404)
+                        return
+                    self._json({
+                        "id": video.video_id,
+                        "title": video.title,
+                        "uploader": video.uploader,
+                        "duration": video.duration,
+                        "filesize": video.size,
+                        "audio_filesize": video.audio_size,
+                    })
+                elif path.startswith("/media/"):
+                    video_id, _, ext = path.rsplit("/", 1)[-1].partition(".")
+                    video = source.videos.get(video_id)
+                    if video is None or (ext == "m4a" and not video.audio_path):
+                        self.send_error(404)
+                        return
+                    if ext == "m4a":
+                        self._send_file(video.audio_path, video.audio_size, "audio/mp4")
+                    else:
+                        self._send_file(video.path, video.size, "video/mp4")
+                else:
+                    self.send_error(404)
+
+            def _json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_file(self, file_path: str, size: int, content_type: str):
+                start, end = 0, size - 1
+                byte_range = self.headers.get("Range", "")
+                if byte_range.startswith("bytes="):
+                    first, _, last = byte_range[6:].partition("-")
+                    start = int(first or 0)
+                    end = min(end, int(last)) if last else end
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                pacer = _Pacer(source.bytes_per_second)
+                with open(file_path, "rb") as handle:
+                    handle.seek(start)
+                    remaining = end - start + 1
+                    while remaining:
+                        chunk = handle.read(min(remaining, 64 * 1024))
+                        if not chunk:
+                            break
+                        try:
+                            self.wfile.write(chunk)
+                        except (BrokenPipeError, ConnectionResetError):
+                            return
+                        remaining -= len(chunk)
+                        with source._lock:
+                            source.bytes_served += len(chunk)
+                        delay = pacer.delay(len(chunk))
+                        if delay > 0:
+                            time.sleep(delay)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.port
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def have_ffmpeg() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def synthetic_video(folder: str, seconds: float, size_mb: float) -> str:
+    # A real H.264/AAC MP4 of about `size_mb` (CBR with filler, so the
+    # test pattern does not compress below the target). Without ffmpeg a
+    # placeholder of the same size is written; it downloads and uploads
+    # like a video but cannot be compressed.
+    path = os.path.join(folder, f"synthetic-{seconds:g}s-{size_mb:g}mb.mp4")
+    if os.path.exists(path):
+        return path
+    if not have_ffmpeg():
+        with open(path, "wb") as handle:
+            handle.write(b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom")
+            block = os.urandom(1024 * 1024)
+            remaining = int(size_mb * 1024 * 1024)
+            while remaining > 0:
+                handle.write(block[:remaining])
+                remaining -= len(block)
+        return path
+    video_kbps = max(100, int(size_mb * 8192 / seconds) - 64)
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+            "-t", f"{seconds:g}",
+            "-c:v", "libx264", "-preset", "ultrafast",
+            "-b:v", f"{video_kbps}k", "-minrate", f"{video_kbps}k",
+            "-maxrate", f"{video_kbps}k", "-bufsize", f"{video_kbps}k",
+            "-x264-params", "nal-hrd=cbr:force-cfr=1",
+            "-c:a", "aac", "-b:a", "64k",
+            "-movflags", "+faststart",
+            path,
+        ],
+        check=True,
+    )
+    return path
+
+
+def synthetic_streams(folder: str, seconds: float, video_mb: float,
+                      audio_mb: float) -> tuple[str, str]:
+    # Separate video-only and audio-only MP4s of about the given sizes,
+    # or placeholders of the same sizes without ffmpeg.
+    video_path = os.path.join(folder, f"synthetic-{seconds:g}s-{video_mb:g}mb.video.mp4")
+    audio_path = os.path.join(folder, f"synthetic-{seconds:g}s-{audio_mb:g}mb.audio.m4a")
+    if not have_ffmpeg():
+        for path, size_mb in ((video_path, video_mb), (audio_path, audio_mb)):
+            if not os.path.exists(path):
+                with open(path, "wb") as handle:
+                    handle.write(os.urandom(int(size_mb * 1024 * 1024)))
+        return video_path, audio_path
+    if not os.path.exists(video_path):
+        video_kbps = max(100, int(video_mb * 8192 / seconds))
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+                "-t", f"{seconds:g}", "-an",
+                "-c:v", "libx264", "-preset", "ultrafast",
+                "-b:v", f"{video_kbps}k", "-minrate", f"{video_kbps}k",
+                "-maxrate", f"{video_kbps}k", "-bufsize", f"{video_kbps}k",
+                "-x264-params", "nal-hrd=cbr:force-cfr=1",
+                video_path,
+            ],
+            check=True,
+        )
+    if not os.path.exists(audio_path):
+        # AAC tops out well below most targets; 320k is as large as it gets.
+        audio_kbps = min(320, max(32, int(audio_mb * 8192 / seconds)))
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", "anoisesrc=sample_rate=48000",
+                "-t", f"{seconds:g}", "-vn",
+                "-c:a", "aac", "-b:a", f"{audio_kbps}k",
+                audio_path,
+            ],
+            check=True,
+        )
+    return video_path, audio_path
+
+
+def configure_environment(api: FakeBotApi, source: MediaSource, workdir: str,
+                          **settings: Any) -> None:
+    # Must run before anything under src/ is imported: the bot reads its
+    # configuration from the environment at import time.
+    os.environ.update({
+        "BOT_TOKEN": BOT_TOKEN,
+        "TELEGRAM_BOT_API_BASE_URL": api.base_url,
+        "TELEGRAM_BOT_API_FILE_URL": f"http://127.0.0.1:{api.port}/file/bot",
+        "YTDLP_BGUTIL_BASE_URL": source.base_url,
+        "JOB_QUEUE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "JOB_WORKSPACE_ROOT": os.path.join(workdir, "jobs"),
+        "MEDIA_CACHE_DIR": os.path.join(workdir, "cache"),
+        "YTDLP_CACHE_DIR": os.path.join(workdir, "yt-dlp-cache"),
+        "YTDLP_CACHE_WARMUP_URL": "",
+        "YTDLP_PROXIES": "",
+        "YTDLP_SOURCE_ADDRESSES": "",
+        "YTDLP_COOKIES_FILE": "",
+        "YTDLP_COOKIES_DIR": "",
+        "YTDLP_COOKIES_B64": "",
+    })
+    os.environ.update({key: str(value) for key, value in settings.items()})
+    from yt_dlp.plugins import plugin_dirs
+
+    if PLUGIN_DIR not in plugin_dirs.value:
+        plugin_dirs.value = [*plugin_dirs.value, PLUGIN_DIR]
+
+
+def message_update(update_id: int, chat_id: int, user_id: int, text: str) -> dict:
+    # Group chats make the bot quote the request in its replies, which is
+    # how FakeBotApi ties each reply back to the update that caused it.
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group", "title": "Benchmark"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "text": text,
+        },
+    }
+
+
+def build_application():
+    from telegram.ext import CommandHandler, InlineQueryHandler, MessageHandler, filters
+
+    from src.main import (
+        _application_builder,
+        _telegram_error_handler,
+        handle_audio,
+        handle_download,
+        handle_inline_query,
+        start,
+    )
+
+    application = _application_builder().build()
+    application.add_error_handler(_telegram_error_handler)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("audio", handle_audio))
+    application.add_handler(MessageHandler(
+        filters.TEXT & (~filters.COMMAND), handle_download))
+    application.add_handler(InlineQueryHandler(handle_inline_query))
+    return application
@@ -0,0 +1,123 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.standins import (
+    FakeBotApi,
+    MediaSource,
+    SourceVideo,
+    configure_environment,
+    have_ffmpeg,
+    synthetic_streams,
+)
+
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), "tg-download-bot-bench")
+MODES = ("sequential", "parallel")
+
+
+def _download_once(url: str, folder: str, parallel: bool, merge: bool) -> float:
+    # With ffmpeg this is the real download_video() (yt-dlp's own sequential
+    # download and merge vs. _download_and_merge). Without it nothing can
+    # be merged, so only the stream downloads are compared.
+    from src.downloader import _build_ydl_opts, _download_streams, download_video, probe_video
+
+    if merge:
+        began = time.monotonic()
+        file_path, error, _, _ = download_video(url, download_folder=folder,
+                                                parallel_streams=parallel)
+        elapsed = time.monotonic() - began
+        if error or not file_path:
+            raise RuntimeError(f"download failed: {error}")
+        return elapsed
+
+    info = probe_video(url)
+    if not info or len(info.get("requested_formats") or []) < 2:
+        raise RuntimeError("source did not offer split streams")
+    opts = _build_ydl_opts(max_size_mb=2000, cookiefile=None)
+    opts["outtmpl"] = f"{folder}/%(title)s.%(ext)s"
+    began = time.monotonic()
+    _download_streams(opts, info, parallel=parallel)
+    return time.monotonic() - began
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sequential vs parallel download of split video and audio streams "
+                    "from a local source throttled per connection.")
+    parser.add_argument("--video-mb", type=float, default=24)
+    parser.add_argument("--audio-mb", type=float, default=8)
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--source-mbps", type=float, default=80,
+                        help="Bandwidth per connection, like YouTube's per-stream throttle.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    merge = have_ffmpeg()
+    if not merge:
+        print("ffmpeg not found: comparing the stream downloads only, without the merge")
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    video_path, audio_path = synthetic_streams(MEDIA_DIR, args.seconds,
+                                               args.video_mb, args.audio_mb)
+
+    api = FakeBotApi()
+    source = MediaSource(bandwidth_mbps=args.source_mbps)
+    api.start()
+    source.start()
+    source.add(SourceVideo("split", video_path, title="Split streams",
+                           duration=args.seconds, audio_path=audio_path))
+    timings: dict[str, list[float]] = {mode: [] for mode in MODES}
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-streams-") as workdir:
+            configure_environment(api, source, workdir,
+                                  MEDIA_CACHE_MAX_MB=0, DISK_RESERVE_MB=0)
+            from src.downloader import warm_up_extractor
+
+            logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+            warm_up_extractor()
+            for repeat in range(args.repeats):
+                for mode in MODES:
+                    folder = os.path.join(workdir, f"{mode}-{repeat}")
+                    timings[mode].append(
+                        _download_once(source.url("split"), folder, mode == "parallel", merge))
+    finally:
+        api.stop()
+        source.stop()
+
+    video_size = os.path.getsize(video_path)
+    audio_size = os.path.getsize(audio_path)
+    sequential = statistics.median(timings["sequential"])
+    parallel = statistics.median(timings["parallel"])
+    result = {
+        "merge": merge,
+        "video_bytes": video_size,
+        "audio_bytes": audio_size,
+        "source_mbps": args.source_mbps,
+        "sequential_s": round(sequential, 3),
+        "parallel_s": round(parallel, 3),
+        "reduction": round(1 - parallel / sequential, 3),
+        # Streams at full per-connection speed: the wall time falls from
+        # (video + audio) to max(video, audio) transfer time.
+        "ideal_reduction": round(min(video_size, audio_size) / (video_size + audio_size), 3),
+        "runs": {mode: [round(value, 3) for value in values]
+                 for mode, values in timings.items()},
+    }
+    if args.json:
+        print(json.dumps(result))
+        return
+    mb = 1024 * 1024
+    print(f"video {video_size / mb:.1f}MB + audio {audio_size / mb:.1f}MB "
+          f"at {args.source_mbps:g} Mbit/s per connection"
+          f"{'' if merge else ' (download only)'}")
+    print(f"sequential: {sequential:.2f}s  parallel: {parallel:.2f}s  "
+          f"-> {result['reduction'] * 100:.0f}% less wall time "
+          f"(ideal {result['ideal_reduction'] * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
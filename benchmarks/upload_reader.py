@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+VARIANTS = ("read-whole-file", "file-handle", "mmap")
+
+
+async def _handle_sink(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # Reads and discards request bodies so the server adds no memory of its own.
+    try:
+        while True:
+            length = 0
+            line = await reader.readline()
+            if not line:
+                return
+            while line not in (b"\r\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+                line = await reader.readline()
+            while length:
+                chunk = await reader.read(min(length, 1024 * 1024))
+                if not chunk:
+                    return
+                length -= len(chunk)
+            body = b'{"ok": true, "result": true}'
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+def _start_sink() -> int:
+    ready = threading.Event()
+    port: list[int] = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(
+            asyncio.start_server(_handle_sink, "127.0.0.1", 0))
+        port.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return port[0]
+
+
+def _usage() -> tuple[float, float]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in KiB on Linux.
+    return usage.ru_maxrss / 1024, usage.ru_utime + usage.ru_stime
+
+
+async def _upload(variant: str, url: str, path: str) -> None:
+    from telegram import InputFile
+    from telegram.request import RequestData
+    from telegram.request._requestparameter import RequestParameter
+
+    from src.telegram_requests import _build_httpx_request
+    from src.upload import MmapUploadReader
+
+    request = _build_httpx_request(
+        pool_size=1, http_version="1.1", keepalive_expiry=30, read_timeout=600,
+        write_timeout=600, connect_timeout=10, pool_timeout=10,
+    )
+    await request.initialize()
+    try:
+        with open(path, "rb") as handle:
+            if variant == "read-whole-file":
+                # What reply_document(document=<file object>) does by default.
+                document = InputFile(handle, filename="video.mp4")
+                await _send(request, url, document, RequestData, RequestParameter)
+            elif variant == "file-handle":
+                document = InputFile(handle, filename="video.mp4",
+                                     read_file_handle=False)
+                await _send(request, url, document, RequestData, RequestParameter)
+            else:
+                with MmapUploadReader(handle) as body:
+                    document = InputFile(body, filename="video.mp4",
+                                         read_file_handle=False)
+                    await _send(request, url, document, RequestData, RequestParameter)
+    finally:
+        await request.shutdown()
+
+
+async def _send(request, url, document, request_data, request_parameter) -> None:
+    data = request_data([request_parameter.from_input("document", document)])
+    await request.do_request(url, "POST", data)
+
+
+def _child(variant: str, url: str, path: str) -> None:
+    # Imports happen before the baseline so only the upload itself is measured.
+    import telegram.request  # noqa: F401
+
+    import src.telegram_requests  # noqa: F401
+    import src.upload  # noqa: F401
+
+    base_rss, base_cpu = _usage()
+    started = time.perf_counter()
+    asyncio.run(_upload(variant, url, path))
+    elapsed = time.perf_counter() - started
+    peak_rss, cpu = _usage()
+    print(json.dumps({
+        "rss_growth_mb": peak_rss - base_rss,
+        "cpu_seconds": cpu - base_cpu,
+        "seconds": elapsed,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare upload bodies: whole-file read vs file handle vs mmap.")
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child, args.url, args.file)
+        return
+
+    port = _start_sink()
+    url = f"http://127.0.0.1:{port}/botTEST/sendDocument"
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as handle:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            handle.write(block)
+    try:
+        gigabytes = args.size_mb / 1024
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.upload_reader",
+                 "--child", variant, "--url", url, "--file", handle.name],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output)
+            print(
+                f"{variant:>15}: peak RSS +{result['rss_growth_mb']:7.1f}MB  "
+                f"CPU {result['cpu_seconds'] / gigabytes:5.2f}s/GB  "
+                f"{args.size_mb / result['seconds']:7.0f}MB/s"
+            )
+    finally:
+        os.remove(handle.name)
+
+
+if __name__ == "__main__":
+    main()
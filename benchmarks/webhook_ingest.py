@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from unittest.mock import MagicMock
+
+from flask import Flask, request
+from telegram import Update
+from werkzeug.serving import make_server
+
+from src.http_server import HttpServer
+from src.webhook import UpdateIngress
+
+
+def _update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "text": "https://youtu.be/abc123",
+        },
+    }
+
+
+def _fake_application(processing_seconds: float):
+    async def process_update(update):
+        await asyncio.sleep(processing_seconds)
+
+    application = MagicMock()
+    application.bot = None
+    application.process_update = process_update
+    return application
+
+
+async def _post(reader, writer, host: str, body: bytes) -> tuple[int, bool]:
+    writer.write(
+        (
+            f"POST /hook HTTP/1.1\r\nHost: {host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode("latin-1") + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    keep_alive = status_line.startswith(b"HTTP/1.1")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+        elif name.lower() == "connection":
+            keep_alive = value.strip().lower() == "keep-alive"
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive
+
+
+async def _drive(port: int, total: int, concurrency: int) -> dict:
+    # A raw keep-alive client keeps load-generator overhead well below the
+    # server cost being measured.
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def client_loop():
+        nonlocal errors
+        connection = None
+        for update_id in counter:
+            body = json.dumps(_update(update_id)).encode()
+            started = time.perf_counter()
+            if connection is None:
+                connection = await asyncio.open_connection("127.0.0.1", port)
+            reader, writer = connection
+            status, keep_alive = await _post(
+                reader, writer, f"127.0.0.1:{port}", body)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+            if not keep_alive:
+                writer.close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _bench_flask(total: int, concurrency: int, processing_seconds: float) -> dict:
+    application = _fake_application(processing_seconds)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    pending = []
+    app = Flask(__name__)
+
+    @app.route("/hook", methods=["POST"])
+    def webhook_handler():
+        update = Update.de_json(data=request.get_json(force=True), bot=None)
+        pending.append(asyncio.run_coroutine_threadsafe(
+            application.process_update(update), loop))
+        return "", 200
+
+    server = make_server("127.0.0.1", 0, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        return asyncio.run(_drive(
+            server.server_port, total, concurrency))
+    finally:
+        server.shutdown()
+        for future in pending:
+            future.result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def _bench_native(total: int, concurrency: int, processing_seconds: float) -> dict:
+    # The server gets its own loop thread so the load generator does not
+    # compete with it, mirroring how the Flask path is measured.
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    ingress = UpdateIngress(
+        _fake_application(processing_seconds),
+        secret_token=None,
+        queue_size=total,
+    )
+    server = HttpServer("127.0.0.1", 0)
+    server.add_route("/hook", ingress.handle_webhook, methods=("POST",))
+
+    async def start_server():
+        await server.start()
+        ingress.start()
+
+    async def stop_server():
+        await ingress.queue.join()
+        await ingress.stop()
+        await server.stop()
+
+    asyncio.run_coroutine_threadsafe(start_server(), loop).result()
+    try:
+        return asyncio.run(_drive(
+            server.bound_port, total, concurrency))
+    finally:
+        asyncio.run_coroutine_threadsafe(stop_server(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare webhook ingestion: Flask thread hop vs native asyncio server.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--processing-ms", type=float, default=5.0,
+                        help="Simulated handler time per update.")
+    args = parser.parse_args()
+    processing_seconds = args.processing_ms / 1000
+
+    results = {
+        "flask": _bench_flask(args.requests, args.concurrency, processing_seconds),
+        "native": _bench_native(args.requests, args.concurrency, processing_seconds),
+    }
+    for name, result in results.items():
+        print(
+            f"{name:>6}: {result['rps']:8.0f} req/s  "
+            f"p50={result['p50_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms  "
+            f"errors={result['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
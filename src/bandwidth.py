@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from .downloader import _CANCEL_DOWNLOADS, DEFAULT_CONCURRENT_FRAGMENTS
+
+logger = logging.getLogger(__name__)
+
+# Link capacity shared by downloads and uploads, in megabits per second;
+# 0 leaves downloads unpaced.
+LINK_BANDWIDTH_MBPS = float(os.getenv("LINK_BANDWIDTH_MBPS", "0"))
+# Taken off the download budget while any upload to Telegram is running.
+UPLOAD_RESERVE_MBPS = float(os.getenv("UPLOAD_RESERVE_MBPS", "0"))
+DEFAULT_FRAGMENT_CONCURRENCY = int(
+    os.getenv("FRAGMENT_CONCURRENCY", str(DEFAULT_CONCURRENT_FRAGMENTS)))
+MAX_FRAGMENT_CONCURRENCY = int(os.getenv("MAX_FRAGMENT_CONCURRENCY", "16"))
+
+_BYTES_PER_MBIT = 125_000
+_REBALANCE_SECONDS = 1.0
+_RATE_WINDOW_SECONDS = 1.0
+# A job using less than this share of its allocation is limited by its
+# source, and its leftover goes to the others.
+_SOURCE_LIMITED_RATIO = 0.8
+_MAX_SLEEP_SECONDS = 5.0
+
+
+class _JobMeter:
+    def __init__(self, key: str, fragment_concurrency: int):
+        self.key = key
+        self.fragment_concurrency = fragment_concurrency
+        self.allocation = 0.0  # bytes/s, 0 = unpaced
+        self.rate = 0.0  # measured bytes/s
+        self.total_bytes = 0
+        self.fragmented = False
+        self.paced_seconds = 0.0
+        self.started = time.monotonic()
+        self._tokens = 0.0
+        self._refilled_at = self.started
+        self._window_start = self.started
+        self._window_bytes = 0
+        self._seen: dict[str, int] = {}
+
+    def _consume(self, filename: str, downloaded: int, now: float) -> float:
+        # Returns how long the download thread should sleep.
+        delta = downloaded - self._seen.get(filename, 0)
+        self._seen[filename] = downloaded
+        if delta <= 0:
+            return 0.0
+        self.total_bytes += delta
+        self._window_bytes += delta
+        elapsed = now - self._window_start
+        if elapsed >= _RATE_WINDOW_SECONDS:
+            sample = self._window_bytes / elapsed
+            self.rate = sample if not self.rate else 0.5 * self.rate + 0.5 * sample
+            self._window_start = now
+            self._window_bytes = 0
+        if self.allocation <= 0:
+            return 0.0
+        # One second of burst at the current allocation.
+        self._tokens = min(self.allocation,
+                           self._tokens + (now - self._refilled_at) * self.allocation)
+        self._refilled_at = now
+        self._tokens -= delta
+        if self._tokens >= 0:
+            return 0.0
+        return min(_MAX_SLEEP_SECONDS, -self._tokens / self.allocation)
+
+
+class FragmentTuner:
+    # Hill-climbs the number of parallel fragment downloads on measured
+    # per-job throughput: keep moving while throughput improves by 5%,
+    # turn around when it does not.
+    def __init__(
+        self,
+        initial: int = DEFAULT_FRAGMENT_CONCURRENCY,
+        maximum: int = MAX_FRAGMENT_CONCURRENCY,
+    ):
+        self.maximum = max(1, maximum)
+        self.value = max(1, min(initial, self.maximum))
+        self._direction = 1
+        self._last_rate: float | None = None
+        self._lock = threading.Lock()
+
+    def record(self, concurrency: int, rate: float) -> None:
+        with self._lock:
+            if concurrency != self.value or rate <= 0:
+                return
+            if self._last_rate is not None and rate < self._last_rate * 1.05:
+                self._direction = -self._direction
+            self._last_rate = rate
+            self.value = max(1, min(self.maximum, self.value + self._direction))
+            logger.debug("Fragment concurrency %s -> %s (%.1fMB/s)",
+                         concurrency, self.value, rate / (1024 * 1024))
+
+
+class BandwidthManager:
+    # Shares the download budget between running jobs (max-min fair: jobs
+    # that cannot use their share hand the rest to the others) and keeps
+    # UPLOAD_RESERVE_MBPS free while uploads run. Downloads are paced from
+    # yt-dlp's progress hook, which runs on the download thread for every
+    # block, so the cap holds for plain HTTP and fragmented formats alike.
+    def __init__(
+        self,
+        link_mbps: float = LINK_BANDWIDTH_MBPS,
+        upload_reserve_mbps: float = UPLOAD_RESERVE_MBPS,
+        tuner: FragmentTuner | None = None,
+    ):
+        self.link_bytes = link_mbps * _BYTES_PER_MBIT
+        self.upload_reserve_bytes = upload_reserve_mbps * _BYTES_PER_MBIT
+        self.tuner = tuner or FragmentTuner()
+        self.uploads = 0
+        self._jobs: dict[str, _JobMeter] = {}
+        self._lock = threading.Lock()
+        self._rebalanced_at = 0.0
+
+    def download_budget(self) -> float:
+        if self.link_bytes <= 0:
+            return 0.0
+        if self.uploads:
+            return max(self.link_bytes * 0.1, self.link_bytes - self.upload_reserve_bytes)
+        return self.link_bytes
+
+    def _rebalance(self, now: float) -> None:
+        self._rebalanced_at = now
+        budget = self.download_budget()
+        meters = list(self._jobs.values())
+        if budget <= 0:
+            for meter in meters:
+                meter.allocation = 0.0
+            return
+
+        def demand(meter: _JobMeter) -> float:
+            if (meter.allocation > 0 and meter.rate > 0
+                    and now - meter.started > 2 * _RATE_WINDOW_SECONDS
+                    and meter.rate < meter.allocation * _SOURCE_LIMITED_RATIO):
+                return meter.rate * 1.2
+            return float("inf")
+
+        remaining = budget
+        ordered = sorted(meters, key=demand)
+        for index, meter in enumerate(ordered):
+            share = remaining / (len(ordered) - index)
+            meter.allocation = min(demand(meter), share)
+            remaining -= meter.allocation
+
+    def register(self, key: str) -> _JobMeter:
+        with self._lock:
+            meter = _JobMeter(key, self.tuner.value)
+            self._jobs[key] = meter
+            self._rebalance(time.monotonic())
+            return meter
+
+    def unregister(self, meter: _JobMeter) -> None:
+        with self._lock:
+            if self._jobs.get(meter.key) is meter:
+                del self._jobs[meter.key]
+            self._rebalance(time.monotonic())
+        elapsed = time.monotonic() - meter.started - meter.paced_seconds
+        # Paced jobs say nothing about what more fragments would achieve.
+        if meter.fragmented and elapsed > 0 and meter.paced_seconds < 0.1 * elapsed:
+            self.tuner.record(meter.fragment_concurrency, meter.total_bytes / elapsed)
+
+    def progress_hook(self, meter: _JobMeter) -> Callable[[dict[str, Any]], None]:
+        def hook(status: dict[str, Any]) -> None:
+            if status.get("status") != "downloading":
+                return
+            if status.get("fragment_count"):
+                meter.fragmented = True
+            now = time.monotonic()
+            with self._lock:
+                if now - self._rebalanced_at >= _REBALANCE_SECONDS:
+                    self._rebalance(now)
+                delay = meter._consume(status.get("filename") or "",
+                                       int(status.get("downloaded_bytes") or 0), now)
+            if delay > 0:
+                meter.paced_seconds += delay
+                _CANCEL_DOWNLOADS.wait(delay)
+
+        return hook
+
+    @contextmanager
+    def uploading(self) -> Iterator[None]:
+        with self._lock:
+            self.uploads += 1
+            self._rebalance(time.monotonic())
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.uploads -= 1
+                self._rebalance(time.monotonic())
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "download_budget_mbps": round(self.download_budget() / _BYTES_PER_MBIT, 1),
+                "active_uploads": self.uploads,
+                "fragment_concurrency": self.tuner.value,
+                "downloads": [
+                    {
+                        "allocation_mbps": round(meter.allocation / _BYTES_PER_MBIT, 1),
+                        "rate_mbps": round(meter.rate / _BYTES_PER_MBIT, 1),
+                    }
+                    for meter in self._jobs.values()
+                ],
+            }
+
+
+BANDWIDTH = BandwidthManager()
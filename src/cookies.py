@@ -0,0 +1,205 @@
+import base64
+import glob
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# First cooldown after an identity hits an anti-bot page or a 429; it
+# doubles with every consecutive hit up to COOKIE_MAX_COOLDOWN_SECONDS.
+COOKIE_COOLDOWN_SECONDS = float(os.getenv("COOKIE_COOLDOWN_SECONDS", "600"))
+COOKIE_MAX_COOLDOWN_SECONDS = float(
+    os.getenv("COOKIE_MAX_COOLDOWN_SECONDS", "21600"))
+_B64_VAR = re.compile(r"^YTDLP_COOKIES_B64(_\d+)?$")
+
+
+@dataclass
+class CookieIdentity:
+    name: str
+    path: str
+    in_use: int = 0
+    successes: int = 0
+    failures: int = 0
+    throttles: int = 0
+    consecutive_throttles: int = 0
+    last_used: float = 0.0
+    last_throttled: float = 0.0
+    cooldown_until: float = 0.0
+
+    def stats(self, now: float) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_use": self.in_use,
+            "successes": self.successes,
+            "failures": self.failures,
+            "throttles": self.throttles,
+            "cooling_down_seconds": max(0, round(self.cooldown_until - now)),
+        }
+
+
+def _write_b64_cookiefile(name: str, value: str) -> str | None:
+    try:
+        cookie_text = base64.b64decode(value, validate=True).decode("utf-8")
+    except Exception as exc:
+        logger.warning("Failed to decode %s: %s", name, exc)
+        return None
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix="yt-dlp-cookies-", suffix=".txt")
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(cookie_text)
+        os.chmod(temp_path, 0o600)
+    except Exception as exc:
+        logger.warning("Failed to create temporary cookie file: %s", exc)
+        return None
+    logger.info("Created temporary cookie file for %s: %s", name, temp_path)
+    return temp_path
+
+
+def _cookie_sources() -> list[tuple[str, str]]:
+    # (name, file path or base64 env var) for every configured identity.
+    sources = []
+    for path in filter(None, (p.strip() for p in
+                              os.getenv("YTDLP_COOKIES_FILE", "").split(","))):
+        sources.append((os.path.basename(path), path))
+    cookie_dir = os.getenv("YTDLP_COOKIES_DIR")
+    if cookie_dir:
+        for path in sorted(glob.glob(os.path.join(cookie_dir, "*.txt"))):
+            sources.append((os.path.basename(path), path))
+    for var in sorted(os.environ):
+        if _B64_VAR.match(var) and os.environ[var]:
+            sources.append((var, f"env:{var}"))
+    return sources
+
+
+class CookiePool:
+    # Cookie identities (one yt-dlp cookie file each) shared by all
+    # downloads. Each download takes the idle identity that was throttled
+    # longest ago, so load spreads round-robin across accounts; an identity
+    # that hits an anti-bot check sits out an exponentially growing
+    # cooldown while the others carry on.
+    def __init__(
+        self,
+        paths: list[str] | None = None,
+        cooldown: float = COOKIE_COOLDOWN_SECONDS,
+        max_cooldown: float = COOKIE_MAX_COOLDOWN_SECONDS,
+    ):
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # Without explicit paths the identities come from the environment.
+        self._from_env = paths is None
+        self.identities = [CookieIdentity(os.path.basename(path), path)
+                           for path in paths or []]
+        self._sources: list[tuple[str, str]] | None = None
+        self._b64_files: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _refresh_from_env(self) -> None:
+        # Environment changes (tests, reloads) rebuild the pool; unchanged
+        # sources keep their health state.
+        if not self._from_env:
+            return
+        sources = _cookie_sources()
+        if sources == self._sources:
+            return
+        known = {identity.name: identity for identity in self.identities}
+        identities = []
+        for name, source in sources:
+            if source.startswith("env:"):
+                var = source[4:]
+                value = os.environ[var]
+                path = self._b64_files.get(value)
+                if path is None or not os.path.exists(path):
+                    path = _write_b64_cookiefile(var, value)
+                    if path is None:
+                        continue
+                    self._b64_files[value] = path
+            else:
+                path = source
+                if not os.path.exists(path):
+                    logger.warning("Cookie file does not exist: %s", path)
+                    continue
+            identity = known.get(name)
+            if identity is None or identity.path != path:
+                identity = CookieIdentity(name, path)
+            identities.append(identity)
+        self.identities = identities
+        self._sources = sources
+        if identities:
+            logger.info("Cookie pool has %s identit%s: %s", len(identities),
+                        "y" if len(identities) == 1 else "ies",
+                        ", ".join(identity.name for identity in identities))
+        else:
+            logger.info("No cookies provided via YTDLP_COOKIES_FILE, "
+                        "YTDLP_COOKIES_DIR or YTDLP_COOKIES_B64")
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_from_env()
+            return len(self.identities)
+
+    def acquire(self) -> CookieIdentity | None:
+        with self._lock:
+            self._refresh_from_env()
+            if not self.identities:
+                return None
+            now = time.monotonic()
+            ready = [i for i in self.identities if i.cooldown_until <= now]
+            if ready:
+                identity = min(ready, key=lambda i: (i.in_use, i.last_throttled, i.last_used))
+            else:
+                identity = min(self.identities, key=lambda i: i.cooldown_until)
+                logger.warning("All cookie identities are cooling down; using %s",
+                               identity.name)
+            identity.in_use += 1
+            identity.last_used = now
+            return identity
+
+    def release(self, identity: CookieIdentity | None, outcome: str | None = None) -> None:
+        # `outcome` is "ok", "throttled" or "failed"; None (a cancelled
+        # download, say) says nothing about the identity's health.
+        if identity is None:
+            return
+        with self._lock:
+            identity.in_use = max(0, identity.in_use - 1)
+            if outcome == "ok":
+                identity.successes += 1
+                identity.consecutive_throttles = 0
+            elif outcome == "throttled":
+                now = time.monotonic()
+                identity.throttles += 1
+                identity.consecutive_throttles += 1
+                identity.last_throttled = now
+                cooldown = min(
+                    self.max_cooldown,
+                    self.cooldown * 2 ** (identity.consecutive_throttles - 1),
+                )
+                identity.cooldown_until = now + cooldown
+                logger.warning("Cookie identity %s throttled; cooling down for %.0fs",
+                               identity.name, cooldown)
+            elif outcome == "failed":
+                identity.failures += 1
+
+    def stats(self, with_names: bool = True) -> list[dict[str, Any]]:
+        # Without names, identities are reported by position: the file or
+        # variable name often identifies the account behind the cookies.
+        with self._lock:
+            now = time.monotonic()
+            entries = [identity.stats(now) for identity in self.identities]
+        if not with_names:
+            for index, entry in enumerate(entries):
+                entry["name"] = f"identity-{index}"
+        return entries
+
+    def available(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for i in self.identities if i.cooldown_until <= now)
+
+
+COOKIE_POOL = CookiePool()
@@ -1,22 +1,46 @@
 import threading
-import base64
 import json
 import logging
 import os
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import urllib.parse
 import urllib.request
-from typing import Any, Optional, Tuple, cast
+from typing import Any, Callable, Optional, Tuple, cast
 
-import yt_dlp
+from .cookies import COOKIE_POOL, CookieIdentity
+from .egress import ROUTE_POOL, EgressRoute
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_MAX_SIZE_MB = int(os.getenv("MAX_VIDEO_SIZE_MB", "2000"))
-_COOKIEFILE_CACHE: Optional[str] = None
-_COOKIE_LOCK = threading.Lock()
+DEFAULT_DOWNLOAD_FOLDER = "downloads"
+DEFAULT_CONCURRENT_FRAGMENTS = 5
 DEFAULT_BGUTIL_BASE_URL = os.getenv(
     "YTDLP_BGUTIL_BASE_URL", "http://127.0.0.1:4416"
 )
+# Fetch the video and audio of DASH formats at the same time instead of one
+# after the other; each stream is throttled separately at the source.
+PARALLEL_STREAMS = os.getenv("YTDLP_PARALLEL_STREAMS", "").lower() in ("1", "true", "yes")
+# yt-dlp's on-disk cache: the player JS preprocessed for the challenge
+# solver, signature timestamps and solved n/sig challenges. Every YoutubeDL
+# (and every worker sharing the volume) reads the same directory, so only
+# the first extraction after a player update pays for the solving. yt-dlp
+# writes entries to a temporary file and renames it into place, which keeps
+# concurrent writers safe. Empty disables the cache.
+YTDLP_CACHE_DIR = os.getenv(
+    "YTDLP_CACHE_DIR", os.path.join(DEFAULT_DOWNLOAD_FOLDER, "yt-dlp-cache"))
+# Extracted at start-up so the current player is solved before the first
+# user request; empty skips it.
+YTDLP_CACHE_WARMUP_URL = os.getenv(
+    "YTDLP_CACHE_WARMUP_URL", "https://www.youtube.com/watch?v=jNQXAC9IVRw")
+# Telegram only accepts JPEG thumbnails of at most 320px per side.
+_THUMBNAIL_MAX_SIDE = 320
+# Set by probe_video() on info extracted through an egress route.
+_PROBE_ROUTE_KEY = "_egress_route"
+# Set on shutdown so downloads running in worker threads stop at their next
+# progress update instead of keeping the process alive.
+_CANCEL_DOWNLOADS = threading.Event()
 
 
 class YdlLogger:
@@ -36,6 +60,64 @@ class YdlLogger:
         logger.error(msg)
 
 
+class _CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sections: dict[str, dict[str, int]] = {}
+
+    def record(self, section: str, outcome: str) -> None:
+        with self._lock:
+            counts = self._sections.setdefault(
+                section, {"hits": 0, "misses": 0, "writes": 0})
+            counts[outcome] += 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            sections = {name: dict(counts) for name, counts in self._sections.items()}
+        hits = sum(counts["hits"] for counts in sections.values())
+        misses = sum(counts["misses"] for counts in sections.values())
+        return {
+            "path": YTDLP_CACHE_DIR or None,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "sections": sections,
+        }
+
+
+YTDLP_CACHE_STATS = _CacheStats()
+
+
+class _MeteredCache:
+    # Stands in for YoutubeDL.cache, which the extractors and the challenge
+    # solver look up on every use, to count lookups per section.
+    def __init__(self, cache: Any):
+        self._cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cache, name)
+
+    def load(self, section, key, dtype="json", default=None, **kwargs):
+        data = self._cache.load(section, key, dtype, default, **kwargs)
+        if self._cache.enabled:
+            YTDLP_CACHE_STATS.record(section, "misses" if data is default else "hits")
+        return data
+
+    def store(self, section, key, data, dtype="json"):
+        self._cache.store(section, key, data, dtype)
+        if self._cache.enabled:
+            YTDLP_CACHE_STATS.record(section, "writes")
+
+
+def _open_ydl(opts: dict[str, Any]) -> Any:
+    # yt-dlp is imported on first use to keep process start-up fast.
+    import yt_dlp
+
+    ydl = yt_dlp.YoutubeDL(cast(Any, opts))
+    ydl.cache = _MeteredCache(ydl.cache)
+    return ydl
+
+
 def _video_format(max_size_mb: int) -> str:
     max_bytes = max_size_mb * 1024 * 1024
     # Prefer mp4 for Telegram compatibility while allowing large files.
@@ -48,51 +130,42 @@ def _video_format(max_size_mb: int) -> str:
     )
 
 
-def _get_cookiefile_from_env() -> Optional[str]:
-    global _COOKIEFILE_CACHE
+def _audio_format(max_size_mb: int) -> str:
+    max_bytes = max_size_mb * 1024 * 1024
+    # Telegram plays m4a (and mp3) in its audio player; other codecs are
+    # only taken when no m4a stream fits.
+    return (
+        f"bestaudio[ext=m4a][filesize<={max_bytes}]"
+        f"/bestaudio[ext=m4a][filesize_approx<={max_bytes}]"
+        f"/bestaudio[filesize<={max_bytes}]"
+        f"/bestaudio[filesize_approx<={max_bytes}]"
+        "/bestaudio"
+        "/best"
+    )
 
-    cookie_path = os.getenv("YTDLP_COOKIES_FILE")
-    if cookie_path:
-        if os.path.exists(cookie_path):
-            logger.info("Using cookies from file: %s", cookie_path)
-            return cookie_path
-        logger.warning(
-            "YTDLP_COOKIES_FILE is set but file does not exist: %s",
-            cookie_path,
-        )
 
-    cookies_b64 = os.getenv("YTDLP_COOKIES_B64")
-    if not cookies_b64:
-        logger.info(
-            "No cookies provided via YTDLP_COOKIES_FILE or YTDLP_COOKIES_B64")
+def _thumbnail_url(info: dict[str, Any]) -> Optional[str]:
+    candidates = [
+        thumb for thumb in info.get("thumbnails") or []
+        if thumb.get("url")
+        and urllib.parse.urlparse(thumb["url"]).path.endswith(".jpg")
+        and 0 < (thumb.get("width") or 0) <= _THUMBNAIL_MAX_SIDE
+        and 0 < (thumb.get("height") or 0) <= _THUMBNAIL_MAX_SIDE
+    ]
+    if not candidates:
         return None
+    return max(candidates, key=lambda thumb: thumb["width"])["url"]
 
-    with _COOKIE_LOCK:
-        if _COOKIEFILE_CACHE and os.path.exists(_COOKIEFILE_CACHE):
-            logger.debug("Using cached temporary cookie file: %s",
-                         _COOKIEFILE_CACHE)
-            return _COOKIEFILE_CACHE
 
-        try:
-            logger.info("Decoding YTDLP_COOKIES_B64...")
-            cookie_bytes = base64.b64decode(cookies_b64, validate=True)
-            cookie_text = cookie_bytes.decode("utf-8")
-        except Exception as exc:
-            logger.warning("Failed to decode YTDLP_COOKIES_B64: %s", exc)
-            return None
-
-        try:
-            fd, temp_path = tempfile.mkstemp(
-                prefix="yt-dlp-cookies-", suffix=".txt")
-            with os.fdopen(fd, "w", encoding="utf-8") as handle:
-                handle.write(cookie_text)
-            os.chmod(temp_path, 0o600)
-            _COOKIEFILE_CACHE = temp_path
-            logger.info("Created temporary cookie file: %s", temp_path)
-            return temp_path
-        except Exception as exc:
-            logger.warning("Failed to create temporary cookie file: %s", exc)
-            return None
+def media_details(info: dict[str, Any]) -> dict[str, Any]:
+    # Playback metadata for the upload: send_audio's duration, send_video's
+    # dimensions and thumbnail.
+    details = {key: info[key] for key in ("duration", "width", "height")
+               if info.get(key)}
+    thumbnail = _thumbnail_url(info)
+    if thumbnail:
+        details["thumbnail"] = thumbnail
+    return details
 
 
 def _is_youtube_antibot_error(message: str) -> bool:
@@ -107,10 +180,15 @@ def _is_youtube_antibot_error(message: str) -> bool:
     )
 
 
-def _check_bgutil_health() -> bool:
+def _is_rate_limited_error(message: str) -> bool:
+    lower = message.lower()
+    return "too many requests" in lower or "429" in lower
+
+
+def _check_bgutil_health(base_url: str = DEFAULT_BGUTIL_BASE_URL) -> bool:
     # The bgutil provider has a /ping endpoint that returns version info.
     # We hit it to ensure the provider is active and responsive.
-    ping_url = f"{DEFAULT_BGUTIL_BASE_URL.rstrip('/')}/ping"
+    ping_url = f"{base_url.rstrip('/')}/ping"
     try:
         with urllib.request.urlopen(ping_url, timeout=2) as response:
             if response.status == 200:
@@ -130,11 +208,53 @@ def _check_bgutil_health() -> bool:
     return False
 
 
+def warm_up_extractor() -> None:
+    # Instantiating YoutubeDL and resolving the YouTube extractor pays the
+    # extractor import cost before the first user request does.
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(cast(Any, {"quiet": True, "logger": YdlLogger()})) as ydl:
+        ydl.get_info_extractor("Youtube")
+    logger.info("yt-dlp extractor warmed up (version %s)",
+                yt_dlp.version.__version__)
+
+
+def warm_up_cache() -> None:
+    # One metadata probe fills the shared cache with the current player's
+    # challenge solutions; on a warm volume it is served from the cache.
+    if not YTDLP_CACHE_DIR or not YTDLP_CACHE_WARMUP_URL:
+        return
+    started = time.monotonic()
+    before = YTDLP_CACHE_STATS.stats()
+    info = probe_video(YTDLP_CACHE_WARMUP_URL)
+    after = YTDLP_CACHE_STATS.stats()
+    if info is None:
+        logger.warning("yt-dlp cache warm-up probe of %s failed", YTDLP_CACHE_WARMUP_URL)
+        return
+    logger.info("yt-dlp cache warmed up in %.1fs (%d hits, %d misses) at %s",
+                time.monotonic() - started, after["hits"] - before["hits"],
+                after["misses"] - before["misses"], YTDLP_CACHE_DIR)
+
+
+def cancel_downloads() -> None:
+    _CANCEL_DOWNLOADS.set()
+
+
+def _abort_if_cancelled(status: dict[str, Any]) -> None:
+    if _CANCEL_DOWNLOADS.is_set():
+        from yt_dlp.utils import DownloadCancelled
+
+        raise DownloadCancelled("Download cancelled by shutdown")
+
+
 def _build_ydl_opts(
     max_size_mb: int,
     cookiefile: Optional[str],
     disable_innertube: bool = False,
     clients: Optional[list[str]] = None,
+    route: Optional[EgressRoute] = None,
+    concurrent_fragments: int = DEFAULT_CONCURRENT_FRAGMENTS,
+    audio_only: bool = False,
 ) -> dict[str, Any]:
     provider_args: dict[str, list[str]] = {
         "base_url": [DEFAULT_BGUTIL_BASE_URL]
@@ -160,26 +280,179 @@ def _build_ydl_opts(
             "youtubepot-bgutilhttp": provider_args,
             "youtube": youtube_args,
         },
-        "concurrent_fragment_downloads": 5,
-        "outtmpl": "downloads/%(title)s.%(ext)s",
+        "concurrent_fragment_downloads": concurrent_fragments,
+        "outtmpl": f"{DEFAULT_DOWNLOAD_FOLDER}/%(title)s.%(ext)s",
+        "cachedir": YTDLP_CACHE_DIR or False,
         "restrictfilenames": True,
+        # Resume from a leftover .part file when a job is retried after a
+        # crash instead of downloading the whole stream again.
+        "continuedl": True,
+        "progress_hooks": [_abort_if_cancelled],
         "logger": YdlLogger(),
         "verbose": True,  # Keep verbose for better logs in our logger
     }
+    if audio_only:
+        # A single audio stream: nothing to merge, and "best" keeps the
+        # source codec so the extraction is a stream copy, not a re-encode.
+        opts["format"] = _audio_format(max_size_mb)
+        del opts["merge_output_format"]
+        opts["postprocessors"] = [
+            {"key": "FFmpegExtractAudio", "preferredcodec": "best"}]
     if cookiefile:
         opts["cookiefile"] = cookiefile
+    if route is not None:
+        opts.update(route.ydl_opts())
 
-    logger.debug("Built yt-dlp options (cookiefile: %s, disable_innertube: %s, clients: %s)",
-                 cookiefile, disable_innertube, clients)
+    logger.debug("Built yt-dlp options (cookiefile: %s, disable_innertube: %s, clients: %s, route: %s)",
+                 cookiefile, disable_innertube, clients, route.name if route else None)
     return opts
 
 
+def _download_streams(
+    ydl_opts: dict[str, Any],
+    info: dict[str, Any],
+    parallel: bool = True,
+) -> list[str]:
+    # Downloads each of info's requested formats with its own YoutubeDL
+    # (own fragment downloads and progress hooks) and returns the files in
+    # requested_formats order, ready to merge.
+    from yt_dlp.utils import DownloadCancelled
+
+    failed = threading.Event()
+
+    def abort_if_failed(status: dict[str, Any]) -> None:
+        if failed.is_set():
+            raise DownloadCancelled("Another stream of this download failed")
+
+    single = {key: value for key, value in info.items() if key != "requested_formats"}
+    base, _ = os.path.splitext(ydl_opts["outtmpl"])
+
+    def fetch(fmt: dict[str, Any]) -> str:
+        opts = {key: value for key, value in ydl_opts.items()
+                if key not in ("match_filter", "merge_output_format")}
+        opts["format"] = fmt["format_id"]
+        opts["outtmpl"] = f"{base}.f%(format_id)s.%(ext)s"
+        opts["progress_hooks"] = [*ydl_opts["progress_hooks"], abort_if_failed]
+        started = time.monotonic()
+        try:
+            with _open_ydl(opts) as stream_ydl:
+                result = stream_ydl.process_ie_result(dict(single), download=True)
+                path = stream_ydl.prepare_filename(result)
+        except BaseException:
+            failed.set()
+            raise
+        logger.info("Stream %s downloaded in %.1fs: %s",
+                    fmt["format_id"], time.monotonic() - started, path)
+        return path
+
+    streams = info["requested_formats"]
+    if not parallel:
+        return [fetch(fmt) for fmt in streams]
+    with ThreadPoolExecutor(max_workers=len(streams),
+                            thread_name_prefix="stream") as pool:
+        futures = [pool.submit(fetch, fmt) for fmt in streams]
+        errors = [exc for exc in (future.exception() for future in futures) if exc]
+    if errors:
+        # The streams stopped by abort_if_failed are not the cause.
+        raise next((exc for exc in errors if not isinstance(exc, DownloadCancelled)),
+                   errors[0])
+    return [future.result() for future in futures]
+
+
+def _download_and_merge(
+    ydl: Any,
+    ydl_opts: dict[str, Any],
+    info: dict[str, Any],
+    admit: Optional[Callable[[dict[str, Any]], Optional[str]]],
+) -> dict[str, Any]:
+    # Takes info with formats selected but not downloaded.
+    from yt_dlp.postprocessor import FFmpegMergerPP
+
+    merger = FFmpegMergerPP(ydl)
+    streams = info.get("requested_formats") or []
+    if len(streams) < 2 or not merger.available:
+        return ydl.process_ie_result(info, download=True)
+    if admit is not None and admit(info):
+        return info
+
+    paths = _download_streams(ydl_opts, info)
+    merged_path = ydl.prepare_filename(info)
+    merger.run(dict(
+        info,
+        filepath=merged_path,
+        requested_formats=[dict(fmt, filepath=path) for fmt, path in zip(streams, paths)],
+        __files_to_merge=paths,
+    ))
+    for path in paths:
+        os.remove(path)
+    return dict(info, requested_downloads=[{"filepath": merged_path}])
+
+
+def _blame_throttle(
+    error_text: str,
+    identity: Optional[CookieIdentity],
+    route: Optional[EgressRoute],
+) -> Tuple[str, str]:
+    # Outcomes for the cookie identity and the egress route of a failed
+    # attempt. A 429 is the address's budget when routes are configured;
+    # a bot check is the account's, or the address's without cookies.
+    if not _is_youtube_antibot_error(error_text):
+        return "failed", "failed"
+    if route is not None and (_is_rate_limited_error(error_text) or identity is None):
+        return "failed", "throttled"
+    return "throttled", "failed"
+
+
+def probe_video(
+    url: str,
+    max_size_mb: int = DEFAULT_MAX_SIZE_MB,
+    audio_only: bool = False,
+) -> Optional[dict[str, Any]]:
+    # Extracts metadata and selects formats without downloading. The result
+    # can be handed to download_video() so the job does not extract twice.
+    identity = COOKIE_POOL.acquire()
+    route = ROUTE_POOL.acquire(_CANCEL_DOWNLOADS.is_set)
+    ydl_opts = _build_ydl_opts(
+        max_size_mb=max_size_mb,
+        cookiefile=identity.path if identity else None,
+        route=route,
+        audio_only=audio_only,
+    )
+    identity_outcome = route_outcome = "failed"
+    try:
+        with _open_ydl(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            identity_outcome = route_outcome = "ok"
+            if not info:
+                return None
+            info = ydl.sanitize_info(info)
+            if route is not None:
+                # The stream URLs only work from this route's address.
+                info[_PROBE_ROUTE_KEY] = route.name
+            return info
+    except Exception as exc:
+        identity_outcome, route_outcome = _blame_throttle(str(exc), identity, route)
+        logger.info("Metadata probe failed for %s: %s", url, exc)
+        return None
+    finally:
+        COOKIE_POOL.release(identity, identity_outcome)
+        ROUTE_POOL.release(route, route_outcome)
+
+
 def download_video(
     url: str,
-    download_folder: str = "downloads",
+    download_folder: str = DEFAULT_DOWNLOAD_FOLDER,
     max_size_mb: int = DEFAULT_MAX_SIZE_MB,
+    admit: Optional[Callable[[dict[str, Any]], Optional[str]]] = None,
+    info: Optional[dict[str, Any]] = None,
+    progress_hook: Optional[Callable[[dict[str, Any]], None]] = None,
+    concurrent_fragments: int = DEFAULT_CONCURRENT_FRAGMENTS,
+    audio_only: bool = False,
+    media_info: Optional[dict[str, Any]] = None,
+    parallel_streams: bool = PARALLEL_STREAMS,
 ) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
-    logger.info("Starting download: %s (max_size=%dMB)", url, max_size_mb)
+    logger.info("Starting download: %s (max_size=%dMB, audio_only=%s)",
+                url, max_size_mb, audio_only)
     os.makedirs(download_folder, exist_ok=True)
 
     bgutil_healthy = _check_bgutil_health()
@@ -189,52 +462,120 @@ def download_video(
         logger.warning(
             "bgutil provider seems down or unreachable at %s. PO tokens might fail.", DEFAULT_BGUTIL_BASE_URL)
 
-    cookiefile = _get_cookiefile_from_env()
+    has_cookies = len(COOKIE_POOL) > 0
     last_error_text: Optional[str] = None
-    retry_with_legacy_innertube = not cookiefile
+    retry_with_legacy_innertube = not has_cookies
+    # A throttled cookie identity or egress route is retried with the next
+    # idle one before falling back to other strategies.
+    rotation_retries = max(len(COOKIE_POOL), len(ROUTE_POOL)) - 1
 
     # Strategy 1: Default clients (ios, android, web, mweb, tv)
     # Strategy 2: Same but with disable_innertube=1
     # Strategy 3: Just ios and android (sometimes more reliable)
 
+    rejections: list[str] = []
+
+    def match_filter(info: dict[str, Any], *, incomplete: bool = False) -> Optional[str]:
+        # Called with the selected formats right before the download starts,
+        # which is the first point where the expected size is known.
+        if incomplete or admit is None:
+            return None
+        reason = admit(info)
+        if reason:
+            rejections.append(reason)
+        return reason
+
     attempts = [
         {"disable_innertube": False, "clients": None},
         {"disable_innertube": True, "clients": None},
         {"disable_innertube": False, "clients": ["ios", "android"]},
     ]
 
-    for attempt in attempts:
+    prefetched_info = info
+    index = 0
+    while index < len(attempts):
+        attempt = attempts[index]
+        index += 1
         disable_innertube = attempt["disable_innertube"]
         clients = attempt["clients"]
 
         if disable_innertube and not retry_with_legacy_innertube:
             continue
-
-        logger.info("Download attempt with disable_innertube=%s, clients=%s",
-                    disable_innertube, clients or "default")
+        if _CANCEL_DOWNLOADS.is_set():
+            return None, "Download cancelled by shutdown", None, None
+
+        probe_route = (prefetched_info or {}).get(_PROBE_ROUTE_KEY)
+        route = ROUTE_POOL.acquire(_CANCEL_DOWNLOADS.is_set, prefer=probe_route)
+        if prefetched_info is not None and (route.name if route else None) != probe_route:
+            logger.info("Probe route %s is unavailable; extracting again on %s",
+                        probe_route, route.name if route else "direct")
+            prefetched_info = None
+        if _CANCEL_DOWNLOADS.is_set():
+            ROUTE_POOL.release(route)
+            return None, "Download cancelled by shutdown", None, None
+        identity = COOKIE_POOL.acquire()
+        logger.info("Download attempt with disable_innertube=%s, clients=%s, cookies=%s, route=%s",
+                    disable_innertube, clients or "default",
+                    identity.name if identity else "none",
+                    route.name if route else "direct")
 
         ydl_opts = _build_ydl_opts(
             max_size_mb=max_size_mb,
-            cookiefile=cookiefile,
+            cookiefile=identity.path if identity else None,
             disable_innertube=disable_innertube,
             clients=clients,
+            route=route,
+            concurrent_fragments=concurrent_fragments,
+            audio_only=audio_only,
         )
         ydl_opts["outtmpl"] = f"{download_folder}/%(title)s.%(ext)s"
+        if progress_hook is not None:
+            ydl_opts["progress_hooks"] = [*ydl_opts["progress_hooks"], progress_hook]
+        if admit is not None:
+            ydl_opts["match_filter"] = match_filter
 
+        identity_outcome: Optional[str] = "failed"
+        route_outcome: Optional[str] = "failed"
         try:
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                logger.info("Extracting info and downloading...")
-                info = ydl.extract_info(url, download=True)
+            with _open_ydl(ydl_opts) as ydl:
+                # Split streams are downloaded by _download_and_merge, so
+                # yt-dlp only selects the formats here.
+                split = parallel_streams and not audio_only
+                if prefetched_info is not None:
+                    # Metadata from probe_video(); only the first attempt
+                    # reuses it, retries extract again with other clients.
+                    logger.info("Downloading from prefetched info...")
+                    info = ydl.process_ie_result(prefetched_info, download=not split)
+                    prefetched_info = None
+                else:
+                    logger.info("Extracting info and downloading...")
+                    info = ydl.extract_info(url, download=not split)
+                if info and split:
+                    info = _download_and_merge(
+                        ydl, ydl_opts, info, match_filter if admit is not None else None)
                 if not info:
                     logger.error("yt-dlp returned no info for %s", url)
                     return None, "Extraction failed", None, None
+                identity_outcome = route_outcome = "ok"
 
                 title = info.get("title")
                 author = info.get("uploader") or info.get(
                     "channel") or info.get("creator")
                 logger.info("Successfully extracted info for: %s", title)
+                if rejections:
+                    logger.warning("Download not admitted (%s): %s",
+                                   url, rejections[-1])
+                    return None, rejections[-1], title, author
+
+                if media_info is not None:
+                    media_info.update(media_details(info))
 
                 file_path = ydl.prepare_filename(info)
+                downloads = info.get("requested_downloads") or []
+                if downloads and downloads[-1].get("filepath"):
+                    # Set after postprocessors that change the extension,
+                    # like the audio extraction.
+                    file_path = downloads[-1]["filepath"]
                 logger.debug("Expected file path: %s", file_path)
 
                 if not os.path.exists(file_path):
@@ -259,19 +600,44 @@ def download_video(
                 logger.info("Download successful: %s", file_path)
                 return file_path, None, title, author
         except Exception as exc:
+            if _CANCEL_DOWNLOADS.is_set():
+                identity_outcome = route_outcome = None
+                logger.info("Download cancelled by shutdown: %s", url)
+                return None, "Download cancelled by shutdown", None, None
             last_error_text = str(exc)
             logger.warning("Attempt failed (disable_innertube=%s, clients=%s): %s",
                            disable_innertube, clients or "default", last_error_text)
 
             if _is_youtube_antibot_error(last_error_text):
-                logger.warning("Anti-bot check hit. Moving to next strategy.")
+                identity_outcome, route_outcome = _blame_throttle(
+                    last_error_text, identity, route)
+                # The pool being blamed still counts this attempt's member as
+                # available, so > 1 means there is another one to try.
+                rotate = (
+                    COOKIE_POOL.available() > 1
+                    if identity_outcome == "throttled"
+                    else ROUTE_POOL.available() > 1
+                )
+                if rotation_retries > 0 and rotate:
+                    rotation_retries -= 1
+                    index -= 1
+                    logger.warning("Anti-bot check hit (cookies=%s, route=%s). "
+                                   "Retrying with another %s.",
+                                   identity.name if identity else "none",
+                                   route.name if route else "direct",
+                                   "identity" if identity_outcome == "throttled" else "route")
+                else:
+                    logger.warning("Anti-bot check hit. Moving to next strategy.")
                 continue
             else:
                 logger.error("Download exception: %s", exc, exc_info=True)
                 return None, last_error_text, None, None
+        finally:
+            COOKIE_POOL.release(identity, identity_outcome)
+            ROUTE_POOL.release(route, route_outcome)
 
     if _is_youtube_antibot_error(last_error_text):
-        if not cookiefile:
+        if not has_cookies:
             logger.error(
                 "Anti-bot verification failed and no cookies provided. URL: %s", url
             )
@@ -0,0 +1,191 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated proxy URLs (http://, socks5://, ...) and/or local source
+# addresses; "direct" adds a route without a proxy.
+YTDLP_PROXIES = os.getenv("YTDLP_PROXIES", "")
+YTDLP_SOURCE_ADDRESSES = os.getenv("YTDLP_SOURCE_ADDRESSES", "")
+# Download attempts each route may start per minute, with bursts up to
+# EGRESS_ROUTE_BURST, so no single IP exceeds YouTube's budget (0 = no limit).
+EGRESS_ROUTE_RATE_PER_MINUTE = float(os.getenv("EGRESS_ROUTE_RATE_PER_MINUTE", "30"))
+EGRESS_ROUTE_BURST = float(os.getenv("EGRESS_ROUTE_BURST", "5"))
+EGRESS_COOLDOWN_SECONDS = float(os.getenv("EGRESS_COOLDOWN_SECONDS", "300"))
+EGRESS_MAX_COOLDOWN_SECONDS = float(os.getenv("EGRESS_MAX_COOLDOWN_SECONDS", "3600"))
+
+
+@dataclass
+class EgressRoute:
+    name: str
+    proxy: str | None = None
+    source_address: str | None = None
+    rate: float = EGRESS_ROUTE_RATE_PER_MINUTE / 60
+    burst: float = EGRESS_ROUTE_BURST
+    tokens: float = EGRESS_ROUTE_BURST
+    refilled_at: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+    successes: int = 0
+    failures: int = 0
+    throttles: int = 0
+    consecutive_throttles: int = 0
+    last_throttled: float = 0.0
+    cooldown_until: float = 0.0
+
+    def refill(self, now: float) -> None:
+        if self.rate <= 0:
+            # No rate configured: the route has no budget limit.
+            self.tokens = max(self.tokens, 1.0)
+            return
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def ydl_opts(self) -> dict[str, Any]:
+        opts: dict[str, Any] = {}
+        if self.proxy:
+            opts["proxy"] = self.proxy
+        if self.source_address:
+            opts["source_address"] = self.source_address
+        return opts
+
+    def stats(self, now: float) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_use": self.in_use,
+            "tokens": round(self.tokens, 2),
+            "successes": self.successes,
+            "failures": self.failures,
+            "throttles": self.throttles,
+            "cooling_down_seconds": max(0, round(self.cooldown_until - now)),
+        }
+
+
+def _redact(proxy: str) -> str:
+    # Proxy URLs often carry credentials; never log or report them.
+    scheme, sep, rest = proxy.partition("://")
+    if not sep:
+        return proxy
+    return f"{scheme}://{rest.rpartition('@')[2]}"
+
+
+def routes_from_env(
+    proxies: str = YTDLP_PROXIES,
+    source_addresses: str = YTDLP_SOURCE_ADDRESSES,
+) -> list[EgressRoute]:
+    routes = []
+    for proxy in filter(None, (p.strip() for p in proxies.split(","))):
+        if proxy == "direct":
+            routes.append(EgressRoute("direct"))
+        else:
+            routes.append(EgressRoute(_redact(proxy), proxy=proxy))
+    for address in filter(None, (a.strip() for a in source_addresses.split(","))):
+        routes.append(EgressRoute(f"source:{address}", source_address=address))
+    return routes
+
+
+class RoutePool:
+    # Egress routes for yt-dlp (proxies or source addresses). Each download
+    # attempt spends one token from its route's bucket; the attempt gets the
+    # least recently throttled route that has a token, and a route answered
+    # with 429 sits out an exponentially growing cooldown. Without any
+    # configured route everything goes out directly with no budget.
+    def __init__(
+        self,
+        routes: list[EgressRoute] | None = None,
+        cooldown: float = EGRESS_COOLDOWN_SECONDS,
+        max_cooldown: float = EGRESS_MAX_COOLDOWN_SECONDS,
+    ):
+        self.routes = routes if routes is not None else routes_from_env()
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def _pick(self, now: float, prefer: str | None = None) -> tuple[EgressRoute | None, float]:
+        # Returns a route with a token, or how long until one refills.
+        ready = [r for r in self.routes if r.cooldown_until <= now]
+        for route in ready:
+            if route.name == prefer:
+                route.refill(now)
+                if route.tokens >= 1:
+                    return route, 0.0
+        if not ready:
+            # Everything is cooling down: use the route that recovers first
+            # rather than stalling every download.
+            return min(self.routes, key=lambda r: r.cooldown_until), 0.0
+        for route in ready:
+            route.refill(now)
+        funded = [r for r in ready if r.tokens >= 1]
+        if funded:
+            return min(funded, key=lambda r: (r.last_throttled, r.in_use, -r.tokens)), 0.0
+        return None, min((1 - r.tokens) / r.rate for r in ready)
+
+    def acquire(
+        self,
+        cancelled: Callable[[], bool] = lambda: False,
+        prefer: str | None = None,
+    ) -> EgressRoute | None:
+        # Blocks the calling (download) thread until a route has budget.
+        # `prefer` names a route to use whenever it has budget and is not
+        # cooling down.
+        if not self.routes:
+            return None
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                route, wait = self._pick(now, prefer)
+                if route is not None:
+                    route.refill(now)
+                    route.tokens = max(0.0, route.tokens - 1)
+                    route.in_use += 1
+                    return route
+                if cancelled():
+                    return None
+                logger.info("All egress routes are out of budget; waiting %.1fs", wait)
+                self._cond.wait(min(wait, 1.0))
+
+    def release(self, route: EgressRoute | None, outcome: str | None = None) -> None:
+        # `outcome` is "ok", "throttled" or "failed".
+        if route is None:
+            return
+        with self._cond:
+            route.in_use = max(0, route.in_use - 1)
+            if outcome == "ok":
+                route.successes += 1
+                route.consecutive_throttles = 0
+            elif outcome == "throttled":
+                now = time.monotonic()
+                route.throttles += 1
+                route.consecutive_throttles += 1
+                route.last_throttled = now
+                cooldown = min(self.max_cooldown,
+                               self.cooldown * 2 ** (route.consecutive_throttles - 1))
+                route.cooldown_until = now + cooldown
+                logger.warning("Egress route %s rate limited; cooling down for %.0fs",
+                               route.name, cooldown)
+            elif outcome == "failed":
+                route.failures += 1
+            self._cond.notify_all()
+
+    def available(self) -> int:
+        with self._cond:
+            now = time.monotonic()
+            return sum(1 for r in self.routes if r.cooldown_until <= now)
+
+    def stats(self) -> list[dict[str, Any]]:
+        with self._cond:
+            now = time.monotonic()
+            for route in self.routes:
+                if route.cooldown_until <= now:
+                    route.refill(now)
+            return [route.stats(now) for route in self.routes]
+
+
+ROUTE_POOL = RoutePool()
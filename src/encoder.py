@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import shutil
+import subprocess
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def usable_cores() -> int:
+    # CPUs this process may run on, further limited by a cgroup v2 quota
+    # (containers on Render/Kubernetes usually get fractional CPUs).
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", encoding="utf-8") as handle:
+            quota, period = handle.read().split()[:2]
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+
+# Cores left to the event loop and the bgutil provider while encodes run.
+ENCODER_RESERVED_CORES = int(os.getenv("ENCODER_RESERVED_CORES", "1"))
+ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", "0"))
+ENCODER_SLOTS = int(os.getenv("ENCODER_SLOTS", "0"))
+# Added niceness for ffmpeg, so encodes only use CPU nobody else wants.
+ENCODER_NICE = int(os.getenv("ENCODER_NICE", "10"))
+
+
+class EncoderPool:
+    # Runs at most `slots` ffmpeg encodes at once with `threads` threads
+    # each, so encoders never use more than the cores left after
+    # ENCODER_RESERVED_CORES, and lowers their scheduling priority.
+    def __init__(
+        self,
+        cores: int | None = None,
+        reserved_cores: int = ENCODER_RESERVED_CORES,
+        slots: int = ENCODER_SLOTS,
+        threads: int = ENCODER_THREADS,
+        nice: int = ENCODER_NICE,
+    ):
+        cores = cores or usable_cores()
+        budget = max(1, cores - reserved_cores)
+        # libx264 scales well up to ~4 threads; beyond that a second encode
+        # finishes more work per second than a wider first one.
+        self.threads = threads if threads > 0 else max(1, min(4, budget))
+        self.slots = slots if slots > 0 else max(1, budget // self.threads)
+        self.nice = nice
+        self._launcher_args: list[str] | None = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(self.slots)
+
+    def ffmpeg_args(self) -> list[str]:
+        return ["-threads", str(self.threads)]
+
+    def _launcher(self) -> list[str]:
+        # nice(1) runs the command even when it cannot change the priority;
+        # chrt(1) refuses to, so it is only used where it works.
+        if self._launcher_args is None:
+            launcher: list[str] = []
+            if self.nice > 0 and shutil.which("nice"):
+                launcher += ["nice", "-n", str(self.nice)]
+            if shutil.which("chrt"):
+                with suppress(OSError, subprocess.SubprocessError):
+                    if subprocess.run(["chrt", "--batch", "0", "true"],
+                                      capture_output=True, timeout=5).returncode == 0:
+                        launcher += ["chrt", "--batch", "0"]
+            self._launcher_args = launcher
+        return self._launcher_args
+
+    def command(self, *args: str) -> list[str]:
+        # The priority is set before exec, so every ffmpeg thread inherits
+        # it: changing it on the running process only reaches its main
+        # thread. SCHED_BATCH marks the encoder as CPU-bound, so the kernel
+        # does not preempt interactive threads in its favour.
+        if not shutil.which(args[0]):
+            return list(args)
+        return [*self._launcher(), *args]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        # Yields how long the encode waited for a slot.
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        if waited >= 1:
+            logger.info("Encode waited %.1fs for a free encoder", waited)
+        self.active += 1
+        try:
+            yield waited
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict[str, Any]:
+        started = self.completed + self.active
+        return {
+            "slots": self.slots,
+            "threads_per_encode": self.threads,
+            "active": self.active,
+            "waiting": self.waiting,
+            "avg_wait_seconds": round(self.total_wait_seconds / started, 2) if started else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 2),
+        }
+
+
+ENCODER = EncoderPool()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import shutil
+from contextlib import suppress
+from typing import Any
+
+from .bandwidth import BANDWIDTH
+from .cookies import COOKIE_POOL
+from .downloader import (
+    DEFAULT_DOWNLOAD_FOLDER,
+    YTDLP_CACHE_STATS,
+    _check_bgutil_health,
+    warm_up_cache,
+    warm_up_extractor,
+)
+from .egress import ROUTE_POOL
+from .encoder import ENCODER
+from .http_server import HttpRequest, HttpResponse, HttpServer
+from .jobs import JOB_LIMITER, JobLimiter
+from .loopwatch import LOOP_WATCHDOG
+from .potokens import PO_TOKEN_POOL
+from .workspace import DISK_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Fast-start mode (serverless webhook deployments) skips eager yt-dlp
+# warm-up so the first webhook can be acknowledged as soon as possible.
+FAST_START = os.getenv("FAST_START", "").lower() in ("1", "true", "yes")
+READY_MIN_FREE_DISK_MB = int(os.getenv("READY_MIN_FREE_DISK_MB", "512"))
+BGUTIL_CHECK_INTERVAL_SECONDS = float(
+    os.getenv("BGUTIL_CHECK_INTERVAL_SECONDS", "30"))
+WARMUP_BGUTIL_ATTEMPTS = int(os.getenv("WARMUP_BGUTIL_ATTEMPTS", "30"))
+WARMUP_RETRY_DELAY_SECONDS = 1.0
+
+
+async def health_check(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(
+        "<html><body><h1>Bot Status</h1><p>Everything is operational</p></body></html>"
+    )
+
+
+class HealthMonitor:
+    def __init__(
+        self,
+        limiter: JobLimiter,
+        download_folder: str = DEFAULT_DOWNLOAD_FOLDER,
+        min_free_disk_mb: int = READY_MIN_FREE_DISK_MB,
+        warm_extractor: bool = not FAST_START,
+    ):
+        self.limiter = limiter
+        self.warm_extractor = warm_extractor
+        self.download_folder = download_folder
+        self.min_free_disk_mb = min_free_disk_mb
+        self.warmed_up = False
+        self.bgutil_healthy: bool | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def _free_disk_mb(self) -> int | None:
+        path = self.download_folder
+        if not os.path.isdir(path):
+            path = os.path.dirname(os.path.abspath(path))
+        try:
+            return int(shutil.disk_usage(path).free / (1024 * 1024))
+        except OSError:
+            return None
+
+    async def _refresh_bgutil(self) -> bool:
+        healthy = await asyncio.to_thread(_check_bgutil_health)
+        if healthy != self.bgutil_healthy:
+            logger.info("bgutil provider state changed: %s",
+                        "healthy" if healthy else "unhealthy")
+        self.bgutil_healthy = healthy
+        return healthy
+
+    async def warm_up(self) -> None:
+        if self.warm_extractor:
+            try:
+                await asyncio.to_thread(warm_up_extractor)
+            except Exception as exc:
+                logger.warning("yt-dlp warm-up failed: %s", exc)
+        for _ in range(max(1, WARMUP_BGUTIL_ATTEMPTS)):
+            if await self._refresh_bgutil():
+                break
+            await asyncio.sleep(WARMUP_RETRY_DELAY_SECONDS)
+        if self.warm_extractor:
+            # After the provider check: the probe needs PO tokens.
+            try:
+                await asyncio.to_thread(warm_up_cache)
+            except Exception as exc:
+                logger.warning("yt-dlp cache warm-up failed: %s", exc)
+        self.warmed_up = True
+        logger.info("Warm-up finished (bgutil healthy=%s)",
+                    self.bgutil_healthy)
+
+    async def _watch_bgutil(self) -> None:
+        while True:
+            await asyncio.sleep(BGUTIL_CHECK_INTERVAL_SECONDS)
+            with suppress(Exception):
+                await self._refresh_bgutil()
+
+    def start(self) -> None:
+        self._tasks.append(asyncio.create_task(self.warm_up()))
+        self._tasks.append(asyncio.create_task(self._watch_bgutil()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks.clear()
+
+    def saturation(self) -> dict[str, Any]:
+        # 0 means idle, 1 means every worker slot is busy and anything above
+        # 1 is queued work; autoscalers should add capacity well before 1.
+        limit = self.limiter.limit
+        return {
+            "score": round((self.limiter.active + self.limiter.waiting) / limit, 3),
+            "active_jobs": self.limiter.active,
+            "queued_jobs": self.limiter.waiting,
+            "max_concurrent_jobs": limit,
+        }
+
+    def readiness(self) -> tuple[bool, dict[str, Any]]:
+        free_disk_mb = self._free_disk_mb()
+        reasons = []
+        if self.limiter.draining:
+            reasons.append("draining")
+        if not self.warmed_up:
+            reasons.append("warming up")
+        if self.bgutil_healthy is False:
+            reasons.append("bgutil provider unreachable")
+        if free_disk_mb is not None and free_disk_mb < self.min_free_disk_mb:
+            reasons.append("low disk space")
+
+        bgutil_state = {True: "healthy", False: "unhealthy",
+                        None: "unknown"}[self.bgutil_healthy]
+        report = {
+            "ready": not reasons,
+            "reasons": reasons,
+            "draining": self.limiter.draining,
+            "warmed_up": self.warmed_up,
+            "bgutil": bgutil_state,
+            "queue_depth": self.limiter.waiting,
+            "active_jobs": self.limiter.active,
+            "free_worker_slots": self.limiter.free_slots,
+            "free_disk_mb": free_disk_mb,
+            "reserved_disk_mb": DISK_BUDGET.reserved_bytes // (1024 * 1024),
+            "jobs_waiting_for_disk": DISK_BUDGET.waiting,
+            "cookie_identities": len(COOKIE_POOL.identities),
+            "cookie_identities_available": COOKIE_POOL.available(),
+            "egress_routes": len(ROUTE_POOL),
+            "egress_routes_available": ROUTE_POOL.available(),
+            "bandwidth": BANDWIDTH.stats(),
+            "encoder": ENCODER.stats(),
+            "ytdlp_cache": YTDLP_CACHE_STATS.stats(),
+            "po_tokens": PO_TOKEN_POOL.stats(),
+            "event_loop": LOOP_WATCHDOG.stats(),
+        }
+        return not reasons, report
+
+    async def handle_ready(self, request: HttpRequest) -> HttpResponse:
+        # The free space check is a statfs on the downloads volume.
+        ready, report = await asyncio.to_thread(self.readiness)
+        return HttpResponse.json(report, status=200 if ready else 503)
+
+    async def handle_load(self, request: HttpRequest) -> HttpResponse:
+        return HttpResponse.json(self.saturation())
+
+    async def handle_cookies(self, request: HttpRequest) -> HttpResponse:
+        # Served on the public PORT next to the webhook.
+        return HttpResponse.json({"identities": COOKIE_POOL.stats(with_names=False)})
+
+    async def handle_egress(self, request: HttpRequest) -> HttpResponse:
+        return HttpResponse.json({"routes": ROUTE_POOL.stats()})
+
+    def register_routes(self, server: HttpServer) -> None:
+        server.add_route("/", health_check)
+        server.add_route("/ready", self.handle_ready)
+        server.add_route("/load", self.handle_load)
+        server.add_route("/cookies", self.handle_cookies)
+        server.add_route("/egress", self.handle_egress)
+
+
+HEALTH = HealthMonitor(JOB_LIMITER)
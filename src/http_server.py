@@ -0,0 +1,205 @@
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 10 * 1024 * 1024
+KEEPALIVE_TIMEOUT_SECONDS = 75.0
+
+
+class HttpRequest:
+    def __init__(
+        self,
+        method: str,
+        target: str,
+        headers: dict[str, str],
+        body: bytes,
+    ):
+        parsed = urlsplit(target)
+        self.method = method
+        self.path = parsed.path or "/"
+        self.query = {key: values[-1]
+                      for key, values in parse_qs(parsed.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body.decode("utf-8"))
+
+
+class HttpResponse:
+    def __init__(
+        self,
+        body: bytes | str = b"",
+        status: int = 200,
+        content_type: str = "text/html; charset=utf-8",
+        headers: dict[str, str] | None = None,
+    ):
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, payload: Any, status: int = 200) -> "HttpResponse":
+        return cls(
+            json.dumps(payload),
+            status=status,
+            content_type="application/json",
+        )
+
+
+Handler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+class HttpServer:
+    # Minimal HTTP/1.1 server running on the caller's event loop. It only
+    # supports Content-Length bodies, which is all Telegram and health
+    # checkers send, and keeps connections alive between requests.
+    def __init__(self, host: str, port: int, max_body_bytes: int = MAX_BODY_BYTES):
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self._routes: dict[tuple[str, str], Handler] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    def add_route(
+        self,
+        path: str,
+        handler: Handler,
+        methods: tuple[str, ...] = ("GET",),
+    ) -> None:
+        for method in methods:
+            self._routes[(method.upper(), path)] = handler
+            if method.upper() == "GET":
+                self._routes[("HEAD", path)] = handler
+
+    @property
+    def bound_port(self) -> int:
+        if self._server is None or not self._server.sockets:
+            return self.port
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        logger.info("HTTP server listening on %s:%s",
+                    self.host, self.bound_port)
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> HttpRequest | None:
+        request_line = await asyncio.wait_for(
+            reader.readline(), KEEPALIVE_TIMEOUT_SECONDS
+        )
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+
+        headers: dict[str, str] = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise _BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise _BadRequest(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if length < 0:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if length > self.max_body_bytes:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b""
+        return HttpRequest(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request: HttpRequest) -> HttpResponse:
+        handler = self._routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self._routes):
+                return HttpResponse("Method Not Allowed", status=405)
+            return HttpResponse("Not Found", status=404)
+        try:
+            return await handler(request)
+        except Exception as exc:
+            logger.exception("HTTP handler failed for %s %s: %s",
+                             request.method, request.path, exc)
+            return HttpResponse("Internal Server Error", status=500)
+
+    @staticmethod
+    def _serialize(response: HttpResponse, keep_alive: bool, head: bool) -> bytes:
+        try:
+            reason = HTTPStatus(response.status).phrase
+        except ValueError:
+            reason = "Unknown"
+        lines = [
+            f"HTTP/1.1 {response.status} {reason}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{name}: {value}" for name,
+                     value in response.headers.items())
+        head_bytes = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return head_bytes if head else head_bytes + response.body
+
+    async def _handle_connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest as exc:
+                    writer.write(self._serialize(
+                        HttpResponse(status=exc.status), keep_alive=False, head=False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+
+                response = await self._dispatch(request)
+                keep_alive = request.headers.get(
+                    "connection", "").lower() != "close"
+                writer.write(self._serialize(
+                    response, keep_alive=keep_alive, head=request.method == "HEAD"))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError,
+                ValueError):
+            return
+        finally:
+            writer.close()
+            with suppress(ConnectionError, OSError):
+                await writer.wait_closed()
@@ -0,0 +1,410 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .downloader import DEFAULT_DOWNLOAD_FOLDER
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_PATH = os.getenv(
+    "JOB_QUEUE_PATH", os.path.join(DEFAULT_DOWNLOAD_FOLDER, "jobs.sqlite3")
+)
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    chat_type TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    status_message_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    user_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS uploaded_media (
+    video_id TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    title TEXT,
+    author TEXT,
+    uploaded_at REAL NOT NULL
+);
+"""
+
+# Columns added after the first schema version; created on open if missing.
+_MIGRATIONS = {
+    "jobs": {
+        "stage": "TEXT NOT NULL DEFAULT 'queued'",
+        "file_path": "TEXT",
+        "title": "TEXT",
+        "author": "TEXT",
+        "mode": "TEXT NOT NULL DEFAULT 'video'",
+    },
+    "uploaded_media": {
+        "kind": "TEXT NOT NULL DEFAULT 'document'",
+    },
+}
+
+_JOB_COLUMNS = (
+    "job_id, chat_id, chat_type, message_id, status_message_id, url, user_id, "
+    "attempts, stage, file_path, title, author, mode"
+)
+
+STAGE_QUEUED = "queued"
+STAGE_DOWNLOADING = "downloading"
+STAGE_DOWNLOADED = "downloaded"
+STAGE_COMPRESSED = "compressed"
+STAGE_UPLOADING = "uploading"
+
+MODE_VIDEO = "video"
+MODE_AUDIO = "audio"
+
+MEDIA_DOCUMENT = "document"
+MEDIA_VIDEO = "video"
+
+
+def _worker_instance(worker_id: str) -> str:
+    # Worker ids are "<INSTANCE_NAME>:<host>:<pid>-<boot>"; the instance
+    # name may itself contain colons.
+    return worker_id.rsplit(":", 2)[0]
+
+
+@dataclass
+class DownloadJob:
+    chat_id: int
+    chat_type: str
+    message_id: int
+    status_message_id: int
+    url: str
+    user_id: Optional[int] = None
+    job_id: str = ""
+    attempts: int = 0
+    stage: str = STAGE_QUEUED
+    file_path: Optional[str] = None
+    title: Optional[str] = None
+    author: Optional[str] = None
+    mode: str = MODE_VIDEO
+
+    def __post_init__(self) -> None:
+        if not self.job_id:
+            self.job_id = uuid.uuid4().hex
+
+
+@dataclass
+class UploadedMedia:
+    # A video the bot already sent; its Telegram file_id can be sent again
+    # by any chat, or as an inline result, without uploading it again.
+    video_id: str
+    file_id: str
+    title: Optional[str] = None
+    author: Optional[str] = None
+    # Which send method the file_id came from; Telegram only resends it
+    # as the same kind.
+    kind: str = MEDIA_DOCUMENT
+
+
+class SqliteJobQueue:
+    # A shared job queue backed by one SQLite file. Every operation opens its
+    # own connection, so ingress and worker processes (or threads) can use
+    # the same file concurrently; claims take a write lock and hand each job
+    # to exactly one worker under a renewable lease.
+    def __init__(
+        self,
+        path: str = JOB_QUEUE_PATH,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            for table, columns in _MIGRATIONS.items():
+                existing = {row[1] for row in conn.execute(
+                    f"PRAGMA table_info({table})")}
+                for column, definition in columns.items():
+                    if column not in existing:
+                        conn.execute(
+                            f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _insert(
+        self,
+        job: DownloadJob,
+        status: str,
+        worker_id: str | None,
+        lease_until: float | None = None,
+    ) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, chat_id, chat_type, message_id, "
+                "status_message_id, url, user_id, status, worker_id, lease_until, "
+                "attempts, mode, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    job.chat_id,
+                    job.chat_type,
+                    job.message_id,
+                    job.status_message_id,
+                    job.url,
+                    job.user_id,
+                    status,
+                    worker_id,
+                    lease_until,
+                    job.attempts,
+                    job.mode,
+                    now,
+                    now,
+                ),
+            )
+
+    def enqueue(self, job: DownloadJob) -> DownloadJob:
+        self._insert(job, "pending", None)
+        logger.info("Enqueued job %s for chat %s: %s",
+                    job.job_id, job.chat_id, job.url)
+        return job
+
+    def start(self, job: DownloadJob, worker_id: str) -> DownloadJob:
+        # Journals a job that the caller runs right away, leased to
+        # `worker_id` like a claimed one: the caller renews the lease while
+        # it runs, so other workers only take the job over once it lapses.
+        job.attempts = 1
+        self._insert(job, "running", worker_id, time.time() + self.lease_seconds)
+        return job
+
+    def update_stage(
+        self,
+        job: DownloadJob,
+        stage: str,
+        file_path: str | None = None,
+        title: str | None = None,
+        author: str | None = None,
+    ) -> None:
+        job.stage = stage
+        job.file_path = file_path or job.file_path
+        job.title = title or job.title
+        job.author = author or job.author
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, file_path = ?, title = ?, author = ?, "
+                "updated_at = ? WHERE job_id = ?",
+                (job.stage, job.file_path, job.title, job.author,
+                 time.time(), job.job_id),
+            )
+
+    def recover(self, instance: str, is_gone: Callable[[str], bool]) -> int:
+        # Re-queues running jobs of `instance` whose worker is gone: its
+        # lease lapsed, or `is_gone` knows that exact worker id belongs to a
+        # process that exited. Jobs of live workers sharing the instance
+        # name are left alone.
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT job_id, worker_id, lease_until FROM jobs "
+                    "WHERE status = 'running' AND worker_id IS NOT NULL"
+                ).fetchall()
+                stale = [
+                    (now, job_id)
+                    for job_id, worker_id, lease_until in rows
+                    if _worker_instance(worker_id) == instance
+                    and ((lease_until is not None and lease_until < now)
+                         or is_gone(worker_id))
+                ]
+                conn.executemany(
+                    "UPDATE jobs SET status = 'pending', worker_id = NULL, "
+                    "lease_until = NULL, updated_at = ? WHERE job_id = ?",
+                    stale,
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if stale:
+            logger.info("Re-queued %s unfinished job(s) from %s",
+                        len(stale), instance)
+        return len(stale)
+
+    def lease_ends(self, instance: str, exclude: str) -> float | None:
+        # When the earliest lease held by another worker of `instance`
+        # lapses, or None if there is none.
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT worker_id, lease_until FROM jobs "
+                "WHERE status = 'running' AND lease_until IS NOT NULL "
+                "AND worker_id != ?",
+                (exclude,),
+            ).fetchall()
+        ends = [lease_until for worker_id, lease_until in rows
+                if _worker_instance(worker_id) == instance]
+        return min(ends) if ends else None
+
+    def claim(self, worker_id: str) -> DownloadJob | None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'too many attempts', "
+                    "updated_at = ? WHERE (status = 'pending' "
+                    "OR (status = 'running' AND lease_until < ?)) "
+                    "AND attempts >= ?",
+                    (now, now, self.max_attempts),
+                ).rowcount
+                if expired:
+                    logger.warning(
+                        "Gave up on %s job(s) after %s attempts", expired, self.max_attempts)
+                row = conn.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs "
+                    "WHERE status = 'pending' "
+                    "OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, "
+                    "lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (worker_id, now + self.lease_seconds, now, row[0]),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        job = DownloadJob(
+            job_id=row[0],
+            chat_id=row[1],
+            chat_type=row[2],
+            message_id=row[3],
+            status_message_id=row[4],
+            url=row[5],
+            user_id=row[6],
+            attempts=row[7] + 1,
+            stage=row[8],
+            file_path=row[9],
+            title=row[10],
+            author=row[11],
+            mode=row[12],
+        )
+        logger.info("Worker %s claimed job %s (attempt %s)",
+                    worker_id, job.job_id, job.attempts)
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_seconds, now, job_id, worker_id),
+            ).rowcount
+        return updated == 1
+
+    def _finish(self, job_id: str, status: str, error: str | None = None) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_until = NULL, "
+                "updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str) -> None:
+        self._finish(job_id, "done")
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, "failed", error)
+
+    def release(self, job_id: str, count_attempt: bool = True) -> None:
+        # count_attempt=False hands back a job that never started, such as
+        # one refused by a draining instance, without using up an attempt.
+        if not count_attempt:
+            with closing(self._connect()) as conn:
+                conn.execute(
+                    "UPDATE jobs SET attempts = MAX(attempts - 1, 0) "
+                    "WHERE job_id = ? AND status = 'running'",
+                    (job_id,),
+                )
+        self._finish(job_id, "pending")
+
+    def pending_for_user(self, user_id: int) -> int:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? "
+                "AND status IN ('pending', 'running')",
+                (user_id,),
+            ).fetchone()
+        return row[0]
+
+    def record_upload(self, media: UploadedMedia) -> None:
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploaded_media "
+                "(video_id, file_id, title, author, kind, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (media.video_id, media.file_id, media.title, media.author,
+                 media.kind, time.time()),
+            )
+
+    def uploaded_media(self, video_id: str) -> UploadedMedia | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT video_id, file_id, title, author, kind FROM uploaded_media "
+                "WHERE video_id = ?",
+                (video_id,),
+            ).fetchone()
+        return UploadedMedia(*row) if row else None
+
+    def unfinished_job_ids(self) -> set[str]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def counts(self) -> dict[str, int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+
+_JOB_QUEUE: SqliteJobQueue | None = None
+_JOB_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> SqliteJobQueue:
+    global _JOB_QUEUE
+
+    with _JOB_QUEUE_LOCK:
+        if _JOB_QUEUE is None:
+            _JOB_QUEUE = SqliteJobQueue()
+        return _JOB_QUEUE
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+# Keep this below the orchestrator's grace period (Kubernetes and Render
+# default to 30s) so leftover jobs are handed off before SIGKILL.
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", "25"))
+# Per-user and per-chat caps on running jobs; 0 means no cap.
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("MAX_ACTIVE_JOBS_PER_USER", "0"))
+MAX_ACTIVE_JOBS_PER_CHAT = int(os.getenv("MAX_ACTIVE_JOBS_PER_CHAT", "0"))
+# Running plus waiting jobs a user may have before new links are refused.
+MAX_PENDING_JOBS_PER_USER = int(os.getenv("MAX_PENDING_JOBS_PER_USER", "5"))
+# How much each running job of the same user or chat inflates the cost of
+# the next one, so heavy users share slots instead of taking them all.
+USER_SHARE_WEIGHT = float(os.getenv("SCHEDULER_USER_SHARE_WEIGHT", "1.0"))
+CHAT_SHARE_WEIGHT = float(os.getenv("SCHEDULER_CHAT_SHARE_WEIGHT", "0.5"))
+# Seconds of estimated cost forgiven per second spent waiting, so long jobs
+# are never starved by a steady stream of short ones.
+SCHEDULER_AGING = float(os.getenv("SCHEDULER_AGING", "1.0"))
+DEFAULT_JOB_COST_SECONDS = float(os.getenv("DEFAULT_JOB_COST_SECONDS", "120"))
+
+
+class DrainingError(Exception):
+    pass
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, pending: int):
+        super().__init__(f"User already has {pending} pending job(s)")
+        self.pending = pending
+
+
+@dataclass
+class JobTicket:
+    user_id: int | None = None
+    chat_id: int | None = None
+    # Estimated seconds of work; filled in from video metadata when the job
+    # has to wait for a slot.
+    cost: float = DEFAULT_JOB_COST_SECONDS
+    info: dict[str, Any] | None = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class JobLimiter:
+    # Hands out `limit` job slots. When jobs have to wait, the next slot goes
+    # to the waiting job with the lowest estimated cost (shortest job first),
+    # scaled up by how many jobs its user and chat already run and reduced
+    # the longer it has waited.
+    def __init__(
+        self,
+        limit: int,
+        per_user_limit: int = MAX_ACTIVE_JOBS_PER_USER,
+        per_chat_limit: int = MAX_ACTIVE_JOBS_PER_CHAT,
+        max_pending_per_user: int = MAX_PENDING_JOBS_PER_USER,
+        aging: float = SCHEDULER_AGING,
+    ):
+        self.limit = max(1, limit)
+        self.per_user_limit = per_user_limit
+        self.per_chat_limit = per_chat_limit
+        self.max_pending_per_user = max_pending_per_user
+        self.aging = aging
+        self.active = 0
+        self.waiting = 0
+        self.draining = False
+        self._queue: list[tuple[JobTicket, asyncio.Future]] = []
+        self._active_users: Counter[int] = Counter()
+        self._active_chats: Counter[int] = Counter()
+        self._pending_users: Counter[int] = Counter()
+        self._tasks: set[asyncio.Task] = set()
+        self._waiters: set[asyncio.Task] = set()
+
+    @property
+    def free_slots(self) -> int:
+        return max(0, self.limit - self.active)
+
+    def pending_for_user(self, user_id: int | None) -> int:
+        return self._pending_users[user_id] if user_id is not None else 0
+
+    def check_quota(self, ticket: JobTicket) -> None:
+        pending = self.pending_for_user(ticket.user_id)
+        if self.max_pending_per_user > 0 and pending >= self.max_pending_per_user:
+            raise QuotaExceeded(pending)
+
+    def _can_start(self, ticket: JobTicket) -> bool:
+        if self.active >= self.limit:
+            return False
+        if (self.per_user_limit > 0 and ticket.user_id is not None
+                and self._active_users[ticket.user_id] >= self.per_user_limit):
+            return False
+        if (self.per_chat_limit > 0 and ticket.chat_id is not None
+                and self._active_chats[ticket.chat_id] >= self.per_chat_limit):
+            return False
+        return True
+
+    def _score(self, ticket: JobTicket, now: float) -> float:
+        share = 1.0
+        if ticket.user_id is not None:
+            share += USER_SHARE_WEIGHT * self._active_users[ticket.user_id]
+        if ticket.chat_id is not None:
+            share += CHAT_SHARE_WEIGHT * self._active_chats[ticket.chat_id]
+        return ticket.cost * share - self.aging * (now - ticket.enqueued_at)
+
+    def _next_waiter(self) -> int | None:
+        now = time.monotonic()
+        best = None
+        for index, (ticket, future) in enumerate(self._queue):
+            if future.done() or not self._can_start(ticket):
+                continue
+            key = (self._score(ticket, now), ticket.enqueued_at)
+            if best is None or key < best[0]:
+                best = (key, index)
+        return best[1] if best is not None else None
+
+    def _dispatch(self) -> None:
+        while (index := self._next_waiter()) is not None:
+            ticket, future = self._queue.pop(index)
+            self._start(ticket)
+            future.set_result(None)
+
+    def _start(self, ticket: JobTicket) -> None:
+        self.active += 1
+        if ticket.user_id is not None:
+            self._active_users[ticket.user_id] += 1
+        if ticket.chat_id is not None:
+            self._active_chats[ticket.chat_id] += 1
+
+    def _finish(self, ticket: JobTicket) -> None:
+        self.active -= 1
+        if ticket.user_id is not None:
+            self._active_users[ticket.user_id] -= 1
+            if self._active_users[ticket.user_id] <= 0:
+                del self._active_users[ticket.user_id]
+        if ticket.chat_id is not None:
+            self._active_chats[ticket.chat_id] -= 1
+            if self._active_chats[ticket.chat_id] <= 0:
+                del self._active_chats[ticket.chat_id]
+        self._dispatch()
+
+    async def _acquire(
+        self,
+        ticket: JobTicket,
+        estimate: Callable[[JobTicket], Awaitable[None]] | None,
+    ) -> None:
+        if self._can_start(ticket) and self._next_waiter() is None:
+            self._start(ticket)
+            return
+        # Only jobs that actually wait pay for a metadata lookup.
+        if estimate is not None:
+            await estimate(ticket)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((ticket, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted a slot just before being cancelled.
+                self._finish(ticket)
+            else:
+                self._queue = [item for item in self._queue if item[1] is not future]
+            raise
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        ticket: JobTicket | None = None,
+        estimate: Callable[[JobTicket], Awaitable[None]] | None = None,
+        enforce_quota: bool = True,
+    ) -> AsyncIterator[JobTicket]:
+        if self.draining:
+            raise DrainingError("Not accepting new jobs while draining")
+        ticket = ticket or JobTicket()
+        if enforce_quota:
+            self.check_quota(ticket)
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks.add(task)
+            self._waiters.add(task)
+        if ticket.user_id is not None:
+            self._pending_users[ticket.user_id] += 1
+        try:
+            self.waiting += 1
+            try:
+                await self._acquire(ticket, estimate)
+            finally:
+                self.waiting -= 1
+                self._waiters.discard(task)
+            try:
+                yield ticket
+            finally:
+                self._finish(ticket)
+        finally:
+            if ticket.user_id is not None:
+                self._pending_users[ticket.user_id] -= 1
+                if self._pending_users[ticket.user_id] <= 0:
+                    del self._pending_users[ticket.user_id]
+            self._tasks.discard(task)
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT_SECONDS) -> int:
+        # Stops admitting jobs, waits up to `timeout` for running ones and
+        # cancels the rest. Returns how many jobs had to be cancelled.
+        self.draining = True
+        # Jobs still waiting for a slot are handed off right away.
+        for task in self._waiters:
+            task.cancel()
+        pending = set(self._tasks)
+        if pending:
+            logger.info("Draining %s job(s), waiting up to %.0fs",
+                        len(pending), timeout)
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("Drain timed out; cancelled %s job(s)", len(pending))
+        return len(pending)
+
+
+JOB_LIMITER = JobLimiter(MAX_CONCURRENT_JOBS)
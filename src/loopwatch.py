@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import suppress
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# A callback holding the event loop longer than this gets its stack logged;
+# 0 disables the watchdog.
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+_HEARTBEAT_SECONDS = 0.1
+_LAG_SMOOTHING = 0.1
+
+
+class LoopWatchdog:
+    # A heartbeat coroutine wakes every _HEARTBEAT_SECONDS and records how
+    # late it ran: that delay is the event loop lag. A separate thread checks
+    # the heartbeat and, once it is overdue by more than the threshold,
+    # logs the loop thread's stack while the blocking callback is still on
+    # it. One stack is logged per stall.
+    def __init__(self, threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.lag = 0.0  # smoothed, seconds
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._beats = 0
+        self._reported_beat = -1
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + _HEARTBEAT_SECONDS
+            await asyncio.sleep(_HEARTBEAT_SECONDS)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lag += (lag - self.lag) * _LAG_SMOOTHING
+            self.max_lag = max(self.max_lag, lag)
+            self._beat = now
+            self._beats += 1
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 2):
+            beats, blocked = self._beats, time.monotonic() - self._beat
+            if blocked - _HEARTBEAT_SECONDS < self.threshold or beats == self._reported_beat:
+                continue
+            self._reported_beat = beats
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread or 0)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(unavailable)\n"
+            logger.warning("Event loop blocked for %.0fms so far; loop thread stack:\n%s",
+                           blocked * 1000, stack.rstrip())
+
+    def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "lag_ms": round(self.lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "threshold_ms": self.threshold * 1000,
+        }
+
+
+LOOP_WATCHDOG = LoopWatchdog()
@@ -1,26 +1,76 @@
-from .downloader import download_video
+from .bandwidth import BANDWIDTH
+from .downloader import cancel_downloads, download_video, media_details, probe_video
+from .egress import ROUTE_POOL
+from .encoder import ENCODER
+from .health import HEALTH
+from .http_server import HttpServer
+from .jobqueue import (
+    STAGE_COMPRESSED,
+    STAGE_DOWNLOADED,
+    STAGE_DOWNLOADING,
+    STAGE_UPLOADING,
+    MEDIA_DOCUMENT,
+    MEDIA_VIDEO,
+    MODE_AUDIO,
+    MODE_VIDEO,
+    DownloadJob,
+    SqliteJobQueue,
+    UploadedMedia,
+    get_job_queue,
+)
+from .media_cache import MEDIA_CACHE, video_id_from_url
+from .loopwatch import LOOP_WATCHDOG
+from .potokens import PO_TOKEN_POOL
+from .jobs import (
+    JOB_LIMITER,
+    MAX_CONCURRENT_JOBS,
+    DrainingError,
+    JobTicket,
+    QuotaExceeded,
+)
+from .telegram_requests import configure_requests
+from .upload import MmapUploadReader
+from .workspace import (
+    DISK_BUDGET,
+    SWEEPER,
+    expected_download_bytes,
+    job_workspace,
+    release_workspace,
+    remove_workspace,
+)
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
+    InlineQueryHandler,
     MessageHandler,
     filters,
 )
-from telegram.error import BadRequest, Conflict
+from telegram.error import BadRequest, Conflict, TelegramError
 from telegram.constants import ChatAction
 import asyncio
 import logging
 import os
+import signal
 import socket
-import threading
 import time
+import urllib.request
+import uuid
 from asyncio.subprocess import DEVNULL
+from collections import OrderedDict
 from contextlib import suppress
-from typing import BinaryIO, cast
+from typing import Any, Callable, cast
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from flask import Flask
-from telegram import Update
+from telegram import (
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedVideo,
+    InlineQueryResultsButton,
+    InputFile,
+    Message,
+    Update,
+)
 
 
 logging.basicConfig(
@@ -35,9 +85,16 @@ APP_ENV = os.getenv("APP_ENV", "local")
 INSTANCE_NAME = os.getenv("INSTANCE_NAME", socket.gethostname())
 HOSTNAME = socket.gethostname()
 PROCESS_ID = os.getpid()
+# The boot suffix tells this process apart from an earlier one that ran
+# with the same PID, e.g. as PID 1 in a container restarted in place.
+WORKER_ID = f"{INSTANCE_NAME}:{HOSTNAME}:{PROCESS_ID}-{uuid.uuid4().hex[:8]}"
 BOT_API_BASE_URL = os.getenv("TELEGRAM_BOT_API_BASE_URL")
 BOT_API_FILE_URL = os.getenv("TELEGRAM_BOT_API_FILE_URL")
 BOT_API_HOSTPORT = os.getenv("TELEGRAM_BOT_API_HOSTPORT")
+PORT = int(os.getenv("PORT", "10000"))
+# "standalone" downloads in-process; "ingress" only enqueues jobs for
+# `python -m src.worker` processes sharing JOB_QUEUE_PATH.
+BOT_ROLE = os.getenv("BOT_ROLE", "standalone").lower()
 
 if not BOT_API_BASE_URL and BOT_API_HOSTPORT:
     BOT_API_BASE_URL = f"http://{BOT_API_HOSTPORT}/bot"
@@ -69,6 +126,34 @@ MAX_VIDEO_SIZE_MB = min(
     MAX_UPLOAD_SIZE_MB,
 )
 DOWNLOAD_TARGET_SIZE_MB = MAX_VIDEO_SIZE_MB
+FFMPEG_TERMINATE_TIMEOUT_SECONDS = 5
+# "document" uploads files as is; "stream" remuxes MP4s so the index comes
+# first and sends them with send_video, so playback starts before the
+# whole file is downloaded.
+VIDEO_DELIVERY = os.getenv("VIDEO_DELIVERY", "document").lower()
+# Outputs written with -movflags +faststart, which need no remux.
+_FASTSTART_SUFFIXES = (".compressed.mp4", ".faststart.mp4")
+_THUMBNAIL_MAX_BYTES = 200 * 1024
+# Encodes that overshoot the upload limit are retried at a lower bitrate.
+_ENCODE_ATTEMPTS = 3
+# A one-pass attempt reads the whole source again, so it is retried once
+# and then left to download-then-compress.
+_FUSED_ENCODE_ATTEMPTS = 2
+_OVERSHOOT_ERROR = "Compressed file is still above upload limit"
+# When the probed formats cannot fit the upload limit, ffmpeg reads the
+# stream URLs and compresses in one pass instead of after the download.
+FUSED_TRANSCODE = os.getenv("FUSED_TRANSCODE", "1").lower() in ("1", "true", "yes")
+# Rough throughput assumptions used to rank waiting jobs by expected work.
+_ESTIMATE_DOWNLOAD_BYTES_PER_SECOND = 10 * 1024 * 1024
+_ESTIMATE_ENCODE_SPEED = 2.0
+# Inline queries for videos nobody has fetched yet are uploaded here (a
+# private channel the bot posts to); without it, to the asking user's
+# private chat with the bot.
+INLINE_CACHE_CHAT_ID = os.getenv("INLINE_CACHE_CHAT_ID")
+INLINE_RESULT_CACHE_SECONDS = int(os.getenv("INLINE_RESULT_CACHE_SECONDS", "300"))
+_UPLOADED_MEDIA_MEMORY = 4096
+_uploaded_media: OrderedDict[str, UploadedMedia] = OrderedDict()
+_inline_fetches: dict[str, asyncio.Task] = {}
 _last_conflict_log_time = 0.0
 
 if CONFIGURED_MAX_UPLOAD_SIZE_MB > ENDPOINT_UPLOAD_LIMIT_MB:
@@ -81,25 +166,6 @@ if CONFIGURED_MAX_UPLOAD_SIZE_MB > ENDPOINT_UPLOAD_LIMIT_MB:
         MAX_UPLOAD_SIZE_MB,
     )
 
-app = Flask(__name__)
-
-
-class UploadProgressReader:
-    def __init__(self, stream: BinaryIO, total_bytes: int):
-        self._stream = stream
-        self.total_bytes = total_bytes
-        self.bytes_read = 0
-
-    def read(self, size: int = -1) -> bytes:
-        chunk = self._stream.read(size)
-        if chunk:
-            self.bytes_read += len(chunk)
-        return chunk
-
-    def __getattr__(self, name: str):
-        return getattr(self._stream, name)
-
-
 def _format_bytes(num_bytes: int) -> str:
     megabytes = num_bytes / (1024 * 1024)
     if megabytes < 1024:
@@ -187,7 +253,8 @@ async def _telegram_error_handler(
         if now - _last_conflict_log_time >= 60:
             logger.error(
                 "Telegram getUpdates conflict. Another bot instance is using this "
-                "BOT_TOKEN. Keep only one active instance per token. "
+                "BOT_TOKEN. Keep only one active instance per token; scale out "
+                "with BOT_ROLE=ingress plus src.worker processes instead. "
                 "env=%s instance=%s host=%s pid=%s token=%s",
                 APP_ENV,
                 INSTANCE_NAME,
@@ -201,6 +268,45 @@ async def _telegram_error_handler(
     logger.exception("Unhandled Telegram error: %s", error, exc_info=error)
 
 
+async def _journal(action: Callable[[SqliteJobQueue], Any]) -> Any:
+    # The journal only enables crash recovery; a failing journal write must
+    # never fail the download itself.
+    try:
+        return await asyncio.to_thread(lambda: action(get_job_queue()))
+    except Exception as exc:
+        logger.warning("Job journal update failed: %s", exc)
+        return None
+
+
+# File system calls go through worker threads: on a network volume one stat
+# or unlink can take long enough to stall every other chat.
+async def _path_exists(path: str) -> bool:
+    return await asyncio.to_thread(os.path.exists, path)
+
+
+async def _file_size(path: str) -> int:
+    return await asyncio.to_thread(os.path.getsize, path)
+
+
+async def _remove_file(path: str) -> None:
+    with suppress(FileNotFoundError):
+        await asyncio.to_thread(os.remove, path)
+
+
+async def _terminate_process(process: asyncio.subprocess.Process) -> None:
+    # Give ffmpeg a chance to exit cleanly before killing it.
+    if process.returncode is not None:
+        return
+    with suppress(ProcessLookupError):
+        process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), FFMPEG_TERMINATE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        with suppress(ProcessLookupError):
+            process.kill()
+        await process.wait()
+
+
 async def _probe_duration_seconds(file_path: str) -> float | None:
     try:
         process = await asyncio.create_subprocess_exec(
@@ -217,7 +323,11 @@ async def _probe_duration_seconds(file_path: str) -> float | None:
         )
     except FileNotFoundError:
         return None
-    stdout, _ = await process.communicate()
+    try:
+        stdout, _ = await process.communicate()
+    except asyncio.CancelledError:
+        await _terminate_process(process)
+        raise
     if process.returncode != 0:
         return None
     try:
@@ -237,10 +347,45 @@ async def _compress_video_to_limit(
     if duration_seconds is None:
         return None, "Could not determine video duration for compression"
 
+    base_name, _ = os.path.splitext(file_path)
+    return await _encode_to_limit(["-i", file_path], duration_seconds,
+                                  max_size_mb, f"{base_name}.compressed.mp4")
+
+
+async def _encode_to_limit(
+    source_args: list[str],
+    duration_seconds: float,
+    max_size_mb: int,
+    compressed_path: str,
+    attempts: int = _ENCODE_ATTEMPTS,
+) -> tuple[str | None, str | None]:
     target_size_bytes = int(max_size_mb * 1024 * 1024 * 0.95)
     if target_size_bytes <= 0:
         return None, "Invalid upload size limit"
+    max_size_bytes = max_size_mb * 1024 * 1024
 
+    for attempt in range(1, attempts + 1):
+        compressed_size, error = await _encode_at_bitrate(
+            source_args, duration_seconds, target_size_bytes, compressed_path)
+        if error is not None:
+            return None, error
+        if compressed_size <= max_size_bytes:
+            return compressed_path, None
+        await _remove_file(compressed_path)
+        # Scale the target by the overshoot, with some extra margin.
+        target_size_bytes = int(target_size_bytes * max_size_bytes / compressed_size * 0.95)
+        logger.info("Compressed file overshot the limit (%.1fMB, attempt %s/%s)",
+                    compressed_size / (1024 * 1024), attempt, attempts)
+
+    return None, _OVERSHOOT_ERROR
+
+
+async def _encode_at_bitrate(
+    source_args: list[str],
+    duration_seconds: float,
+    target_size_bytes: int,
+    compressed_path: str,
+) -> tuple[int, str | None]:
     audio_bitrate_kbps = 96
     total_bitrate_kbps = int((target_size_bytes * 8) /
                              (duration_seconds * 1000))
@@ -248,15 +393,16 @@ async def _compress_video_to_limit(
     max_rate_kbps = int(video_bitrate_kbps * 1.1)
     buffer_size_kbps = max(video_bitrate_kbps * 2, 400)
 
-    base_name, _ = os.path.splitext(file_path)
-    compressed_path = f"{base_name}.compressed.mp4"
-
-    try:
-        process = await asyncio.create_subprocess_exec(
+    # Encodes share the cores left after ENCODER_RESERVED_CORES, so the
+    # event loop stays responsive while they run.
+    async with ENCODER.slot():
+        # Looks up ffmpeg and the priority launcher on the PATH.
+        command = await asyncio.to_thread(
+            ENCODER.command,
             "ffmpeg",
             "-y",
-            "-i",
-            file_path,
+            *source_args,
+            *ENCODER.ffmpeg_args(),
             "-c:v",
             "libx264",
             "-preset",
@@ -274,37 +420,82 @@ async def _compress_video_to_limit(
             "-movflags",
             "+faststart",
             compressed_path,
+        )
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=DEVNULL, stderr=DEVNULL)
+        except FileNotFoundError:
+            return 0, "ffmpeg is not installed"
+        try:
+            await process.wait()
+        except asyncio.CancelledError:
+            await _terminate_process(process)
+            await _remove_file(compressed_path)
+            raise
+
+    if process.returncode != 0 or not await _path_exists(compressed_path):
+        await _remove_file(compressed_path)
+        return 0, "ffmpeg compression failed"
+    return await _file_size(compressed_path), None
+
+
+async def _remux_faststart(file_path: str) -> str | None:
+    # Stream copy only: rewrites the container with the moov atom first,
+    # so it costs about one read and one write of the file.
+    base_name, _ = os.path.splitext(file_path)
+    remuxed_path = f"{base_name}.faststart.mp4"
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-y",
+            "-i",
+            file_path,
+            "-map",
+            "0",
+            "-c",
+            "copy",
+            "-movflags",
+            "+faststart",
+            remuxed_path,
             stdout=DEVNULL,
             stderr=DEVNULL,
         )
     except FileNotFoundError:
-        return None, "ffmpeg is not installed"
-    await process.wait()
-
-    if process.returncode != 0 or not os.path.exists(compressed_path):
-        with suppress(FileNotFoundError):
-            os.remove(compressed_path)
-        return None, "ffmpeg compression failed"
+        logger.warning("ffmpeg is not installed; sending %s without remux", file_path)
+        return None
+    try:
+        await process.wait()
+    except asyncio.CancelledError:
+        await _terminate_process(process)
+        await _remove_file(remuxed_path)
+        raise
+    if process.returncode != 0 or not await _path_exists(remuxed_path):
+        logger.warning("Faststart remux failed for %s", file_path)
+        await _remove_file(remuxed_path)
+        return None
+    return remuxed_path
 
-    max_size_bytes = max_size_mb * 1024 * 1024
-    if os.path.getsize(compressed_path) > max_size_bytes:
-        with suppress(FileNotFoundError):
-            os.remove(compressed_path)
-        return None, "Compressed file is still above upload limit"
 
-    return compressed_path, None
+def _download_thumbnail(url: str) -> bytes | None:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            data = response.read(_THUMBNAIL_MAX_BYTES + 1)
+    except OSError as exc:
+        logger.info("Could not fetch thumbnail %s: %s", url, exc)
+        return None
+    return data if len(data) <= _THUMBNAIL_MAX_BYTES else None
 
 
 async def _track_upload_progress(
     status_msg,
-    progress_reader: UploadProgressReader,
+    progress_reader: MmapUploadReader,
     video_title: str,
     video_author: str,
 ):
     last_step = -1
     while True:
         total_bytes = progress_reader.total_bytes
-        sent_bytes = min(progress_reader.bytes_read, total_bytes)
+        sent_bytes = min(progress_reader.bytes_sent, total_bytes)
         percent = 100 if total_bytes == 0 else int(
             (sent_bytes * 100) / total_bytes)
         step = 100 if percent == 100 else (percent // 5) * 5
@@ -331,16 +522,6 @@ async def _track_upload_progress(
         await asyncio.sleep(1)
 
 
-@app.route("/")
-def health_check():
-    return "<html><body><h1>Bot Status</h1><p>Everything is operational</p></body></html>", 200
-
-
-def run_flask():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
-
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.effective_message
     if msg is None:
@@ -348,7 +529,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     await msg.reply_text(
-        "🎬 Send a YouTube link and I'll return the video."
+        "🎬 Send a YouTube link and I'll return the video.\n"
+        "🎧 Send /audio followed by a link for just the audio."
     )
 
 
@@ -356,30 +538,547 @@ async def handle_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.effective_message
     if msg is None or msg.text is None:
         return
+    await _handle_request(update, context, msg, msg.text.strip(), MODE_VIDEO)
+
 
-    url = msg.text.strip()
+async def handle_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.effective_message
+    if msg is None:
+        return
+    if not context.args:
+        await msg.reply_text("🎧 Send /audio followed by a YouTube link.")
+        return
+    await _handle_request(update, context, msg, context.args[0], MODE_AUDIO)
+
+
+async def _handle_request(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    msg,
+    url: str,
+    mode: str,
+) -> None:
     user = update.effective_user
     username = user.username if user else "unknown"
     user_id = user.id if user else "unknown"
-    logger.info("Download request: user=%s (%s) url=%s",
-                username, user_id, url)
+    logger.info("Download request: user=%s (%s) url=%s mode=%s",
+                username, user_id, url, mode)
     if "youtube.com" not in url and "youtu.be" not in url:
         await msg.reply_text("❌ Please send a valid YouTube link.")
         return
 
-    status_msg = await msg.reply_text("⏳ Downloading video...")
     chat = update.effective_chat
+    ticket = JobTicket(
+        user_id=user.id if user else None,
+        chat_id=chat.id if chat else None,
+    )
+    try:
+        if BOT_ROLE == "ingress":
+            await _check_queued_quota(ticket)
+        else:
+            JOB_LIMITER.check_quota(ticket)
+    except QuotaExceeded as exc:
+        await _reply_over_quota(msg, exc)
+        return
+
+    # While draining, new requests are queued for the next instance instead.
+    if chat is not None and (BOT_ROLE == "ingress" or JOB_LIMITER.draining):
+        status_msg = await msg.reply_text("⏳ Queued for download...")
+        job = DownloadJob(
+            chat_id=chat.id,
+            chat_type=chat.type,
+            message_id=msg.message_id,
+            status_message_id=status_msg.message_id,
+            url=url,
+            user_id=user.id if user else None,
+            mode=mode,
+        )
+        await asyncio.to_thread(get_job_queue().enqueue, job)
+        return
+
+    status_msg = await msg.reply_text(_downloading_text(mode))
+    job = None
     if chat is not None:
         await context.bot.send_chat_action(
             chat_id=chat.id,
-            action=ChatAction.UPLOAD_VIDEO,
+            action=_chat_action(mode),
+        )
+        new_job = DownloadJob(
+            chat_id=chat.id,
+            chat_type=chat.type,
+            message_id=msg.message_id,
+            status_message_id=status_msg.message_id,
+            url=url,
+            user_id=user.id if user else None,
+            mode=mode,
         )
+        job = await _journal(lambda queue: queue.start(new_job, WORKER_ID))
+
+    lease_task = asyncio.create_task(_keep_lease(job))
+    try:
+        async with JOB_LIMITER.slot(ticket, estimate=_job_estimator(url, job, mode)):
+            await _download_and_send(msg, status_msg, url, job=job,
+                                     info=ticket.info, mode=mode)
+    except DrainingError:
+        await _hand_off(job, status_msg)
+        return
+    except QuotaExceeded as exc:
+        if job is not None:
+            reason = str(exc)
+            await _journal(lambda queue: queue.fail(job.job_id, reason))
+        await _reply_over_quota(status_msg, exc, edit=True)
+        return
+    except asyncio.CancelledError:
+        await _hand_off(job, status_msg)
+        raise
+    except Exception as exc:
+        if job is not None:
+            error = str(exc)
+            await _journal(lambda queue: queue.fail(job.job_id, error))
+        raise
+    finally:
+        await _cancel_task(lease_task)
+    if job is not None:
+        await _journal(lambda queue: queue.complete(job.job_id))
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Answered from file_ids of earlier uploads only: no yt-dlp call, so the
+    # answer goes out within one journal lookup.
+    query = update.inline_query
+    if query is None:
+        return
+    url = query.query.strip()
+    video_id = video_id_from_url(url)
+    if video_id is None:
+        await query.answer([], cache_time=INLINE_RESULT_CACHE_SECONDS)
+        return
+
+    media = await _lookup_upload(video_id)
+    if media is not None:
+        title = _truncate_text(media.title, max_len=90, fallback="YouTube video")
+        author = _truncate_text(media.author, max_len=70, fallback="Unknown author")
+        result: InlineQueryResultCachedDocument | InlineQueryResultCachedVideo
+        if media.kind == MEDIA_VIDEO:
+            result = InlineQueryResultCachedVideo(
+                id=video_id,
+                video_file_id=media.file_id,
+                title=title,
+                description=author,
+                caption=f"🎬 {title}\n👤 {author}",
+            )
+        else:
+            result = InlineQueryResultCachedDocument(
+                id=video_id,
+                title=title,
+                document_file_id=media.file_id,
+                description=author,
+                caption=f"🎬 {title}\n👤 {author}",
+            )
+        await query.answer([result], cache_time=INLINE_RESULT_CACHE_SECONDS)
+        return
+
+    # Without a cache chat there is nowhere to fetch to but the asker's
+    # private chat, which they did not ask for; they can send the link to
+    # the bot themselves.
+    if INLINE_CACHE_CHAT_ID:
+        _start_inline_fetch(context.bot, url, video_id, query.from_user.id)
+        text = "⏳ Fetching this video, try again in a minute"
+    else:
+        text = "📥 Not available yet: send the link to the bot first"
+    await query.answer(
+        [],
+        cache_time=0,
+        is_personal=True,
+        button=InlineQueryResultsButton(text=text, start_parameter="inline"),
+    )
+
+
+def _start_inline_fetch(bot, url: str, video_id: str, user_id: int) -> None:
+    if video_id in _inline_fetches:
+        return
+    task = asyncio.create_task(_inline_fetch(bot, url, user_id))
+    _inline_fetches[video_id] = task
+    task.add_done_callback(lambda _: _inline_fetches.pop(video_id, None))
 
-    file_path, error, video_title, video_author = await asyncio.to_thread(download_video,
-                                                                          url, max_size_mb=DOWNLOAD_TARGET_SIZE_MB
-                                                                          )
 
-    if not file_path or not os.path.exists(file_path):
+async def _inline_fetch(bot, url: str, user_id: int) -> None:
+    # Runs the regular pipeline into INLINE_CACHE_CHAT_ID; the upload
+    # records the file_id the next query needs.
+    chat_id = int(cast(str, INLINE_CACHE_CHAT_ID))
+    ticket = JobTicket(user_id=user_id, chat_id=chat_id)
+    try:
+        if BOT_ROLE == "ingress":
+            await _check_queued_quota(ticket)
+        else:
+            JOB_LIMITER.check_quota(ticket)
+        status_msg = await bot.send_message(
+            chat_id=chat_id, text="⏳ Fetching video for inline sharing...")
+    except QuotaExceeded:
+        return
+    except TelegramError as exc:
+        # Typically a cache chat the bot was removed from.
+        logger.warning("Cannot fetch %s for inline use in chat %s: %s",
+                       url, chat_id, exc)
+        return
+
+    if BOT_ROLE == "ingress" or JOB_LIMITER.draining:
+        job = DownloadJob(
+            chat_id=chat_id,
+            chat_type=status_msg.chat.type,
+            message_id=status_msg.message_id,
+            status_message_id=status_msg.message_id,
+            url=url,
+            user_id=user_id,
+        )
+        await asyncio.to_thread(get_job_queue().enqueue, job)
+        return
+    try:
+        async with JOB_LIMITER.slot(ticket, estimate=_job_estimator(url, None)):
+            await _download_and_send(status_msg, status_msg, url, info=ticket.info)
+    except (DrainingError, QuotaExceeded):
+        with suppress(TelegramError):
+            await status_msg.delete()
+    except Exception as exc:
+        logger.error("Inline fetch failed for %s: %s", url, exc)
+
+
+async def _check_queued_quota(ticket: JobTicket) -> None:
+    # Ingress instances throttle on the shared queue, since the jobs run in
+    # worker processes.
+    limit = JOB_LIMITER.max_pending_per_user
+    if limit <= 0 or ticket.user_id is None:
+        return
+    pending = await _journal(lambda queue: queue.pending_for_user(ticket.user_id))
+    if pending is not None and pending >= limit:
+        raise QuotaExceeded(pending)
+
+
+async def _reply_over_quota(msg, exc: QuotaExceeded, edit: bool = False) -> None:
+    text = (
+        f"✋ You already have {exc.pending} downloads in progress. "
+        "Please send this link again once they finish."
+    )
+    with suppress(Exception):
+        if edit:
+            await msg.edit_text(text)
+        else:
+            await msg.reply_text(text)
+
+
+def _whole_seconds(duration: float | None) -> int | None:
+    return int(duration) if duration else None
+
+
+def _downloading_text(mode: str) -> str:
+    return "⏳ Downloading audio..." if mode == MODE_AUDIO else "⏳ Downloading video..."
+
+
+def _chat_action(mode: str) -> str:
+    return ChatAction.UPLOAD_VOICE if mode == MODE_AUDIO else ChatAction.UPLOAD_VIDEO
+
+
+def _estimate_job_seconds(
+    info: dict[str, Any] | None,
+    mode: str = MODE_VIDEO,
+) -> float | None:
+    # Expected download time plus compression time when the file will not
+    # fit the upload limit. Audio is never compressed.
+    if not info:
+        return None
+    nbytes = expected_download_bytes(info, 0)
+    duration = float(info.get("duration") or 0)
+    if not nbytes:
+        # Sizes are unknown for some streams; duration still ranks them.
+        return duration or None
+    seconds = nbytes / _ESTIMATE_DOWNLOAD_BYTES_PER_SECOND
+    if mode == MODE_VIDEO and nbytes > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        seconds += duration / _ESTIMATE_ENCODE_SPEED
+    return seconds
+
+
+def _job_estimator(url: str, job: DownloadJob | None, mode: str = MODE_VIDEO):
+    async def estimate(ticket: JobTicket) -> None:
+        # Resumed and cached jobs skip the download, so they are cheap.
+        if job is not None and job.file_path and await _path_exists(job.file_path):
+            ticket.cost = 0
+            return
+        video_id = video_id_from_url(url)
+        if video_id and await asyncio.to_thread(
+                MEDIA_CACHE.contains, video_id, _cache_profile(mode)):
+            ticket.cost = 0
+            return
+        info = await asyncio.to_thread(probe_video, url, _download_target_mb(mode),
+                                       mode == MODE_AUDIO)
+        seconds = _estimate_job_seconds(info, mode)
+        if seconds is not None:
+            ticket.cost = seconds
+            ticket.info = info
+        logger.info("Queued job for %s with estimated cost %.0fs", url, ticket.cost)
+
+    return estimate
+
+
+async def _hand_off(job: DownloadJob | None, status_msg) -> None:
+    # Puts an unfinished job back in the job queue so the next instance
+    # finishes it from its last recorded stage.
+    if job is not None:
+        await _journal(lambda queue: queue.release(job.job_id))
+    await _notify_handed_off(status_msg, resumable=job is not None)
+
+
+async def _notify_handed_off(status_msg, resumable: bool = True) -> None:
+    text = (
+        "⏳ The bot is restarting, your download will continue shortly..."
+        if resumable
+        else "❌ The bot is restarting, please send the link again in a minute."
+    )
+    with suppress(Exception):
+        await asyncio.wait_for(status_msg.edit_text(text), timeout=5)
+
+
+def _disk_admission(
+    workspace: str,
+    mode: str = MODE_VIDEO,
+) -> Callable[[dict[str, Any]], str | None]:
+    def admit(info: dict[str, Any]) -> str | None:
+        upload_limit_bytes = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+        nbytes = expected_download_bytes(
+            info, _download_target_mb(mode) * 1024 * 1024)
+        if mode == MODE_AUDIO:
+            # The extracted copy is written before the download is removed.
+            nbytes *= 2
+        elif nbytes > upload_limit_bytes:
+            # Room for the compressed copy written next to the original.
+            nbytes += upload_limit_bytes
+        return DISK_BUDGET.admit(workspace, nbytes)
+
+    return admit
+
+
+def _download_target_mb(mode: str) -> int:
+    # Audio is sent as downloaded, so it has to fit the upload limit as is.
+    return MAX_UPLOAD_SIZE_MB if mode == MODE_AUDIO else DOWNLOAD_TARGET_SIZE_MB
+
+
+def _cache_profile(mode: str = MODE_VIDEO) -> str:
+    # Files cached under other size limits may not fit this instance's.
+    if mode == MODE_AUDIO:
+        return f"audio-{MAX_UPLOAD_SIZE_MB}mb"
+    return f"{DOWNLOAD_TARGET_SIZE_MB}-{MAX_UPLOAD_SIZE_MB}mb"
+
+
+async def _cache_upload(
+    video_id: str,
+    file_path: str,
+    title: str | None,
+    author: str | None,
+    mode: str = MODE_VIDEO,
+) -> None:
+    try:
+        await asyncio.to_thread(MEDIA_CACHE.put, video_id, _cache_profile(mode),
+                                file_path, title, author)
+    except OSError as exc:
+        logger.warning("Could not cache %s: %s", video_id, exc)
+
+
+async def _remember_upload(media: UploadedMedia) -> None:
+    _uploaded_media[media.video_id] = media
+    _uploaded_media.move_to_end(media.video_id)
+    while len(_uploaded_media) > _UPLOADED_MEDIA_MEMORY:
+        _uploaded_media.popitem(last=False)
+    await _journal(lambda queue: queue.record_upload(media))
+
+
+async def _lookup_upload(video_id: str) -> UploadedMedia | None:
+    # Workers sharing the journal record their uploads there too, so a
+    # miss in memory still checks the journal before giving up.
+    media = _uploaded_media.get(video_id)
+    if media is None:
+        media = await _journal(lambda queue: queue.uploaded_media(video_id))
+        if media is None:
+            return None
+        _uploaded_media[video_id] = media
+        while len(_uploaded_media) > _UPLOADED_MEDIA_MEMORY:
+            _uploaded_media.popitem(last=False)
+    _uploaded_media.move_to_end(video_id)
+    return media
+
+
+def _info_author(info: dict[str, Any]) -> str | None:
+    return info.get("uploader") or info.get("channel") or info.get("creator")
+
+
+def _fused_source_args(info: dict[str, Any] | None, mode: str) -> list[str] | None:
+    # ffmpeg inputs for the selected formats when the download would have
+    # to be compressed anyway, or None to download first.
+    if not FUSED_TRANSCODE or mode != MODE_VIDEO or not info or not info.get("duration"):
+        return None
+    if expected_download_bytes(info, 0) <= MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+        return None
+    # YouTube binds stream URLs to the address that extracted them, which
+    # ffmpeg cannot use when the probe went through a proxy or another
+    # source address.
+    if len(ROUTE_POOL) > 0:
+        return None
+    streams = info.get("requested_formats") or [info]
+    if any(not fmt.get("url") or fmt.get("protocol") not in ("http", "https")
+           for fmt in streams):
+        return None
+    args: list[str] = []
+    for fmt in streams:
+        headers = "".join(f"{name}: {value}\r\n"
+                          for name, value in (fmt.get("http_headers") or {}).items())
+        if headers:
+            args += ["-headers", headers]
+        args += ["-reconnect", "1", "-reconnect_on_network_error", "1", "-i", fmt["url"]]
+    for index, fmt in enumerate(streams):
+        if fmt.get("vcodec") != "none":
+            args += ["-map", f"{index}:v:0"]
+        if fmt.get("acodec") != "none":
+            args += ["-map", f"{index}:a:0"]
+    return args
+
+
+def _paced_inputs(source_args: list[str], info: dict[str, Any], allocation: float) -> list[str]:
+    # ffmpeg cannot be paced from a progress hook, so each input is read at
+    # the speed that keeps the job within its bandwidth allocation at the
+    # start of the encode.
+    streams = info.get("requested_formats") or [info]
+    source_bytes = sum(fmt.get("filesize") or fmt.get("filesize_approx") or 0
+                       for fmt in streams)
+    source_rate = source_bytes / float(info["duration"])
+    if allocation <= 0 or source_rate <= 0:
+        return source_args
+    readrate = f"{allocation / source_rate:.3f}"
+    args: list[str] = []
+    for arg in source_args:
+        if arg == "-i":
+            args += ["-readrate", readrate]
+        args.append(arg)
+    return args
+
+
+async def _fused_transcode(
+    status_msg,
+    source_args: list[str],
+    info: dict[str, Any],
+    workspace: str,
+) -> tuple[str | None, str | None]:
+    # Skips the full-size intermediate file: network reads overlap the
+    # encode, and only the compressed output touches the disk.
+    from yt_dlp.utils import sanitize_filename
+
+    reason = await asyncio.to_thread(
+        DISK_BUDGET.admit, workspace, MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+    if reason:
+        return None, reason
+    expected_mb = expected_download_bytes(info, 0) / (1024 * 1024)
+    with suppress(Exception):
+        await status_msg.edit_text(
+            f"⚙️ Video is {expected_mb:.1f}MB, above the upload limit "
+            f"({MAX_UPLOAD_SIZE_MB}MB).\nDownloading and compressing in one pass..."
+        )
+    title = sanitize_filename(info.get("title") or "video", restricted=True)
+    compressed_path = os.path.join(workspace, f"{title}.compressed.mp4")
+    logger.info("One-pass compression: %s (size=%.1fMB, target=%dMB)",
+                info.get("webpage_url") or title, expected_mb, MAX_UPLOAD_SIZE_MB)
+    # Holds the job's share of LINK_BANDWIDTH_MBPS like a download does, so
+    # other downloads are paced around it.
+    meter = BANDWIDTH.register(workspace)
+    try:
+        return await _encode_to_limit(
+            _paced_inputs(source_args, info, meter.allocation),
+            float(info["duration"]), MAX_UPLOAD_SIZE_MB, compressed_path,
+            attempts=_FUSED_ENCODE_ATTEMPTS)
+    finally:
+        BANDWIDTH.unregister(meter)
+
+
+async def _download_and_send(
+    msg,
+    status_msg,
+    url: str,
+    job: DownloadJob | None = None,
+    info: dict[str, Any] | None = None,
+    mode: str = MODE_VIDEO,
+) -> None:
+    workspace = await asyncio.to_thread(
+        job_workspace, job.job_id if job is not None else uuid.uuid4().hex)
+    keep_workspace = False
+    try:
+        await _process_download(msg, status_msg, url, job, workspace, info, mode)
+    except asyncio.CancelledError:
+        # A journaled job resumes from its workspace after a hand-off.
+        keep_workspace = job is not None
+        raise
+    finally:
+        await asyncio.to_thread(
+            release_workspace if keep_workspace else remove_workspace, workspace)
+
+
+async def _process_download(
+    msg,
+    status_msg,
+    url: str,
+    job: DownloadJob | None,
+    workspace: str,
+    info: dict[str, Any] | None = None,
+    mode: str = MODE_VIDEO,
+) -> None:
+    video_id = video_id_from_url(url)
+    cached = None
+    media_info: dict[str, Any] = media_details(info) if info else {}
+    if job is not None and job.file_path and await _path_exists(job.file_path):
+        # A previous run already produced this file (a finished download or
+        # compressed output), so resume from there instead of starting over.
+        logger.info("Resuming job %s at stage %s: %s",
+                    job.job_id, job.stage, job.file_path)
+        file_path, error = job.file_path, None
+        video_title, video_author = job.title, job.author
+    elif video_id and (cached := await asyncio.to_thread(
+            MEDIA_CACHE.get, video_id, _cache_profile(mode), workspace)):
+        file_path, error = cached.path, None
+        video_title, video_author = cached.title, cached.author
+    else:
+        if job is not None:
+            await _journal(lambda queue: queue.update_stage(job, STAGE_DOWNLOADING))
+        file_path = None
+        source_args = _fused_source_args(info, mode)
+        if source_args is not None:
+            file_path, error = await _fused_transcode(
+                status_msg, source_args, info or {}, workspace)
+            if file_path is not None:
+                video_title = (info or {}).get("title")
+                video_author = _info_author(info or {})
+                if job is not None:
+                    await _journal(lambda queue: queue.update_stage(
+                        job, STAGE_COMPRESSED, file_path, video_title, video_author))
+            else:
+                logger.warning("One-pass compression failed for %s (%s); "
+                               "downloading first", url, error)
+        if file_path is None:
+            meter = BANDWIDTH.register(workspace)
+            try:
+                file_path, error, video_title, video_author = await asyncio.to_thread(
+                    download_video,
+                    url,
+                    download_folder=workspace,
+                    max_size_mb=_download_target_mb(mode),
+                    admit=_disk_admission(workspace, mode),
+                    info=info,
+                    progress_hook=BANDWIDTH.progress_hook(meter),
+                    concurrent_fragments=meter.fragment_concurrency,
+                    audio_only=mode == MODE_AUDIO,
+                    media_info=media_info,
+                )
+            finally:
+                BANDWIDTH.unregister(meter)
+            if job is not None and file_path:
+                await _journal(lambda queue: queue.update_stage(
+                    job, STAGE_DOWNLOADED, file_path, video_title, video_author))
+
+    if not file_path or not await _path_exists(file_path):
         logger.error("Download failed (%s): %s", url, error)
         await status_msg.edit_text(_friendly_download_error(error))
         return
@@ -395,7 +1094,15 @@ async def handle_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
         fallback="Unknown author",
     )
 
-    file_size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    file_size_mb = await _file_size(file_path) / (1024 * 1024)
+    if mode == MODE_AUDIO and file_size_mb > MAX_UPLOAD_SIZE_MB:
+        # Re-encoding would defeat the point of the fast path.
+        await _remove_file(file_path)
+        await status_msg.edit_text(
+            f"❌ Audio is {file_size_mb:.1f}MB, above the upload limit "
+            f"({MAX_UPLOAD_SIZE_MB}MB)."
+        )
+        return
     if file_size_mb > MAX_UPLOAD_SIZE_MB:
         await status_msg.edit_text(
             f"⚙️ Video is {file_size_mb:.1f}MB, above the upload limit "
@@ -407,21 +1114,43 @@ async def handle_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
             file_path=file_path, max_size_mb=MAX_UPLOAD_SIZE_MB
         )
         if compressed_file_path is None:
-            os.remove(file_path)
+            await _remove_file(file_path)
             await status_msg.edit_text(
                 "❌ Video is too large and could not be compressed to fit the upload "
                 "limit."
             )
             logger.error("Compression failed: %s", compress_error)
             return
-        os.remove(file_path)
+        if job is not None:
+            await _journal(lambda queue: queue.update_stage(
+                job, STAGE_COMPRESSED, compressed_file_path))
+        await _remove_file(file_path)
         file_path = compressed_file_path
 
+    streamable = (VIDEO_DELIVERY == "stream" and mode == MODE_VIDEO
+                  and file_path.endswith(".mp4"))
+    if streamable and not file_path.endswith(_FASTSTART_SUFFIXES):
+        remuxed_file_path = await _remux_faststart(file_path)
+        if remuxed_file_path is None:
+            streamable = False
+        else:
+            if job is not None:
+                await _journal(lambda queue: queue.update_stage(
+                    job, job.stage, remuxed_file_path))
+            await _remove_file(file_path)
+            file_path = remuxed_file_path
+    thumbnail = None
+    if streamable and media_info.get("thumbnail"):
+        thumbnail = await asyncio.to_thread(
+            _download_thumbnail, media_info["thumbnail"])
+
+    if job is not None:
+        await _journal(lambda queue: queue.update_stage(job, STAGE_UPLOADING))
+
+    keep_file = False
     try:
-        file_size_bytes = os.path.getsize(file_path)
-        with open(file_path, "rb") as raw_video:
-            progress_video = UploadProgressReader(
-                raw_video, total_bytes=file_size_bytes)
+        progress_video = await asyncio.to_thread(MmapUploadReader.open, file_path)
+        try:
             progress_task = asyncio.create_task(
                 _track_upload_progress(
                     status_msg, progress_video, display_title, display_author
@@ -430,26 +1159,70 @@ async def handle_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
             upload_completed = False
             try:
                 logger.info("Starting Telegram upload: %s (size=%.1fMB)",
-                            display_title, os.path.getsize(file_path) / (1024 * 1024))
-                await msg.reply_document(
-                    document=cast(BinaryIO, progress_video),
+                            display_title, progress_video.total_bytes / (1024 * 1024))
+                # Stream the mapping instead of letting PTB read the whole
+                # file into memory first.
+                upload = InputFile(
+                    progress_video,
                     filename=os.path.basename(file_path),
-                    caption=f"🎬 {display_title}\n👤 {display_author}",
+                    read_file_handle=False,
+                )
+                timeouts: dict[str, Any] = dict(
                     read_timeout=1200,
                     write_timeout=1200,
                     connect_timeout=120,
                     pool_timeout=120,
                 )
+                with BANDWIDTH.uploading():
+                    if mode == MODE_AUDIO:
+                        sent = await msg.reply_audio(
+                            audio=upload,
+                            caption=f"🎧 {display_title}\n👤 {display_author}",
+                            duration=_whole_seconds(media_info.get("duration")),
+                            performer=video_author,
+                            title=video_title,
+                            **timeouts,
+                        )
+                    elif streamable:
+                        sent = await msg.reply_video(
+                            video=upload,
+                            caption=f"🎬 {display_title}\n👤 {display_author}",
+                            supports_streaming=True,
+                            duration=_whole_seconds(media_info.get("duration")),
+                            width=media_info.get("width"),
+                            height=media_info.get("height"),
+                            thumbnail=thumbnail,
+                            **timeouts,
+                        )
+                    else:
+                        sent = await msg.reply_document(
+                            document=upload,
+                            caption=f"🎬 {display_title}\n👤 {display_author}",
+                            **timeouts,
+                        )
                 upload_completed = True
                 logger.info("Telegram upload completed: %s", display_title)
+                if video_id and isinstance(sent, Message) and sent.document:
+                    await _remember_upload(UploadedMedia(
+                        video_id, sent.document.file_id, video_title, video_author,
+                        MEDIA_DOCUMENT))
+                elif video_id and isinstance(sent, Message) and sent.video:
+                    await _remember_upload(UploadedMedia(
+                        video_id, sent.video.file_id, video_title, video_author,
+                        MEDIA_VIDEO))
+                if video_id and cached is None:
+                    await _cache_upload(video_id, file_path,
+                                        video_title, video_author, mode)
             finally:
                 if upload_completed:
-                    progress_video.bytes_read = file_size_bytes
+                    progress_video.mark_complete()
                     await progress_task
                 else:
                     progress_task.cancel()
                     with suppress(asyncio.CancelledError):
                         await progress_task
+        finally:
+            await asyncio.to_thread(progress_video.close)
         await status_msg.delete()
     except BadRequest as exc:
         if "Request Entity Too Large" in str(exc):
@@ -460,12 +1233,150 @@ async def handle_download(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             logger.error("Telegram upload failed: %s", exc)
             await status_msg.edit_text("❌ Failed to upload video.")
+    except asyncio.CancelledError:
+        # Shutting down mid-upload: keep the file of a journaled job so the
+        # upload resumes from it after restart.
+        keep_file = job is not None
+        raise
     except Exception as exc:
         logger.error("Telegram upload failed: %s", exc)
         await status_msg.edit_text("❌ Failed to upload video.")
     finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if not keep_file:
+            await _remove_file(file_path)
+
+
+def _application_builder() -> ApplicationBuilder:
+    app_builder = ApplicationBuilder().token(cast(str, TOKEN))
+    if BOT_API_BASE_URL:
+        app_builder = app_builder.base_url(BOT_API_BASE_URL)
+    if BOT_API_FILE_URL:
+        app_builder = app_builder.base_file_url(BOT_API_FILE_URL)
+    # Updates run concurrently; JOB_LIMITER decides how many downloads
+    # actually proceed at once so the rest show up as queue depth.
+    app_builder = app_builder.concurrent_updates(
+        max(64, MAX_CONCURRENT_JOBS * 8))
+    return configure_requests(app_builder)
+
+
+def _worker_is_gone(worker_id: str) -> bool:
+    # Only worker processes on this host can be checked; elsewhere a job
+    # is taken over once its lease lapses.
+    parts = worker_id.rsplit(":", 2)
+    if len(parts) != 3 or parts[1] != HOSTNAME:
+        return False
+    pid = parts[2].partition("-")[0]
+    if not pid.isdigit():
+        return False
+    if int(pid) == PROCESS_ID:
+        return worker_id != WORKER_ID
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+async def _keep_lease(job: DownloadJob | None) -> None:
+    if job is None:
+        return
+    while True:
+        await asyncio.sleep(get_job_queue().lease_seconds / 3)
+        await _journal(lambda queue: queue.heartbeat(job.job_id, WORKER_ID))
+
+
+async def _finish_unfinished_jobs(bot) -> None:
+    # Jobs this instance was running when it last stopped, and jobs handed
+    # off by a drained instance, are finished by an in-process worker. Jobs
+    # of an earlier process whose lease has not lapsed yet are picked up
+    # once it does.
+    from .worker import Worker, run_download_job
+
+    worker = Worker(
+        get_job_queue(),
+        handler=lambda job: run_download_job(bot, job),
+        worker_id=WORKER_ID,
+    )
+    while True:
+        recovered = await _journal(
+            lambda queue: queue.recover(INSTANCE_NAME, _worker_is_gone))
+        counts = await _journal(lambda queue: queue.counts())
+        if recovered or (counts or {}).get("pending"):
+            await worker.run(exit_when_idle=True)
+        lease_ends = await _journal(
+            lambda queue: queue.lease_ends(INSTANCE_NAME, WORKER_ID))
+        if lease_ends is None:
+            return
+        await asyncio.sleep(max(1.0, lease_ends - time.time()))
+
+
+async def _resume_unfinished_jobs(bot) -> asyncio.Task:
+    return asyncio.create_task(_finish_unfinished_jobs(bot))
+
+
+async def _cancel_task(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+def _on_stop_signal(callback: Callable[[], None]) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, callback)
+
+
+async def _drain_jobs() -> None:
+    # Readiness turns unhealthy as soon as draining starts, so load
+    # balancers stop sending traffic while running jobs finish.
+    logger.info("Draining: not accepting new jobs")
+    handed_off = await JOB_LIMITER.drain()
+    if handed_off:
+        cancel_downloads()
+    logger.info("Drain complete (%s job(s) handed off)", handed_off)
+
+
+async def _drain_and_stop(application: Application) -> None:
+    if application.updater is not None and application.updater.running:
+        await application.updater.stop()
+    await _drain_jobs()
+    application.stop_running()
+
+
+async def _post_init(application: Application) -> None:
+    def request_drain() -> None:
+        if "drain_task" not in application.bot_data:
+            application.bot_data["drain_task"] = asyncio.create_task(
+                _drain_and_stop(application))
+
+    _on_stop_signal(request_drain)
+    server = HttpServer("0.0.0.0", PORT)
+    HEALTH.register_routes(server)
+    await server.start()
+    HEALTH.start()
+    SWEEPER.start()
+    PO_TOKEN_POOL.start()
+    LOOP_WATCHDOG.start()
+    application.bot_data["http_server"] = server
+    if BOT_ROLE == "standalone":
+        application.bot_data["resume_task"] = await _resume_unfinished_jobs(
+            application.bot)
+
+
+async def _post_shutdown(application: Application) -> None:
+    await _cancel_task(application.bot_data.pop("resume_task", None))
+    await LOOP_WATCHDOG.stop()
+    await PO_TOKEN_POOL.stop()
+    await SWEEPER.stop()
+    await HEALTH.stop()
+    server = application.bot_data.pop("http_server", None)
+    if server is not None:
+        await server.stop()
 
 
 def main():
@@ -474,29 +1385,32 @@ def main():
         return
 
     logger.info(
-        "Starting bot instance env=%s instance=%s host=%s pid=%s token=%s upload_limit_mb=%s",
+        "Starting bot instance env=%s instance=%s host=%s pid=%s token=%s "
+        "upload_limit_mb=%s role=%s",
         APP_ENV,
         INSTANCE_NAME,
         HOSTNAME,
         PROCESS_ID,
         _token_fingerprint(TOKEN),
         MAX_UPLOAD_SIZE_MB,
+        BOT_ROLE,
     )
 
-    threading.Thread(target=run_flask, daemon=True).start()
-    app_builder = ApplicationBuilder().token(TOKEN)
-    if BOT_API_BASE_URL:
-        app_builder = app_builder.base_url(BOT_API_BASE_URL)
-    if BOT_API_FILE_URL:
-        app_builder = app_builder.base_file_url(BOT_API_FILE_URL)
-
-    bot = app_builder.build()
+    bot = (
+        _application_builder()
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
     bot.add_error_handler(_telegram_error_handler)
     bot.add_handler(CommandHandler("start", start))
+    bot.add_handler(CommandHandler("audio", handle_audio))
     bot.add_handler(MessageHandler(
         filters.TEXT & (~filters.COMMAND), handle_download))
+    bot.add_handler(InlineQueryHandler(handle_inline_query))
     try:
-        bot.run_polling()
+        # Stop signals are handled in _post_init so jobs can drain first.
+        bot.run_polling(stop_signals=None)
     except Conflict:
         logger.error(
             "Another bot instance is already running with this BOT_TOKEN. "
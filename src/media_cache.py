@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from .downloader import DEFAULT_DOWNLOAD_FOLDER
+from .workspace import _dir_size
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DIR = os.getenv(
+    "MEDIA_CACHE_DIR", os.path.join(DEFAULT_DOWNLOAD_FOLDER, "cache")
+)
+# 0 disables the cache.
+MEDIA_CACHE_MAX_MB = int(os.getenv("MEDIA_CACHE_MAX_MB", "2048"))
+_TMP_PREFIX = ".tmp-"
+_STALE_TMP_SECONDS = 3600
+_VIDEO_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def video_id_from_url(url: str) -> str | None:
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    candidate = None
+    if host.endswith("youtu.be"):
+        candidate = parsed.path.strip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        parts = parsed.path.strip("/").split("/")
+        if parts and parts[0] == "watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            candidate = parts[1]
+    if candidate and _VIDEO_ID.match(candidate):
+        return candidate
+    return None
+
+
+@dataclass
+class CachedMedia:
+    path: str
+    title: Optional[str]
+    author: Optional[str]
+
+
+class MediaCache:
+    # Upload-ready files keyed by video ID and size profile, bounded by
+    # bytes with least-recently-used eviction. Every entry is a directory
+    # that is published with an atomic rename, and files are hard-linked in
+    # and out, so concurrent jobs and processes sharing the volume never see
+    # partial entries and eviction never pulls a file from under an upload.
+    def __init__(self, path: str = MEDIA_CACHE_DIR, max_mb: int = MEDIA_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_dir(self, video_id: str, profile: str) -> str:
+        return os.path.join(self.path, f"{video_id}.{profile}")
+
+    def contains(self, video_id: str, profile: str) -> bool:
+        return self.enabled and os.path.isdir(self._entry_dir(video_id, profile))
+
+    def get(self, video_id: str, profile: str, dest_folder: str) -> CachedMedia | None:
+        if not self.enabled:
+            return None
+        entry = self._entry_dir(video_id, profile)
+        try:
+            with open(os.path.join(entry, "meta.json"), encoding="utf-8") as handle:
+                meta = json.load(handle)
+            dest = os.path.join(dest_folder, meta["filename"])
+            _link_or_copy(os.path.join(entry, meta["media"]), dest)
+            # Directory mtime is the LRU clock.
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.info("Media cache hit for %s (%s)", video_id, profile)
+        return CachedMedia(dest, meta.get("title"), meta.get("author"))
+
+    def put(
+        self,
+        video_id: str,
+        profile: str,
+        file_path: str,
+        title: str | None,
+        author: str | None,
+    ) -> bool:
+        if not self.enabled:
+            return False
+        size = os.path.getsize(file_path)
+        if size > self.max_bytes:
+            return False
+        entry = self._entry_dir(video_id, profile)
+        if os.path.isdir(entry):
+            return False
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, f"{_TMP_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            _, ext = os.path.splitext(file_path)
+            media = f"media{ext}"
+            _link_or_copy(file_path, os.path.join(tmp, media))
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as handle:
+                json.dump({
+                    "media": media,
+                    "filename": os.path.basename(file_path),
+                    "title": title,
+                    "author": author,
+                    "size": size,
+                }, handle)
+            os.rename(tmp, entry)
+        except OSError:
+            # Another job published the same entry first.
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        logger.info("Cached %s (%s, %.1fMB)", video_id, profile, size / (1024 * 1024))
+        self.evict()
+        return True
+
+    def evict(self) -> int:
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            with suppress(FileNotFoundError):
+                for item in os.scandir(self.path):
+                    if not item.is_dir():
+                        continue
+                    if item.name.startswith(_TMP_PREFIX):
+                        if now - item.stat().st_mtime > _STALE_TMP_SECONDS:
+                            shutil.rmtree(item.path, ignore_errors=True)
+                        continue
+                    size = _dir_size(item.path)
+                    entries.append((item.stat().st_mtime, size, item.path))
+                    total += size
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+            if removed:
+                logger.info("Evicted %s media cache entr%s", removed,
+                            "y" if removed == 1 else "ies")
+            return removed
+
+
+def _link_or_copy(src: str, dest: str) -> None:
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+MEDIA_CACHE = MediaCache()
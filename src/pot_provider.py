@@ -0,0 +1,60 @@
+from yt_dlp.extractor.youtube.pot.provider import (
+    PoTokenContext,
+    PoTokenProvider,
+    PoTokenProviderRejectedRequest,
+    PoTokenRequest,
+    PoTokenResponse,
+    register_preference,
+    register_provider,
+)
+from yt_dlp.extractor.youtube.pot.utils import (
+    WEBPO_CLIENTS,
+    ContentBindingType,
+    get_webpo_content_binding,
+)
+from yt_dlp.utils import traverse_obj
+
+from .potokens import PO_TOKEN_POOL
+
+# Imported by PoTokenPool.start(); importing registers the provider with
+# yt-dlp for every YoutubeDL in the process.
+
+
+@register_provider
+class PrefetchPTP(PoTokenProvider):
+    PROVIDER_VERSION = "1.0.0"
+    BUG_REPORT_LOCATION = "the bot's issue tracker"
+    _SUPPORTED_CLIENTS = WEBPO_CLIENTS
+    # Tokens bound to a video id cannot be minted before the video is known.
+    _SUPPORTED_CONTEXTS = (PoTokenContext.GVS,)
+    # Makes no requests itself; the pool forwards the proxy and source
+    # address to bgutil, which supports them all.
+    _SUPPORTED_EXTERNAL_REQUEST_FEATURES = None
+
+    def is_available(self) -> bool:
+        return PO_TOKEN_POOL.enabled
+
+    def _real_request_pot(self, request: PoTokenRequest) -> PoTokenResponse:
+        client = traverse_obj(request.innertube_context, ("client", "clientName"))
+        binding, binding_type = get_webpo_content_binding(request)
+        if client not in PO_TOKEN_POOL.clients or not binding or binding_type not in (
+                ContentBindingType.VISITOR_DATA, ContentBindingType.DATASYNC_ID):
+            raise PoTokenProviderRejectedRequest("not a session-bound token")
+        pooled = PO_TOKEN_POOL.take(client, binding, {
+            "content_binding": binding,
+            "innertube_context": request.innertube_context,
+            "proxy": request.request_proxy,
+            "source_address": request.request_source_address,
+            "disable_tls_verification": not request.request_verify_tls,
+        })
+        if pooled is None:
+            raise PoTokenProviderRejectedRequest("no prefetched token yet")
+        token, expires_at = pooled
+        self.logger.info(f"Using a prefetched {client} PO token")
+        return PoTokenResponse(po_token=token, expires_at=int(expires_at))
+
+
+@register_preference(PrefetchPTP)
+def prefetch_preference(provider, request):
+    # Ahead of bgutil (130), which mints inline.
+    return 200
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+from .downloader import DEFAULT_BGUTIL_BASE_URL, _check_bgutil_health
+
+logger = logging.getLogger(__name__)
+
+# Fresh PO tokens kept per client, one per recently used session (visitor
+# data or account); 0 disables the prefetch pool.
+PO_TOKEN_POOL_SIZE = int(os.getenv("PO_TOKEN_POOL_SIZE", "4"))
+# Innertube clients the pool mints for. bgutil only mints web (BotGuard)
+# tokens, so ios/android are not possible here.
+PO_TOKEN_CLIENTS = os.getenv("PO_TOKEN_CLIENTS", "WEB,MWEB,TVHTML5")
+# Used when the provider does not say when a token expires.
+PO_TOKEN_TTL_SECONDS = float(os.getenv("PO_TOKEN_TTL_SECONDS", "21600"))
+# Tokens this close to expiry are no longer served and get replaced.
+PO_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("PO_TOKEN_REFRESH_MARGIN_SECONDS", "900"))
+# Sessions unused for this long stop being refilled.
+PO_TOKEN_IDLE_SECONDS = float(os.getenv("PO_TOKEN_IDLE_SECONDS", "3600"))
+PO_TOKEN_MAX_BACKOFF_SECONDS = float(os.getenv("PO_TOKEN_MAX_BACKOFF_SECONDS", "300"))
+_REFILL_INTERVAL_SECONDS = 30.0
+_MIN_BACKOFF_SECONDS = 1.0
+_MINT_TIMEOUT_SECONDS = 20.0
+# Without cookies every YoutubeDL gets a fresh visitor_data, so most
+# bindings are never seen again; only repeated ones are worth a mint.
+_MIN_USES = 2
+
+
+@dataclass
+class _Session:
+    client: str
+    binding: str
+    # /get_pot body of the request that introduced the session.
+    payload: dict[str, Any]
+    last_used: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    token: str | None = None
+    expires_at: float = 0.0  # wall clock, like the provider's expiresAt
+
+    def fresh(self, now: float, margin: float) -> bool:
+        return self.token is not None and self.expires_at - margin > now
+
+
+def _expiry(response: dict[str, Any], now: float, ttl: float) -> float:
+    expires_at = response.get("expiresAt")
+    if isinstance(expires_at, (int, float)):
+        return float(expires_at)
+    if isinstance(expires_at, str):
+        with suppress(ValueError):
+            return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).timestamp()
+    return now + ttl
+
+
+class PoTokenPool:
+    # Session-bound GVS tokens minted ahead of time by the bgutil provider.
+    # yt-dlp asks through the "prefetch" PO token provider (pot_provider.py),
+    # which is preferred over bgutil: a fresh pooled token is served at
+    # once, anything else is left to bgutil inline and the session is
+    # remembered. Once a session comes back, the refill task keeps a token
+    # ready for its next use and replaces it before it expires.
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BGUTIL_BASE_URL,
+        size: int = PO_TOKEN_POOL_SIZE,
+        clients: str = PO_TOKEN_CLIENTS,
+        ttl: float = PO_TOKEN_TTL_SECONDS,
+        margin: float = PO_TOKEN_REFRESH_MARGIN_SECONDS,
+        idle: float = PO_TOKEN_IDLE_SECONDS,
+        max_backoff: float = PO_TOKEN_MAX_BACKOFF_SECONDS,
+    ):
+        self.base_url = base_url
+        self.size = size
+        self.clients = tuple(filter(None, (c.strip().upper() for c in clients.split(","))))
+        self.ttl = ttl
+        self.margin = margin
+        self.idle = idle
+        self.max_backoff = max_backoff
+        self.backoff = 0.0
+        self.provider_healthy: bool | None = None
+        self.served = 0
+        self.misses = 0
+        self.minted = 0
+        self.mint_failures = 0
+        self._sessions: dict[tuple[str, str], _Session] = {}
+        self._lock = threading.Lock()
+        self._wake = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and bool(self.clients)
+
+    def take(self, client: str, binding: str, payload: dict[str, Any]) -> tuple[str, float] | None:
+        # Called from download threads. Returns a token and its expiry, or
+        # None when the caller has to mint one itself.
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get((client, binding))
+            if session is None:
+                session = _Session(client, binding, payload)
+                self._sessions[(client, binding)] = session
+                self._evict(client)
+            session.last_used = time.monotonic()
+            session.uses += 1
+            if session.fresh(now, self.margin):
+                self.served += 1
+                return session.token, session.expires_at
+            self.misses += 1
+            if session.uses < _MIN_USES:
+                return None
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return None
+
+    def _evict(self, client: str) -> None:
+        sessions = [s for s in self._sessions.values() if s.client == client]
+        for session in sorted(sessions, key=lambda s: s.last_used)[:-self.size]:
+            del self._sessions[(session.client, session.binding)]
+
+    def _due(self) -> list[_Session]:
+        now, idle_since = time.time(), time.monotonic() - self.idle
+        with self._lock:
+            for key, session in list(self._sessions.items()):
+                if session.last_used < idle_since:
+                    del self._sessions[key]
+            return [s for s in self._sessions.values()
+                    if s.uses >= _MIN_USES and not s.fresh(now, self.margin)]
+
+    def _mint(self, session: _Session) -> None:
+        # bypass_cache: the provider's own cache could hand back the token
+        # that is about to expire.
+        body = json.dumps(dict(session.payload, bypass_cache=True)).encode()
+        request = urllib.request.Request(
+            f"{self.base_url.rstrip('/')}/get_pot", data=body,
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=_MINT_TIMEOUT_SECONDS) as response:
+            result = json.loads(response.read().decode("utf-8"))
+        if result.get("error") or not result.get("poToken"):
+            raise RuntimeError(result.get("error") or "no poToken in the response")
+        now = time.time()
+        with self._lock:
+            session.token = result["poToken"]
+            session.expires_at = _expiry(result, now, self.ttl)
+            self.minted += 1
+        logger.debug("Prefetched a %s PO token, valid for %.0fs",
+                     session.client, session.expires_at - now)
+
+    def refill(self) -> bool:
+        # One pass over the sessions needing a token; False when the
+        # provider is down or failed, so the caller backs off.
+        due = self._due()
+        if not due:
+            return True
+        self.provider_healthy = _check_bgutil_health(self.base_url)
+        if not self.provider_healthy:
+            return False
+        for session in due:
+            try:
+                self._mint(session)
+            except Exception as exc:
+                with self._lock:
+                    self.mint_failures += 1
+                logger.warning("PO token prefetch for %s failed: %s", session.client, exc)
+                return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            if self.backoff:
+                await asyncio.sleep(self.backoff)
+            else:
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), _REFILL_INTERVAL_SECONDS)
+            self._wake.clear()
+            try:
+                healthy = await asyncio.to_thread(self.refill)
+            except Exception as exc:
+                logger.warning("PO token refill failed: %s", exc)
+                healthy = False
+            if healthy:
+                self.backoff = 0.0
+            else:
+                self.backoff = min(self.max_backoff,
+                                   max(_MIN_BACKOFF_SECONDS, self.backoff * 2))
+                logger.info("PO token refill backing off for %.0fs", self.backoff)
+
+    def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        from . import pot_provider  # noqa: F401  (registers it with yt-dlp)
+
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        self._loop = None
+
+    def stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            clients = {
+                client: sum(1 for s in self._sessions.values()
+                            if s.client == client and s.fresh(now, self.margin))
+                for client in self.clients
+            }
+            return {
+                "enabled": self.enabled,
+                "provider_healthy": self.provider_healthy,
+                "fresh_tokens": clients,
+                "sessions": len(self._sessions),
+                "served": self.served,
+                "misses": self.misses,
+                "minted": self.minted,
+                "mint_failures": self.mint_failures,
+                "backoff_seconds": self.backoff,
+            }
+
+
+PO_TOKEN_POOL = PoTokenPool()
@@ -0,0 +1,141 @@
+import importlib.util
+import logging
+import os
+
+import httpx
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_POOL_SIZE = int(os.getenv("TELEGRAM_API_POOL_SIZE", "32"))
+TELEGRAM_MEDIA_POOL_SIZE = int(os.getenv("TELEGRAM_MEDIA_POOL_SIZE", "4"))
+TELEGRAM_KEEPALIVE_EXPIRY_SECONDS = float(
+    os.getenv("TELEGRAM_KEEPALIVE_EXPIRY_SECONDS", "60")
+)
+TELEGRAM_HTTP_VERSION = os.getenv("TELEGRAM_HTTP_VERSION", "1.1")
+
+
+def _resolve_http_version(http_version: str) -> str:
+    if http_version not in ("1.1", "2", "2.0"):
+        logger.warning(
+            "Unsupported TELEGRAM_HTTP_VERSION=%s; using HTTP/1.1.", http_version)
+        return "1.1"
+    if http_version != "1.1" and importlib.util.find_spec("h2") is None:
+        logger.warning(
+            "TELEGRAM_HTTP_VERSION=%s requires python-telegram-bot[http2]; "
+            "using HTTP/1.1.",
+            http_version,
+        )
+        return "1.1"
+    return http_version
+
+
+def _build_httpx_request(
+    pool_size: int,
+    http_version: str,
+    keepalive_expiry: float,
+    read_timeout: float,
+    write_timeout: float,
+    connect_timeout: float,
+    pool_timeout: float,
+) -> HTTPXRequest:
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return HTTPXRequest(
+        connection_pool_size=pool_size,
+        read_timeout=read_timeout,
+        write_timeout=write_timeout,
+        connect_timeout=connect_timeout,
+        pool_timeout=pool_timeout,
+        http_version=http_version,
+        media_write_timeout=write_timeout,
+        httpx_kwargs={"limits": limits},
+    )
+
+
+class RoutingRequest(BaseRequest):
+    # Multipart uploads go through their own pool so that a few large
+    # documents cannot occupy every connection needed by small API calls.
+    def __init__(self, api_request: BaseRequest, media_request: BaseRequest):
+        self.api_request = api_request
+        self.media_request = media_request
+
+    @property
+    def read_timeout(self) -> float | None:
+        return self.api_request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.api_request.initialize()
+        await self.media_request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.api_request.shutdown()
+        await self.media_request.shutdown()
+
+    def _select(self, request_data: RequestData | None) -> BaseRequest:
+        if request_data is not None and request_data.contains_files:
+            return self.media_request
+        return self.api_request
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData | None = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> tuple[int, bytes]:
+        return await self._select(request_data).do_request(
+            url=url,
+            method=method,
+            request_data=request_data,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            connect_timeout=connect_timeout,
+            pool_timeout=pool_timeout,
+        )
+
+
+def build_routing_request(
+    api_pool_size: int = TELEGRAM_API_POOL_SIZE,
+    media_pool_size: int = TELEGRAM_MEDIA_POOL_SIZE,
+    http_version: str = TELEGRAM_HTTP_VERSION,
+    keepalive_expiry: float = TELEGRAM_KEEPALIVE_EXPIRY_SECONDS,
+) -> RoutingRequest:
+    resolved_version = _resolve_http_version(http_version)
+    api_request = _build_httpx_request(
+        pool_size=max(1, api_pool_size),
+        http_version=resolved_version,
+        keepalive_expiry=keepalive_expiry,
+        read_timeout=10.0,
+        write_timeout=10.0,
+        connect_timeout=10.0,
+        pool_timeout=5.0,
+    )
+    media_request = _build_httpx_request(
+        pool_size=max(1, media_pool_size),
+        http_version=resolved_version,
+        keepalive_expiry=keepalive_expiry,
+        read_timeout=1200.0,
+        write_timeout=1200.0,
+        connect_timeout=120.0,
+        pool_timeout=120.0,
+    )
+    logger.info(
+        "Telegram HTTP pools: api=%s media=%s http=%s keepalive=%ss",
+        api_pool_size,
+        media_pool_size,
+        resolved_version,
+        keepalive_expiry,
+    )
+    return RoutingRequest(api_request=api_request, media_request=media_request)
+
+
+def configure_requests(app_builder: ApplicationBuilder) -> ApplicationBuilder:
+    return app_builder.request(build_routing_request())
@@ -0,0 +1,123 @@
+import logging
+import mmap
+import os
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "1024")) * 1024
+# Mapped pages behind the send cursor are dropped from this process every
+# this many bytes, so RSS stays flat however large the upload is.
+_RELEASE_EVERY_BYTES = 4 * 1024 * 1024
+# Pages this far ahead of the read cursor are requested from the disk in
+# the background, so httpx copying a chunk on the event loop finds it in
+# the page cache instead of faulting it in from a slow volume.
+_READAHEAD_BYTES = 8 * 1024 * 1024
+
+
+class MmapUploadReader:
+    # File-like upload body backed by a read-only mmap of the file.
+    #
+    # read() returns fixed-size memoryview slices of the mapping instead of
+    # fresh bytes objects, whatever size the caller asks for; httpx only
+    # iterates until an empty chunk. httpx asks for the next chunk after the
+    # previous one was written to the socket, so `bytes_sent` trails the
+    # read cursor by one chunk and reflects bytes actually sent.
+    def __init__(self, stream: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 owns_stream: bool = False):
+        self._stream = stream
+        self._owns_stream = owns_stream
+        self.name = getattr(stream, "name", None)
+        self.chunk_size = max(mmap.PAGESIZE, chunk_size)
+        self.total_bytes = os.fstat(stream.fileno()).st_size
+        self.bytes_sent = 0
+        self._offset = 0
+        self._released = 0
+        self._prefetched = 0
+        self._mmap: mmap.mmap | None = None
+        if self.total_bytes:
+            self._mmap = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+            self._view = memoryview(self._mmap)
+            self._read_ahead()
+        else:
+            self._view = memoryview(b"")
+
+    @classmethod
+    def open(cls, path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> "MmapUploadReader":
+        # Blocking (open, fstat, mmap and the first read-ahead); call it
+        # from a worker thread. close() also closes the file.
+        stream = open(path, "rb")
+        try:
+            return cls(stream, chunk_size, owns_stream=True)
+        except BaseException:
+            stream.close()
+            raise
+
+    def read(self, size: int = -1) -> memoryview:
+        self.bytes_sent = self._offset
+        self._release_sent_pages()
+        end = min(self._offset + self.chunk_size, self.total_bytes)
+        chunk = self._view[self._offset:end]
+        self._offset = end
+        self._read_ahead()
+        return chunk
+
+    def _read_ahead(self) -> None:
+        # MADV_WILLNEED only queues the reads; it does not wait for them.
+        if self._mmap is None or not hasattr(mmap, "MADV_WILLNEED"):
+            return
+        start = max(self._prefetched, self._offset - self._offset % mmap.PAGESIZE)
+        end = min(self._offset + _READAHEAD_BYTES, self.total_bytes)
+        # Issued a chunk at a time rather than on every read.
+        if end <= start or (end < self.total_bytes and end - start < self.chunk_size):
+            return
+        self._mmap.madvise(mmap.MADV_WILLNEED, start, end - start)
+        self._prefetched = end
+
+    def _release_sent_pages(self) -> None:
+        if self._mmap is None or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        end = self.bytes_sent - self.bytes_sent % mmap.PAGESIZE
+        if end - self._released < _RELEASE_EVERY_BYTES:
+            return
+        self._mmap.madvise(mmap.MADV_DONTNEED, self._released, end - self._released)
+        self._released = end
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._offset
+        elif whence == os.SEEK_END:
+            offset += self.total_bytes
+        self._offset = max(0, min(offset, self.total_bytes))
+        self.bytes_sent = min(self.bytes_sent, self._offset)
+        return self._offset
+
+    def tell(self) -> int:
+        return self._offset
+
+    def fileno(self) -> int:
+        return self._stream.fileno()
+
+    def mark_complete(self) -> None:
+        self.bytes_sent = self.total_bytes
+
+    def close(self) -> None:
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A chunk is still referenced somewhere; the mapping is
+                # closed when it is garbage collected.
+                logger.debug("Upload mapping still in use; deferring close")
+            self._mmap = None
+        if self._owns_stream:
+            self._stream.close()
+
+    def __enter__(self) -> "MmapUploadReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,23 +1,42 @@
 import asyncio
 import logging
 import os
+from collections import OrderedDict
+from contextlib import suppress
 
-from flask import Flask, request
 from telegram import Update
 from telegram.error import Conflict
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    InlineQueryHandler,
+    MessageHandler,
+    filters,
+)
 
+from .health import FAST_START, HEALTH
+from .http_server import HttpRequest, HttpResponse, HttpServer
+from .loopwatch import LOOP_WATCHDOG
+from .potokens import PO_TOKEN_POOL
+from .workspace import SWEEPER
 from .main import (
     APP_ENV,
-    BOT_API_BASE_URL,
-    BOT_API_FILE_URL,
+    BOT_ROLE,
     HOSTNAME,
     INSTANCE_NAME,
+    PORT,
     PROCESS_ID,
     TOKEN,
+    _application_builder,
+    _cancel_task,
+    _drain_jobs,
+    _on_stop_signal,
+    _resume_unfinished_jobs,
     _telegram_error_handler,
     _token_fingerprint,
+    handle_audio,
     handle_download,
+    handle_inline_query,
     start,
 )
 
@@ -30,9 +49,9 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram/webhook").strip("/")
 WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL") or os.getenv("WEBHOOK_URL")
 WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
-PORT = int(os.getenv("PORT", "10000"))
-
-app = Flask(__name__)
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "256"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+WEBHOOK_DEDUP_WINDOW = 4096
 
 
 def _build_webhook_url() -> str | None:
@@ -44,9 +63,109 @@ def _build_webhook_url() -> str | None:
     return f"{base}/{WEBHOOK_PATH}"
 
 
-@app.route("/")
-def health_check():
-    return "<html><body><h1>Bot Status</h1><p>Everything is operational</p></body></html>", 200
+class UpdateIngress:
+    # Acknowledges Telegram as soon as an update is queued; parsing and
+    # handler dispatch happen in worker tasks on the same event loop.
+    def __init__(
+        self,
+        application: Application,
+        secret_token: str | None = WEBHOOK_SECRET_TOKEN,
+        queue_size: int = WEBHOOK_QUEUE_SIZE,
+        workers: int = WEBHOOK_WORKERS,
+        dedup_window: int = WEBHOOK_DEDUP_WINDOW,
+    ):
+        self.application = application
+        self.secret_token = secret_token
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(
+            maxsize=max(1, queue_size))
+        self.workers = max(1, workers)
+        self.dedup_window = dedup_window
+        self.duplicates_dropped = 0
+        self.rejected_full = 0
+        self._recent_update_ids: OrderedDict[int, None] = OrderedDict()
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def _seen(self, update_id: int) -> bool:
+        if update_id in self._recent_update_ids:
+            self._recent_update_ids.move_to_end(update_id)
+            return True
+        return False
+
+    def _remember(self, update_id: int) -> None:
+        self._recent_update_ids[update_id] = None
+        while len(self._recent_update_ids) > self.dedup_window:
+            self._recent_update_ids.popitem(last=False)
+
+    async def handle_webhook(self, request: HttpRequest) -> HttpResponse:
+        if self.secret_token:
+            token = request.headers.get("x-telegram-bot-api-secret-token")
+            if token != self.secret_token:
+                return HttpResponse("Unauthorized", status=403)
+
+        try:
+            data = request.json()
+        except ValueError:
+            return HttpResponse("Bad Request", status=400)
+        if not isinstance(data, dict):
+            return HttpResponse("Bad Request", status=400)
+
+        update_id = data.get("update_id")
+        if isinstance(update_id, int) and self._seen(update_id):
+            self.duplicates_dropped += 1
+            logger.debug("Dropping duplicate update_id=%s", update_id)
+            return HttpResponse("")
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Telegram retries non-2xx deliveries, which gives us backpressure.
+            self.rejected_full += 1
+            logger.warning("Update queue is full (%s); asking Telegram to retry.",
+                           self.queue.maxsize)
+            return HttpResponse("Busy", status=503, headers={"Retry-After": "1"})
+
+        if isinstance(update_id, int):
+            self._remember(update_id)
+        return HttpResponse("")
+
+    async def _worker(self) -> None:
+        while True:
+            data = await self.queue.get()
+            try:
+                update = Update.de_json(data=data, bot=self.application.bot)
+                await self.application.process_update(update)
+            except Exception as exc:
+                logger.exception("Failed to process webhook update: %s", exc)
+            finally:
+                self.queue.task_done()
+
+    def start(self) -> None:
+        for _ in range(self.workers):
+            self._worker_tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        for task in self._worker_tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._worker_tasks.clear()
+
+
+async def _configure_webhook(application: Application, webhook_url: str) -> None:
+    if FAST_START:
+        info = await application.bot.get_webhook_info()
+        if info.url == webhook_url:
+            logger.info("Webhook already registered at %s", webhook_url)
+            return
+    await application.bot.set_webhook(
+        url=webhook_url,
+        secret_token=WEBHOOK_SECRET_TOKEN or None,
+        # Dropping pending updates on every serverless cold start would lose
+        # the very update that triggered it.
+        drop_pending_updates=not FAST_START,
+        allowed_updates=Update.ALL_TYPES,
+    )
 
 
 def main() -> None:
@@ -72,66 +191,59 @@ def main() -> None:
         webhook_url,
     )
 
-    app_builder = ApplicationBuilder().token(TOKEN)
-    if BOT_API_BASE_URL:
-        app_builder = app_builder.base_url(BOT_API_BASE_URL)
-    if BOT_API_FILE_URL:
-        app_builder = app_builder.base_file_url(BOT_API_FILE_URL)
-
-    application = app_builder.build()
+    application = _application_builder().build()
     application.add_error_handler(_telegram_error_handler)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("audio", handle_audio))
     application.add_handler(
         MessageHandler(filters.TEXT & (~filters.COMMAND), handle_download)
     )
-
-    # Shared event loop for thread-safe updates
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    # Register the webhook endpoint with Flask
-    @app.route(f"/{WEBHOOK_PATH}", methods=["POST"])
-    def webhook_handler():
-        if WEBHOOK_SECRET_TOKEN:
-            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
-            if token != WEBHOOK_SECRET_TOKEN:
-                return "Unauthorized", 403
-
-        update = Update.de_json(data=request.get_json(
-            force=True), bot=application.bot)
-        asyncio.run_coroutine_threadsafe(
-            application.process_update(update), loop)
-        return "", 200
+    application.add_handler(InlineQueryHandler(handle_inline_query))
 
     async def run_app():
-        async with application:
-            await application.bot.set_webhook(
-                url=webhook_url,
-                secret_token=WEBHOOK_SECRET_TOKEN or None,
-                drop_pending_updates=True,
-                allowed_updates=Update.ALL_TYPES,
-            )
-            await application.start()
-            while True:
-                await asyncio.sleep(3600)
-
-    # Start Flask in a separate thread for health check and webhook reception
-    from threading import Thread
-    from werkzeug.serving import make_server
-
-    class ServerThread(Thread):
-        def __init__(self, app):
-            Thread.__init__(self, daemon=True)
-            self.server = make_server("0.0.0.0", PORT, app)
-
-        def run(self):
-            logger.info("Starting Flask server on port %s", PORT)
-            self.server.serve_forever()
-
-    ServerThread(app).start()
+        stop_event = asyncio.Event()
+        _on_stop_signal(stop_event.set)
+        ingress = UpdateIngress(application)
+        server = HttpServer("0.0.0.0", PORT)
+        HEALTH.register_routes(server)
+        server.add_route(f"/{WEBHOOK_PATH}", ingress.handle_webhook,
+                         methods=("POST",))
+
+        # Listen before talking to Telegram: on a cold start the update that
+        # woke the container is acknowledged into the queue right away and
+        # processed once the application is initialized.
+        await server.start()
+        HEALTH.start()
+        SWEEPER.start()
+        PO_TOKEN_POOL.start()
+        LOOP_WATCHDOG.start()
+        resume_task = None
+        try:
+            async with application:
+                ingress.start()
+                try:
+                    await _configure_webhook(application, webhook_url)
+                    await application.start()
+                    if BOT_ROLE == "standalone":
+                        resume_task = await _resume_unfinished_jobs(application.bot)
+                    await stop_event.wait()
+                    # Webhooks keep being acknowledged while draining; new
+                    # downloads are queued for the next instance.
+                    await _drain_jobs()
+                finally:
+                    await _cancel_task(resume_task)
+                    if application.running:
+                        await application.stop()
+        finally:
+            await server.stop()
+            await ingress.stop()
+            await LOOP_WATCHDOG.stop()
+            await PO_TOKEN_POOL.stop()
+            await SWEEPER.stop()
+            await HEALTH.stop()
 
     try:
-        loop.run_until_complete(run_app())
+        asyncio.run(run_app())
     except Conflict:
         logger.error(
             "Another bot instance is already running with this BOT_TOKEN. "
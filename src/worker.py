@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from telegram import Bot, Chat, Message
+
+from .health import HEALTH
+from .http_server import HttpServer
+from .jobqueue import DownloadJob, SqliteJobQueue, get_job_queue
+from .jobs import JOB_LIMITER, MAX_CONCURRENT_JOBS, DrainingError, JobTicket
+from .main import (
+    APP_ENV,
+    BOT_API_BASE_URL,
+    BOT_API_FILE_URL,
+    INSTANCE_NAME,
+    PORT,
+    TOKEN,
+    WORKER_ID,
+    _chat_action,
+    _download_and_send,
+    _downloading_text,
+    _drain_jobs,
+    _job_estimator,
+    _notify_handed_off,
+    _on_stop_signal,
+    _token_fingerprint,
+    _worker_is_gone,
+)
+from .loopwatch import LOOP_WATCHDOG
+from .potokens import PO_TOKEN_POOL
+from .telegram_requests import build_routing_request
+from .workspace import SWEEPER
+
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+WORKER_POLL_INTERVAL_SECONDS = float(
+    os.getenv("WORKER_POLL_INTERVAL_SECONDS", "1"))
+
+JobHandler = Callable[[DownloadJob], Awaitable[None]]
+
+
+class Worker:
+    # Pulls jobs from the shared queue and runs up to `concurrency` of them
+    # at once, renewing each job's lease while it runs so another worker
+    # only picks it up again if this process dies.
+    def __init__(
+        self,
+        queue: SqliteJobQueue,
+        handler: JobHandler,
+        worker_id: str,
+        concurrency: int = MAX_CONCURRENT_JOBS,
+        poll_interval: float = WORKER_POLL_INTERVAL_SECONDS,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.completed = 0
+
+    async def _keep_lease(self, job: DownloadJob) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            await asyncio.to_thread(self.queue.heartbeat, job.job_id, self.worker_id)
+
+    async def _run_job(self, job: DownloadJob) -> None:
+        lease_task = asyncio.create_task(self._keep_lease(job))
+        try:
+            await self.handler(job)
+        except DrainingError:
+            await asyncio.to_thread(self.queue.release, job.job_id, False)
+        except asyncio.CancelledError:
+            # Hand the job back so it resumes from its last stage elsewhere.
+            await asyncio.to_thread(self.queue.release, job.job_id)
+            raise
+        except Exception as exc:
+            logger.exception("Job %s failed: %s", job.job_id, exc)
+            await asyncio.to_thread(self.queue.fail, job.job_id, str(exc))
+        else:
+            await asyncio.to_thread(self.queue.complete, job.job_id)
+            self.completed += 1
+        finally:
+            lease_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await lease_task
+
+    async def _slot_loop(self, stop_event: asyncio.Event, exit_when_idle: bool) -> None:
+        # A draining instance refuses every job, so it stops claiming them.
+        while not stop_event.is_set() and not JOB_LIMITER.draining:
+            job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            if job is None:
+                if exit_when_idle:
+                    return
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop_event.wait(), self.poll_interval)
+                continue
+            await self._run_job(job)
+
+    async def run(
+        self,
+        stop_event: asyncio.Event | None = None,
+        exit_when_idle: bool = False,
+    ) -> None:
+        stop_event = stop_event or asyncio.Event()
+        await asyncio.gather(
+            *(self._slot_loop(stop_event, exit_when_idle)
+              for _ in range(self.concurrency))
+        )
+
+
+def _message_for(bot: Bot, job: DownloadJob, message_id: int) -> Message:
+    message = Message(
+        message_id=message_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=job.chat_id, type=job.chat_type),
+    )
+    message.set_bot(bot)
+    return message
+
+
+async def run_download_job(bot: Bot, job: DownloadJob) -> None:
+    msg = _message_for(bot, job, job.message_id)
+    status_msg = _message_for(bot, job, job.status_message_id)
+    with suppress(Exception):
+        await status_msg.edit_text(_downloading_text(job.mode))
+    await bot.send_chat_action(chat_id=job.chat_id, action=_chat_action(job.mode))
+    ticket = JobTicket(user_id=job.user_id, chat_id=job.chat_id)
+    try:
+        # The ingress already throttled this user when it queued the job.
+        async with JOB_LIMITER.slot(ticket, estimate=_job_estimator(job.url, job, job.mode),
+                                    enforce_quota=False):
+            await _download_and_send(msg, status_msg, job.url, job=job,
+                                     info=ticket.info, mode=job.mode)
+    except (DrainingError, asyncio.CancelledError):
+        await _notify_handed_off(status_msg)
+        raise
+
+
+def main() -> None:
+    if not TOKEN:
+        logger.error("BOT_TOKEN is not set. Worker cannot start.")
+        return
+
+    worker_id = WORKER_ID
+    logger.info(
+        "Starting download worker env=%s worker=%s token=%s concurrency=%s",
+        APP_ENV,
+        worker_id,
+        _token_fingerprint(TOKEN),
+        MAX_CONCURRENT_JOBS,
+    )
+
+    # Workers never call getUpdates, so any number of them can share one
+    # BOT_TOKEN with a single polling or webhook ingress.
+    bot = Bot(
+        token=TOKEN,
+        base_url=BOT_API_BASE_URL or "https://api.telegram.org/bot",
+        base_file_url=BOT_API_FILE_URL or "https://api.telegram.org/file/bot",
+        request=build_routing_request(),
+    )
+
+    async def run_worker():
+        stop_event = asyncio.Event()
+        _on_stop_signal(stop_event.set)
+        server = HttpServer("0.0.0.0", PORT)
+        HEALTH.register_routes(server)
+        await server.start()
+        HEALTH.start()
+        SWEEPER.start()
+        PO_TOKEN_POOL.start()
+        LOOP_WATCHDOG.start()
+        try:
+            async with bot:
+                queue = get_job_queue()
+                await asyncio.to_thread(queue.recover, INSTANCE_NAME, _worker_is_gone)
+                worker = Worker(
+                    queue,
+                    handler=lambda job: run_download_job(bot, job),
+                    worker_id=worker_id,
+                )
+                worker_task = asyncio.create_task(worker.run(stop_event))
+                await stop_event.wait()
+                # Workers stop claiming jobs at once; running ones get the
+                # drain deadline and are released back to the queue after it.
+                await _drain_jobs()
+                with suppress(asyncio.CancelledError):
+                    await worker_task
+        finally:
+            await LOOP_WATCHDOG.stop()
+            await PO_TOKEN_POOL.stop()
+            await SWEEPER.stop()
+            await HEALTH.stop()
+            await server.stop()
+
+    try:
+        asyncio.run(run_worker())
+    except Exception as exc:
+        logger.exception("Fatal error in download worker: %s", exc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from collections.abc import Callable, Collection
+from contextlib import suppress
+from typing import Any
+
+from .downloader import _CANCEL_DOWNLOADS, DEFAULT_DOWNLOAD_FOLDER
+from .jobqueue import get_job_queue
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKSPACE_ROOT = os.getenv(
+    "JOB_WORKSPACE_ROOT", os.path.join(DEFAULT_DOWNLOAD_FOLDER, "jobs")
+)
+# Free space that admission control never hands out, so the journal, logs
+# and the OS keep some headroom.
+DISK_RESERVE_MB = int(os.getenv("DISK_RESERVE_MB", "512"))
+DISK_ADMISSION_TIMEOUT_SECONDS = float(
+    os.getenv("DISK_ADMISSION_TIMEOUT_SECONDS", "600"))
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", "300"))
+STALE_FILE_SECONDS = float(os.getenv("STALE_FILE_SECONDS", "3600"))
+STALE_SUFFIXES = (".part", ".ytdl", ".compressed.mp4")
+
+_MB = 1024 * 1024
+_ACTIVE_WORKSPACES: set[str] = set()
+_ACTIVE_LOCK = threading.Lock()
+
+
+def job_workspace(job_id: str, root: str | None = None) -> str:
+    # Each job downloads into its own directory, so jobs for different
+    # videos with the same title never share (or delete) each other's files
+    # and a retried job finds its own .part files again.
+    path = os.path.join(root or JOB_WORKSPACE_ROOT, job_id)
+    os.makedirs(path, exist_ok=True)
+    with _ACTIVE_LOCK:
+        _ACTIVE_WORKSPACES.add(os.path.abspath(path))
+    return path
+
+
+def release_workspace(path: str) -> None:
+    with _ACTIVE_LOCK:
+        _ACTIVE_WORKSPACES.discard(os.path.abspath(path))
+    DISK_BUDGET.release(path)
+
+
+def remove_workspace(path: str) -> None:
+    release_workspace(path)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            with suppress(OSError):
+                total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def expected_download_bytes(info: dict[str, Any], fallback_bytes: int) -> int:
+    formats = info.get("requested_formats") or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size:
+            return fallback_bytes
+        total += int(size)
+    # Separate video and audio streams coexist with the merged output until
+    # the merge finishes.
+    if len(formats) > 1:
+        total *= 2
+    return total
+
+
+class DiskBudget:
+    # Byte-based admission control for downloads. Each job reserves the bytes
+    # it expects to write before the download starts; only the part of a
+    # reservation that is not on disk yet counts against free space, so
+    # running downloads are not double-counted. Jobs that do not fit wait
+    # for others to finish instead of failing halfway with ENOSPC.
+    def __init__(
+        self,
+        path: str = DEFAULT_DOWNLOAD_FOLDER,
+        reserve_mb: int = DISK_RESERVE_MB,
+        timeout: float = DISK_ADMISSION_TIMEOUT_SECONDS,
+    ):
+        self.path = path
+        self.reserve_bytes = reserve_mb * _MB
+        self.timeout = timeout
+        self.waiting = 0
+        self._reservations: dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    def _free_bytes(self) -> int:
+        path = self.path
+        if not os.path.isdir(path):
+            path = os.path.dirname(os.path.abspath(path))
+        return shutil.disk_usage(path).free
+
+    def _outstanding_bytes(self) -> int:
+        return sum(
+            max(0, nbytes - _dir_size(key))
+            for key, nbytes in self._reservations.items()
+        )
+
+    def available_bytes(self) -> int:
+        with self._cond:
+            return self._free_bytes() - self.reserve_bytes - self._outstanding_bytes()
+
+    @property
+    def reserved_bytes(self) -> int:
+        with self._cond:
+            return sum(self._reservations.values())
+
+    def admit(
+        self,
+        key: str,
+        nbytes: int,
+        cancelled: Callable[[], bool] = _CANCEL_DOWNLOADS.is_set,
+    ) -> str | None:
+        # Blocks the calling (download) thread until `nbytes` fit. Returns
+        # None once reserved, or an error message for the user.
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._reservations.pop(key, None)
+            self.waiting += 1
+            try:
+                while True:
+                    # A resumed job already has part of its download on disk.
+                    needed = nbytes - _dir_size(key)
+                    available = (self._free_bytes() - self.reserve_bytes
+                                 - self._outstanding_bytes())
+                    if needed <= available:
+                        self._reservations[key] = nbytes
+                        return None
+                    if not self._reservations:
+                        logger.warning("Not enough disk space for %s: needs %.0fMB, %.0fMB available",
+                                       key, needed / _MB, available / _MB)
+                        return (f"Not enough disk space for this video "
+                                f"(needs about {needed / _MB:.0f}MB)")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or cancelled():
+                        return "Timed out waiting for disk space"
+                    logger.info("Waiting for %.0fMB of disk space for %s",
+                                needed / _MB, key)
+                    self._cond.wait(min(remaining, 1.0))
+            finally:
+                self.waiting -= 1
+
+    def release(self, key: str) -> None:
+        with self._cond:
+            if self._reservations.pop(key, None) is not None:
+                self._cond.notify_all()
+
+
+def _is_stale_name(name: str) -> bool:
+    return name.endswith(STALE_SUFFIXES) or ".part-Frag" in name
+
+
+def sweep_stale_files(
+    folder: str = DEFAULT_DOWNLOAD_FOLDER,
+    workspace_root: str | None = None,
+    max_age: float = STALE_FILE_SECONDS,
+    live_jobs: Collection[str] = (),
+) -> int:
+    # Removes partial downloads and compression leftovers nobody touched for
+    # `max_age`, and job workspaces left behind by crashed processes.
+    # Workspaces of `live_jobs` (queued or running anywhere, e.g. in other
+    # workers sharing the volume) are left alone however old their files.
+    workspace_root = os.path.abspath(workspace_root or JOB_WORKSPACE_ROOT)
+    cutoff = time.time() - max_age
+    with _ACTIVE_LOCK:
+        active = set(_ACTIVE_WORKSPACES)
+    active.update(os.path.join(workspace_root, job_id) for job_id in live_jobs)
+    removed = 0
+
+    if os.path.isdir(workspace_root):
+        for entry in os.scandir(workspace_root):
+            path = os.path.abspath(entry.path)
+            if not entry.is_dir() or path in active:
+                continue
+            mtimes = []
+            for dirpath, _, filenames in os.walk(path):
+                for name in filenames:
+                    with suppress(OSError):
+                        mtimes.append(os.path.getmtime(os.path.join(dirpath, name)))
+            if max(mtimes, default=entry.stat().st_mtime) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+
+    for dirpath, dirnames, filenames in os.walk(folder):
+        if os.path.abspath(dirpath) in active:
+            dirnames.clear()
+            continue
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with suppress(OSError):
+                if _is_stale_name(name) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+    if removed:
+        logger.info("Swept %s stale download file(s)/workspace(s)", removed)
+    return removed
+
+
+class WorkspaceSweeper:
+    def __init__(
+        self,
+        folder: str = DEFAULT_DOWNLOAD_FOLDER,
+        interval: float = SWEEP_INTERVAL_SECONDS,
+        max_age: float = STALE_FILE_SECONDS,
+    ):
+        self.folder = folder
+        self.interval = interval
+        self.max_age = max_age
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Without the journal another worker's job cannot be told
+                # from a crashed one, so nothing is swept.
+                live_jobs = await asyncio.to_thread(
+                    lambda: get_job_queue().unfinished_job_ids())
+                await asyncio.to_thread(
+                    sweep_stale_files, self.folder, None, self.max_age, live_jobs)
+            except Exception as exc:
+                logger.warning("Download sweep failed: %s", exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+
+DISK_BUDGET = DiskBudget()
+SWEEPER = WorkspaceSweeper()
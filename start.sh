@@ -3,15 +3,32 @@ set -euo pipefail
 
 # Start the bgutil provider HTTP server on port 4416
 node /opt/provider/server/build/main.js --port 4416 &
-# Give it a moment to start
-sleep 5
 
-# Install the package in editable mode to handle imports correctly
-pip install -e .
+# Wait until the provider answers /ping instead of sleeping a fixed time.
+# In FAST_START mode the bot starts right away and tracks the provider
+# through /ready instead; downloads only need it a few seconds later.
+wait_for_bgutil() {
+  local timeout="${BGUTIL_STARTUP_TIMEOUT:-30}"
+  local deadline=$((SECONDS + timeout))
+  until curl -fsS -o /dev/null "http://127.0.0.1:4416/ping"; do
+    if [ "$SECONDS" -ge "$deadline" ]; then
+      echo "bgutil provider not ready after ${timeout}s; starting bot anyway" >&2
+      return 0
+    fi
+    sleep 0.2
+  done
+}
+
+case "${FAST_START:-}" in
+  1|true|yes) ;;
+  *) wait_for_bgutil ;;
+esac
 
 MODE="${BOT_RUNTIME_MODE:-polling}"
-if [ "$MODE" = "webhook" ]; then
-  python -m src.webhook
+if [ "${BOT_ROLE:-standalone}" = "worker" ]; then
+  exec python -m src.worker
+elif [ "$MODE" = "webhook" ]; then
+  exec python -m src.webhook
 else
-  python -m src.main
+  exec python -m src.main
 fi
@@ -0,0 +1,26 @@
+import pytest
+
+import src.jobqueue
+from src.jobqueue import SqliteJobQueue
+from src.media_cache import MEDIA_CACHE
+
+
+@pytest.fixture(autouse=True)
+def isolated_job_queue(tmp_path, monkeypatch):
+    # Keep the in-process job journal out of the real downloads folder.
+    queue = SqliteJobQueue(str(tmp_path / "journal.sqlite3"))
+    monkeypatch.setattr(src.jobqueue, "_JOB_QUEUE", queue)
+    return queue
+
+
+@pytest.fixture(autouse=True)
+def isolated_workspaces(tmp_path, monkeypatch):
+    root = tmp_path / "workspaces"
+    monkeypatch.setattr("src.workspace.JOB_WORKSPACE_ROOT", str(root))
+    return root
+
+
+@pytest.fixture(autouse=True)
+def isolated_media_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(MEDIA_CACHE, "path", str(tmp_path / "cache"))
+    return MEDIA_CACHE
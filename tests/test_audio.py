@@ -0,0 +1,121 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.downloader import download_video
+from src.jobqueue import MODE_AUDIO, DownloadJob
+from src.main import MAX_UPLOAD_SIZE_MB, handle_audio
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+
+
+def _audio_update(args):
+    msg = MagicMock(message_id=1, reply_text=AsyncMock(), reply_audio=AsyncMock(),
+                    reply_document=AsyncMock())
+    msg.reply_text.return_value = MagicMock(
+        message_id=2, edit_text=AsyncMock(), delete=AsyncMock())
+    update = MagicMock(effective_message=msg)
+    update.effective_chat.id = 12345
+    update.effective_chat.type = "private"
+    update.effective_user.id = 67890
+    context = MagicMock(args=args)
+    context.bot.send_chat_action = AsyncMock()
+    return update, context, msg
+
+
+def test_audio_download_copies_the_audio_stream(tmp_path):
+    audio = tmp_path / "Episode.m4a"
+    audio.write_bytes(b"audio")
+    media_info = {}
+
+    with patch("yt_dlp.YoutubeDL") as MockYDL:
+        instance = MockYDL.return_value.__enter__.return_value
+        instance.extract_info.return_value = {
+            "title": "Episode",
+            "duration": 5400,
+            "requested_downloads": [{"filepath": str(audio)}],
+        }
+        instance.prepare_filename.return_value = str(tmp_path / "Episode.webm")
+
+        file_path, error, title, _ = download_video(
+            URL, download_folder=str(tmp_path), max_size_mb=50,
+            audio_only=True, media_info=media_info)
+
+    assert error is None
+    assert file_path == str(audio)
+    assert title == "Episode"
+    assert media_info == {"duration": 5400}
+    opts = MockYDL.call_args.args[0]
+    assert opts["format"].startswith(f"bestaudio[ext=m4a][filesize<={50 * 1024 * 1024}]")
+    assert "merge_output_format" not in opts
+    assert opts["postprocessors"] == [
+        {"key": "FFmpegExtractAudio", "preferredcodec": "best"}]
+
+
+@pytest.mark.asyncio
+async def test_audio_command_sends_audio_with_metadata(tmp_path, monkeypatch):
+    update, context, msg = _audio_update([URL])
+    downloads = []
+
+    def fake_download(url, download_folder, **kwargs):
+        downloads.append(kwargs)
+        kwargs["media_info"]["duration"] = 5400.5
+        path = tmp_path / "Episode.m4a"
+        path.write_bytes(b"a" * 1024)
+        return str(path), None, "Episode", "Podcast"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    compress = AsyncMock()
+    monkeypatch.setattr("src.main._compress_video_to_limit", compress)
+
+    await handle_audio(update, context)
+
+    assert downloads[0]["audio_only"] is True
+    assert downloads[0]["max_size_mb"] == MAX_UPLOAD_SIZE_MB
+    msg.reply_text.assert_any_await("⏳ Downloading audio...")
+    msg.reply_document.assert_not_awaited()
+    kwargs = msg.reply_audio.await_args.kwargs
+    assert (kwargs["duration"], kwargs["performer"], kwargs["title"]) == (
+        5400, "Podcast", "Episode")
+    compress.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_oversized_audio_is_refused_without_compression(tmp_path, monkeypatch):
+    update, context, msg = _audio_update([URL])
+    path = tmp_path / "Episode.m4a"
+
+    def fake_download(url, download_folder, **kwargs):
+        with open(path, "wb") as handle:
+            handle.truncate((MAX_UPLOAD_SIZE_MB + 1) * 1024 * 1024)
+        return str(path), None, "Episode", "Podcast"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    compress = AsyncMock()
+    monkeypatch.setattr("src.main._compress_video_to_limit", compress)
+
+    await handle_audio(update, context)
+
+    status_msg = msg.reply_text.return_value
+    assert status_msg.edit_text.await_args.args[0].startswith(
+        f"❌ Audio is {MAX_UPLOAD_SIZE_MB + 1:.1f}MB")
+    compress.assert_not_awaited()
+    msg.reply_audio.assert_not_awaited()
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_audio_command_without_link_explains_usage():
+    update, context, msg = _audio_update([])
+
+    await handle_audio(update, context)
+
+    msg.reply_text.assert_awaited_once_with("🎧 Send /audio followed by a YouTube link.")
+
+
+def test_queued_jobs_keep_their_mode(isolated_job_queue):
+    isolated_job_queue.enqueue(DownloadJob(
+        chat_id=1, chat_type="private", message_id=2, status_message_id=3,
+        url=URL, mode=MODE_AUDIO))
+
+    assert isolated_job_queue.claim("worker").mode == MODE_AUDIO
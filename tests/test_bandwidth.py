@@ -0,0 +1,124 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.bandwidth import BandwidthManager, FragmentTuner
+from src.downloader import download_video
+
+_MB = 1024 * 1024
+
+
+def _allocations(manager: BandwidthManager, meters) -> list[float]:
+    return [round(meter.allocation / 125_000, 1) for meter in meters]
+
+
+def test_budget_is_split_fairly_and_shrinks_during_uploads():
+    manager = BandwidthManager(link_mbps=100, upload_reserve_mbps=40)
+    meters = [manager.register("a"), manager.register("b")]
+    assert _allocations(manager, meters) == [50.0, 50.0]
+
+    with manager.uploading():
+        assert _allocations(manager, meters) == [30.0, 30.0]
+    assert _allocations(manager, meters) == [50.0, 50.0]
+
+    manager.unregister(meters[0])
+    assert _allocations(manager, meters[1:]) == [100.0]
+
+
+def test_source_limited_job_leaves_its_share_to_others():
+    manager = BandwidthManager(link_mbps=100)
+    slow, fast = manager.register("slow"), manager.register("fast")
+    slow.started -= 10
+    slow.rate = 10 * 125_000
+
+    manager._rebalance(time.monotonic())
+
+    assert _allocations(manager, [slow, fast]) == [12.0, 88.0]
+
+
+def test_unlimited_link_does_not_pace():
+    manager = BandwidthManager(link_mbps=0)
+    meter = manager.register("a")
+    hook = manager.progress_hook(meter)
+
+    started = time.monotonic()
+    hook({"status": "downloading", "filename": "f", "downloaded_bytes": 500 * _MB})
+
+    assert time.monotonic() - started < 0.05
+    assert meter.total_bytes == 500 * _MB
+
+
+def test_hook_paces_download_to_its_allocation():
+    # 80Mbit/s is 10MB/s, so 12MB take over a second.
+    manager = BandwidthManager(link_mbps=80)
+    meter = manager.register("a")
+    hook = manager.progress_hook(meter)
+
+    started = time.monotonic()
+    for step in range(1, 13):
+        hook({"status": "downloading", "filename": "f", "downloaded_bytes": step * _MB})
+
+    assert time.monotonic() - started >= 0.9
+    assert meter.paced_seconds > 0
+
+
+def test_fragment_tuner_climbs_while_throughput_improves():
+    tuner = FragmentTuner(initial=5, maximum=8)
+
+    tuner.record(5, 10 * _MB)
+    assert tuner.value == 6
+    tuner.record(6, 12 * _MB)
+    assert tuner.value == 7
+    # No gain from the 7th connection: turn around.
+    tuner.record(7, 12.1 * _MB)
+    assert tuner.value == 6
+    # Stale measurements from an older setting are ignored.
+    tuner.record(5, 1 * _MB)
+    assert tuner.value == 6
+
+
+class _Origin(BaseHTTPRequestHandler):
+    body = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * (3 * _MB)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/clip.mp4"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_is_capped_by_shared_budget(origin, tmp_path, monkeypatch):
+    monkeypatch.setattr("src.downloader._check_bgutil_health", lambda: True)
+    # 16Mbit/s is 2MB/s, so 3MB take about 1.5s instead of milliseconds.
+    manager = BandwidthManager(link_mbps=16)
+    meter = manager.register(str(tmp_path))
+
+    started = time.monotonic()
+    file_path, error, _, _ = download_video(
+        origin,
+        download_folder=str(tmp_path),
+        progress_hook=manager.progress_hook(meter),
+        concurrent_fragments=meter.fragment_concurrency,
+    )
+    elapsed = time.monotonic() - started
+    manager.unregister(meter)
+
+    assert error is None
+    assert file_path is not None
+    assert elapsed >= 1.0
+    assert meter.total_bytes >= 3 * _MB
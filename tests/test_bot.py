@@ -57,6 +57,28 @@ def test_download_video_success(tmp_path):
         instance.extract_info.assert_called_once_with(url, download=True)
 
 
+def test_download_video_reuses_prefetched_info(tmp_path):
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    info = {"id": "dQw4w9WgXcQ", "title": "Test Video"}
+
+    with patch("yt_dlp.YoutubeDL") as MockYDL:
+        instance = MockYDL.return_value.__enter__.return_value
+        instance.process_ie_result.return_value = info
+
+        fake_video = tmp_path / "Test Video.mp4"
+        fake_video.write_text("fake video")
+        instance.prepare_filename.return_value = str(fake_video)
+
+        file_path, error, _, _ = download_video(
+            url, download_folder=str(tmp_path), info=info
+        )
+
+        assert error is None
+        assert file_path == str(fake_video)
+        instance.process_ie_result.assert_called_once_with(info, download=True)
+        instance.extract_info.assert_not_called()
+
+
 def test_download_video_failure(tmp_path):
     url = "https://youtu.be/invalid"
 
@@ -185,7 +207,8 @@ def test_download_video_retries_with_disable_innertube_on_antibot(
 async def test_start_handler(mock_update, mock_context):
     await start(mock_update, mock_context)
     mock_update.effective_message.reply_text.assert_called_once_with(
-        "🎬 Send a YouTube link and I'll return the video."
+        "🎬 Send a YouTube link and I'll return the video.\n"
+        "🎧 Send /audio followed by a link for just the audio."
     )
 
 
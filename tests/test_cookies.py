@@ -0,0 +1,121 @@
+import base64
+from unittest.mock import MagicMock, patch
+
+import yt_dlp
+
+from src.cookies import CookiePool
+from src.downloader import download_video
+
+
+def _cookie_files(tmp_path, count: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = tmp_path / f"account{index}.txt"
+        path.write_text("# Netscape HTTP Cookie File")
+        paths.append(str(path))
+    return paths
+
+
+def test_identities_are_used_round_robin(tmp_path):
+    pool = CookiePool(_cookie_files(tmp_path, 3))
+
+    used = []
+    for _ in range(6):
+        identity = pool.acquire()
+        used.append(identity.name)
+        pool.release(identity, "ok")
+
+    assert used == ["account0.txt", "account1.txt", "account2.txt"] * 2
+
+
+def test_idle_identity_is_preferred_over_busy_one(tmp_path):
+    pool = CookiePool(_cookie_files(tmp_path, 2))
+
+    first = pool.acquire()
+    second = pool.acquire()
+
+    assert first is not second
+
+
+def test_throttled_identity_cools_down(tmp_path):
+    pool = CookiePool(_cookie_files(tmp_path, 2), cooldown=60, max_cooldown=90)
+
+    throttled = pool.acquire()
+    pool.release(throttled, "throttled")
+    for _ in range(3):
+        identity = pool.acquire()
+        assert identity is not throttled
+        pool.release(identity, "ok")
+    assert pool.available() == 1
+
+    # Consecutive throttles back off exponentially up to the cap.
+    assert throttled.cooldown_until - throttled.last_throttled == 60
+    throttled.in_use += 1
+    pool.release(throttled, "throttled")
+    assert throttled.cooldown_until - throttled.last_throttled == 90
+    stats = {entry["name"]: entry for entry in pool.stats()}
+    assert stats[throttled.name]["throttles"] == 2
+    assert stats[throttled.name]["cooling_down_seconds"] > 0
+
+
+def test_all_cooling_down_uses_the_one_that_recovers_first(tmp_path):
+    pool = CookiePool(_cookie_files(tmp_path, 2), cooldown=60)
+    first = pool.acquire()
+    second = pool.acquire()
+    pool.release(second, "throttled")
+    pool.release(first, "throttled")
+
+    assert pool.acquire() is second
+
+
+def test_pool_reads_files_dir_and_base64_from_env(tmp_path, monkeypatch):
+    single, _ = _cookie_files(tmp_path, 2)
+    cookie_dir = tmp_path / "pool"
+    cookie_dir.mkdir()
+    (tmp_path / "account1.txt").rename(cookie_dir / "account1.txt")
+    monkeypatch.setenv("YTDLP_COOKIES_FILE", single)
+    monkeypatch.setenv("YTDLP_COOKIES_DIR", str(cookie_dir))
+    monkeypatch.setenv("YTDLP_COOKIES_B64_2", base64.b64encode(
+        b"# Netscape HTTP Cookie File").decode())
+    pool = CookiePool()
+
+    assert len(pool) == 3
+    identity = pool.acquire()
+    pool.release(identity, "throttled")
+    # Unchanged sources keep their health state.
+    assert len(pool) == 3
+    assert pool.available() == 2
+
+
+def test_download_retries_with_next_identity_on_antibot(tmp_path, monkeypatch):
+    pool = CookiePool(_cookie_files(tmp_path, 2))
+    monkeypatch.setattr("src.downloader.COOKIE_POOL", pool)
+    fake_video = tmp_path / "video.mp4"
+    fake_video.write_text("fake video")
+
+    throttled_cm = MagicMock()
+    throttled_cm.__enter__.return_value.extract_info.side_effect = (
+        yt_dlp.utils.DownloadError("HTTP Error 429: Too Many Requests"))
+    ok_cm = MagicMock()
+    ok_cm.__enter__.return_value.extract_info.return_value = {"title": "Video"}
+    ok_cm.__enter__.return_value.prepare_filename.return_value = str(fake_video)
+
+    with patch("yt_dlp.YoutubeDL", side_effect=[throttled_cm, ok_cm]) as MockYDL:
+        file_path, error, _, _ = download_video(
+            "https://youtu.be/dQw4w9WgXcQ", download_folder=str(tmp_path))
+
+    assert error is None
+    assert file_path == str(fake_video)
+    first_opts, second_opts = (call.args[0] for call in MockYDL.call_args_list)
+    assert first_opts["cookiefile"] != second_opts["cookiefile"]
+    # Same strategy, only the identity changed.
+    assert (first_opts["extractor_args"]["youtube"]["player_client"]
+            == second_opts["extractor_args"]["youtube"]["player_client"])
+    stats = {entry["name"]: entry for entry in pool.stats()}
+    assert stats["account0.txt"]["throttles"] == 1
+    assert stats["account1.txt"]["successes"] == 1
+    assert all(entry["in_use"] == 0 for entry in stats.values())
+
+    public = pool.stats(with_names=False)
+    assert [entry["name"] for entry in public] == ["identity-0", "identity-1"]
+    assert "account" not in str(public)
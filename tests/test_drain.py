@@ -0,0 +1,146 @@
+import asyncio
+import sys
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from src.health import HealthMonitor
+from src.jobqueue import DownloadJob
+from src.jobs import DrainingError, JobLimiter
+from src.main import _terminate_process, handle_download
+from src.worker import Worker
+
+
+@pytest.mark.asyncio
+async def test_drain_finishes_short_jobs_and_cancels_the_rest(tmp_path):
+    limiter = JobLimiter(2)
+    monitor = HealthMonitor(limiter, download_folder=str(tmp_path),
+                            min_free_disk_mb=0)
+    monitor.warmed_up = True
+    outcomes: dict[str, str] = {}
+
+    async def job(name: str, seconds: float):
+        try:
+            async with limiter.slot():
+                await asyncio.sleep(seconds)
+            outcomes[name] = "done"
+        except asyncio.CancelledError:
+            outcomes[name] = "cancelled"
+            raise
+
+    tasks = [
+        asyncio.create_task(job("short", 0.05)),
+        asyncio.create_task(job("long", 10)),
+        asyncio.create_task(job("waiting", 0.01)),
+    ]
+    await asyncio.sleep(0)
+
+    drain = asyncio.create_task(limiter.drain(timeout=0.3))
+    await asyncio.sleep(0)
+    ready, report = monitor.readiness()
+    assert not ready
+    assert report["reasons"] == ["draining"]
+
+    started = time.perf_counter()
+    assert await drain == 1
+    assert time.perf_counter() - started < 1
+    await asyncio.gather(*tasks, return_exceptions=True)
+    assert outcomes == {"short": "done", "long": "cancelled", "waiting": "cancelled"}
+
+    with pytest.raises(DrainingError):
+        async with limiter.slot():
+            pass
+
+
+def _update(text: str = "https://youtu.be/abc123"):
+    update = AsyncMock(spec=Update)
+    message = AsyncMock(spec=Message)
+    message.text = text
+    message.message_id = 5
+    status_msg = MagicMock(message_id=6, edit_text=AsyncMock())
+    message.reply_text = AsyncMock(return_value=status_msg)
+    update.effective_message = message
+    update.effective_chat = MagicMock(spec=Chat, id=77, type="private")
+    update.effective_user = MagicMock(spec=User, id=9, username="someone")
+    return update, status_msg
+
+
+@pytest.mark.asyncio
+async def test_requests_during_drain_are_queued(monkeypatch, isolated_job_queue):
+    limiter = JobLimiter(1)
+    limiter.draining = True
+    monkeypatch.setattr("src.main.JOB_LIMITER", limiter)
+    download = MagicMock()
+    monkeypatch.setattr("src.main.download_video", download)
+    update, _ = _update()
+
+    await handle_download(update, AsyncMock())
+
+    update.effective_message.reply_text.assert_awaited_once_with(
+        "⏳ Queued for download...")
+    download.assert_not_called()
+    assert isolated_job_queue.counts() == {"pending": 1}
+
+
+@pytest.mark.asyncio
+async def test_job_cancelled_by_drain_is_handed_off(monkeypatch, isolated_job_queue):
+    limiter = JobLimiter(1)
+    monkeypatch.setattr("src.main.JOB_LIMITER", limiter)
+    started = asyncio.Event()
+
+    async def slow_pipeline(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr("src.main._download_and_send", slow_pipeline)
+    update, status_msg = _update()
+
+    task = asyncio.create_task(handle_download(update, AsyncMock()))
+    await started.wait()
+    assert isolated_job_queue.counts() == {"running": 1}
+
+    assert await limiter.drain(timeout=0.01) == 1
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert isolated_job_queue.counts() == {"pending": 1}
+    status_msg.edit_text.assert_awaited_once()
+    assert "restarting" in status_msg.edit_text.await_args.args[0]
+
+
+@pytest.mark.asyncio
+async def test_draining_worker_stops_claiming_without_using_attempts(
+    monkeypatch, isolated_job_queue
+):
+    limiter = JobLimiter(1)
+    monkeypatch.setattr("src.worker.JOB_LIMITER", limiter)
+    handled = 0
+
+    async def refusing_handler(job):
+        nonlocal handled
+        handled += 1
+        limiter.draining = True
+        raise DrainingError("draining")
+
+    isolated_job_queue.enqueue(DownloadJob(
+        chat_id=1, chat_type="private", message_id=2, status_message_id=3,
+        url="https://youtu.be/abc123"))
+    worker = Worker(isolated_job_queue, refusing_handler, worker_id="w",
+                    concurrency=1, poll_interval=0.01)
+    await asyncio.wait_for(worker.run(), timeout=5)
+
+    assert handled == 1
+    assert isolated_job_queue.counts() == {"pending": 1}
+    assert isolated_job_queue.claim("next-instance").attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_terminate_process_stops_child():
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", "import time; time.sleep(30)")
+
+    await _terminate_process(process)
+
+    assert process.returncode is not None
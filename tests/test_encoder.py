@@ -0,0 +1,133 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.encoder import EncoderPool
+from src.main import _compress_video_to_limit
+
+
+def test_slots_fit_the_cores_left_after_the_reserve():
+    pool = EncoderPool(cores=8, reserved_cores=1)
+    assert (pool.slots, pool.threads) == (1, 4)
+
+    pool = EncoderPool(cores=10, reserved_cores=2)
+    assert (pool.slots, pool.threads) == (2, 4)
+
+    # A single core still gets one single-threaded encode.
+    pool = EncoderPool(cores=1, reserved_cores=1)
+    assert (pool.slots, pool.threads) == (1, 1)
+    assert pool.ffmpeg_args() == ["-threads", "1"]
+
+
+@pytest.mark.asyncio
+async def test_encodes_beyond_the_slots_wait_and_are_measured():
+    pool = EncoderPool(cores=3, reserved_cores=1, threads=1)
+    running = 0
+    peak = 0
+    waits = []
+
+    async def encode():
+        nonlocal running, peak
+        async with pool.slot() as waited:
+            waits.append(waited)
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+    await asyncio.gather(*(encode() for _ in range(4)))
+
+    assert peak == 2
+    assert sorted(waits)[-1] >= 0.04
+    stats = pool.stats()
+    assert stats["slots"] == 2
+    assert stats["active"] == 0
+    assert stats["waiting"] == 0
+    assert stats["max_wait_seconds"] >= 0.04
+
+
+@pytest.mark.asyncio
+async def test_compression_runs_ffmpeg_in_a_slot_with_thread_cap(tmp_path, monkeypatch):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"\x00" * 1024)
+    pool = EncoderPool(cores=4, reserved_cores=1, nice=5)
+    monkeypatch.setattr("src.main.ENCODER", pool)
+    monkeypatch.setattr("src.main._probe_duration_seconds", AsyncMock(return_value=10.0))
+    monkeypatch.setattr("src.encoder.shutil.which", lambda name: f"/usr/bin/{name}")
+    monkeypatch.setattr(pool, "_launcher", lambda: ["nice", "-n", "5"])
+    calls = []
+
+    async def fake_exec(*args, **kwargs):
+        calls.append(args)
+        assert pool.active == 1
+        with open(args[-1], "wb") as handle:
+            handle.write(b"\x00" * 512)
+        process = MagicMock(pid=4321, returncode=0)
+        process.wait = AsyncMock(return_value=0)
+        return process
+
+    monkeypatch.setattr("src.main.asyncio.create_subprocess_exec", fake_exec)
+
+    compressed, error = await _compress_video_to_limit(str(source), 50)
+
+    assert error is None
+    assert os.path.exists(compressed)
+    args = calls[0]
+    assert args[args.index("-threads") + 1] == "3"
+    # Set before exec, so every encoder thread runs at the lower priority.
+    assert args[:4] == ("nice", "-n", "5", "ffmpeg")
+    assert pool.active == 0
+
+
+def test_priority_is_applied_before_exec(monkeypatch):
+    monkeypatch.setattr("src.encoder.shutil.which", lambda name: f"/usr/bin/{name}")
+    runs = []
+
+    def refuse_batch(args, **kwargs):
+        runs.append(args)
+        return MagicMock(returncode=1)
+
+    monkeypatch.setattr("src.encoder.subprocess.run", refuse_batch)
+    pool = EncoderPool(cores=2, nice=10)
+
+    assert pool.command("ffmpeg", "-y") == ["nice", "-n", "10", "ffmpeg", "-y"]
+    pool.command("ffmpeg")
+    # chrt is probed once and left out where SCHED_BATCH is not allowed.
+    assert runs == [["chrt", "--batch", "0", "true"]]
+
+    monkeypatch.setattr("src.encoder.subprocess.run", lambda *a, **k: MagicMock(returncode=0))
+    assert EncoderPool(cores=2, nice=10).command("ffmpeg") == [
+        "nice", "-n", "10", "chrt", "--batch", "0", "ffmpeg"]
+    # A missing ffmpeg still surfaces as FileNotFoundError.
+    monkeypatch.setattr("src.encoder.shutil.which",
+                        lambda name: None if name == "ffmpeg" else f"/usr/bin/{name}")
+    assert EncoderPool(cores=2, nice=10).command("ffmpeg") == ["ffmpeg"]
+
+
+@pytest.mark.asyncio
+async def test_overshooting_encode_is_retried_at_a_lower_bitrate(tmp_path, monkeypatch):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"\x00" * 1024)
+    monkeypatch.setattr("src.main._probe_duration_seconds", AsyncMock(return_value=100.0))
+    sizes = [60 * 1024 * 1024, 512]
+    bitrates = []
+
+    async def fake_exec(*args, **kwargs):
+        bitrates.append(int(args[args.index("-b:v") + 1].rstrip("k")))
+        with open(args[-1], "wb") as handle:
+            handle.truncate(sizes.pop(0))
+        process = MagicMock(pid=1, returncode=0)
+        process.wait = AsyncMock(return_value=0)
+        return process
+
+    monkeypatch.setattr("src.main.asyncio.create_subprocess_exec", fake_exec)
+    monkeypatch.setattr("src.main.ENCODER", EncoderPool(cores=2))
+
+    compressed, error = await _compress_video_to_limit(str(source), 50)
+
+    assert error is None
+    assert os.path.getsize(compressed) == 512
+    assert len(bitrates) == 2
+    assert bitrates[1] < bitrates[0]
@@ -0,0 +1,163 @@
+import os
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import src.main
+from src.bandwidth import BandwidthManager
+from src.main import MAX_UPLOAD_SIZE_MB, _download_and_send, _fused_source_args
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+MB = 1024 * 1024
+
+
+def _info(video_mb: float) -> dict:
+    return {
+        "id": "dQw4w9WgXcQ",
+        "title": "Long talk",
+        "uploader": "Speaker",
+        "duration": 3600,
+        "requested_formats": [
+            {"url": "https://media.example/v", "protocol": "https", "vcodec": "avc1",
+             "acodec": "none", "filesize": int(video_mb * MB),
+             "http_headers": {"User-Agent": "UA"}},
+            {"url": "https://media.example/a", "protocol": "https", "vcodec": "none",
+             "acodec": "mp4a", "filesize": 5 * MB},
+        ],
+    }
+
+
+def test_fused_inputs_read_the_selected_stream_urls(monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+    args = _fused_source_args(_info(MAX_UPLOAD_SIZE_MB * 3), "video")
+
+    assert args == [
+        "-headers", "User-Agent: UA\r\n",
+        "-reconnect", "1", "-reconnect_on_network_error", "1", "-i", "https://media.example/v",
+        "-reconnect", "1", "-reconnect_on_network_error", "1", "-i", "https://media.example/a",
+        "-map", "0:v:0", "-map", "1:a:0",
+    ]
+
+
+def test_fused_mode_only_when_compression_is_inevitable(monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+    assert _fused_source_args(_info(1), "video") is None
+    assert _fused_source_args(_info(MAX_UPLOAD_SIZE_MB * 3), "audio") is None
+    hls = _info(MAX_UPLOAD_SIZE_MB * 3)
+    hls["requested_formats"][0]["protocol"] = "m3u8_native"
+    assert _fused_source_args(hls, "video") is None
+    # Stream URLs are bound to the egress address that extracted them.
+    monkeypatch.setattr(src.main, "ROUTE_POOL", ["proxy"])
+    assert _fused_source_args(_info(MAX_UPLOAD_SIZE_MB * 3), "video") is None
+
+
+@pytest.mark.asyncio
+async def test_oversized_video_is_compressed_without_a_full_download(monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the full-size file must not be downloaded")
+
+    monkeypatch.setattr("src.main.download_video", fail)
+    inputs = []
+
+    async def fake_exec(*args, **kwargs):
+        inputs.append([args[i + 1] for i, arg in enumerate(args) if arg == "-i"])
+        with open(args[-1], "wb") as handle:
+            handle.write(b"\x00" * 1024)
+        process = MagicMock(pid=1, returncode=0)
+        process.wait = AsyncMock(return_value=0)
+        return process
+
+    monkeypatch.setattr("src.main.asyncio.create_subprocess_exec", fake_exec)
+    msg = MagicMock(reply_document=AsyncMock())
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL, info=_info(MAX_UPLOAD_SIZE_MB * 3))
+
+    assert inputs == [["https://media.example/v", "https://media.example/a"]]
+    upload = msg.reply_document.await_args.kwargs["document"]
+    assert upload.filename == "Long_talk.compressed.mp4"
+    assert msg.reply_document.await_args.kwargs["caption"] == "🎬 Long talk\n👤 Speaker"
+    status_msg.delete.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_one_pass_encode_falls_back_to_downloading(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+    monkeypatch.setattr("src.main._encode_to_limit",
+                        AsyncMock(return_value=(None, "ffmpeg compression failed")))
+    downloads = []
+
+    def fake_download(url, download_folder, **kwargs):
+        downloads.append(url)
+        path = os.path.join(download_folder, "Long_talk.mp4")
+        with open(path, "wb") as handle:
+            handle.write(b"video")
+        return path, None, "Long talk", "Speaker"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    msg = MagicMock(reply_document=AsyncMock())
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL, info=_info(MAX_UPLOAD_SIZE_MB * 3))
+
+    assert downloads == [URL]
+    msg.reply_document.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_one_pass_reads_are_paced_to_the_jobs_bandwidth_share(monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+    bandwidth = BandwidthManager(link_mbps=80)
+    monkeypatch.setattr(src.main, "BANDWIDTH", bandwidth)
+    commands = []
+
+    async def fake_exec(*args, **kwargs):
+        commands.append(args)
+        assert len(bandwidth.stats()["downloads"]) == 1
+        with open(args[-1], "wb") as handle:
+            handle.write(b"\x00" * 1024)
+        process = MagicMock(pid=1, returncode=0)
+        process.wait = AsyncMock(return_value=0)
+        return process
+
+    monkeypatch.setattr("src.main.asyncio.create_subprocess_exec", fake_exec)
+    msg = MagicMock(reply_document=AsyncMock())
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL, info=_info(150))
+
+    (command,) = commands
+    rates = [command[i + 1] for i, arg in enumerate(command) if arg == "-readrate"]
+    # Both inputs together are read at the job's 80 Mbit/s.
+    source_rate = 155 * MB / 3600
+    assert len(rates) == 2
+    assert all(float(rate) * source_rate == pytest.approx(10_000_000, rel=1e-3)
+               for rate in rates)
+    assert bandwidth.stats()["downloads"] == []
+
+
+@pytest.mark.asyncio
+async def test_one_pass_overshoot_is_retried_once_then_downloaded(monkeypatch):
+    monkeypatch.setattr(src.main, "ROUTE_POOL", [])
+    encodes = []
+
+    async def overshooting_encode(source_args, duration, target, path):
+        encodes.append(source_args)
+        return (MAX_UPLOAD_SIZE_MB + 1) * MB, None
+
+    monkeypatch.setattr("src.main._encode_at_bitrate", overshooting_encode)
+    downloads = []
+
+    def fake_download(url, download_folder, **kwargs):
+        downloads.append(url)
+        return None, "stop here", None, None
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(MagicMock(), status_msg, URL, info=_info(MAX_UPLOAD_SIZE_MB * 3))
+
+    assert len(encodes) == 2
+    assert downloads == [URL]
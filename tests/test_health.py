@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from src.health import HealthMonitor
+from src.jobs import JobLimiter
+
+
+@pytest.mark.asyncio
+async def test_readiness_waits_for_warm_up_and_bgutil(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.health.warm_up_extractor", lambda: None)
+    monkeypatch.setattr("src.health.warm_up_cache", lambda: None)
+    monkeypatch.setattr("src.health._check_bgutil_health", lambda: True)
+    monitor = HealthMonitor(JobLimiter(2), download_folder=str(tmp_path),
+                            min_free_disk_mb=0)
+
+    ready, report = monitor.readiness()
+    assert not ready
+    assert report["reasons"] == ["warming up"]
+    assert report["bgutil"] == "unknown"
+
+    await monitor.warm_up()
+    ready, report = monitor.readiness()
+    assert ready
+    assert report["bgutil"] == "healthy"
+    assert report["free_worker_slots"] == 2
+    assert report["free_disk_mb"] > 0
+
+    monkeypatch.setattr("src.health._check_bgutil_health", lambda: False)
+    await monitor._refresh_bgutil()
+    ready, report = monitor.readiness()
+    assert not ready
+    assert report["reasons"] == ["bgutil provider unreachable"]
+
+
+@pytest.mark.asyncio
+async def test_saturation_counts_active_and_queued_jobs(tmp_path):
+    limiter = JobLimiter(1)
+    monitor = HealthMonitor(limiter, download_folder=str(tmp_path))
+    release = asyncio.Event()
+
+    async def job():
+        async with limiter.slot():
+            await release.wait()
+
+    tasks = [asyncio.create_task(job()) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    load = monitor.saturation()
+    assert load == {
+        "score": 3.0,
+        "active_jobs": 1,
+        "queued_jobs": 2,
+        "max_concurrent_jobs": 1,
+    }
+    _, report = monitor.readiness()
+    assert report["queue_depth"] == 2
+    assert report["free_worker_slots"] == 0
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert monitor.saturation()["score"] == 0
@@ -0,0 +1,175 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Chat, Document, InlineQueryResultCachedDocument, Message
+from telegram.error import Forbidden
+
+import src.main
+from src.jobqueue import UploadedMedia
+from src.jobs import JobLimiter, QuotaExceeded
+from src.main import _download_and_send, _inline_fetch, handle_inline_query
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+
+
+@pytest.fixture(autouse=True)
+def empty_memory(monkeypatch):
+    monkeypatch.setattr(src.main, "_uploaded_media", type(src.main._uploaded_media)())
+    monkeypatch.setattr(src.main, "_inline_fetches", {})
+
+
+def _inline_update(text: str = URL):
+    query = MagicMock(query=text, answer=AsyncMock())
+    query.from_user.id = 42
+    return MagicMock(inline_query=query), query
+
+
+def _no_ytdlp(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("inline answers must not call yt-dlp")
+
+    monkeypatch.setattr("src.main.download_video", fail)
+    monkeypatch.setattr("src.main.probe_video", fail)
+
+
+@pytest.mark.asyncio
+async def test_known_video_is_answered_from_its_file_id(isolated_job_queue, monkeypatch):
+    _no_ytdlp(monkeypatch)
+    # Recorded by another process sharing the journal.
+    isolated_job_queue.record_upload(
+        UploadedMedia("dQw4w9WgXcQ", "FILE123", "Title", "Author"))
+    update, query = _inline_update(f"  {URL}  ")
+
+    await handle_inline_query(update, MagicMock())
+
+    results = query.answer.await_args.args[0]
+    assert len(results) == 1
+    assert isinstance(results[0], InlineQueryResultCachedDocument)
+    assert results[0].document_file_id == "FILE123"
+    assert results[0].caption == "🎬 Title\n👤 Author"
+    assert "dQw4w9WgXcQ" in src.main._uploaded_media
+
+
+@pytest.mark.asyncio
+async def test_miss_starts_one_background_fetch(monkeypatch):
+    _no_ytdlp(monkeypatch)
+    monkeypatch.setattr(src.main, "INLINE_CACHE_CHAT_ID", "-100123")
+    started = asyncio.Event()
+    release = asyncio.Event()
+    fetches = []
+
+    async def fake_fetch(bot, url, user_id):
+        fetches.append((url, user_id))
+        started.set()
+        await release.wait()
+
+    monkeypatch.setattr("src.main._inline_fetch", fake_fetch)
+    for _ in range(2):
+        update, query = _inline_update()
+        await handle_inline_query(update, MagicMock())
+        assert query.answer.await_args.args[0] == []
+        assert query.answer.await_args.kwargs["button"].start_parameter == "inline"
+
+    await started.wait()
+    release.set()
+    await asyncio.sleep(0)
+    assert fetches == [(URL, 42)]
+
+
+@pytest.mark.asyncio
+async def test_miss_without_cache_chat_fetches_nothing(monkeypatch):
+    _no_ytdlp(monkeypatch)
+    monkeypatch.setattr(src.main, "INLINE_CACHE_CHAT_ID", None)
+    bot = MagicMock(send_message=AsyncMock())
+    update, query = _inline_update()
+
+    await handle_inline_query(update, MagicMock(bot=bot))
+
+    assert query.answer.await_args.args[0] == []
+    assert "send the link" in query.answer.await_args.kwargs["button"].text
+    assert src.main._inline_fetches == {}
+    bot.send_message.assert_not_awaited()
+
+
+def _fetch_setup(monkeypatch, limiter=None):
+    monkeypatch.setattr(src.main, "INLINE_CACHE_CHAT_ID", "-100123")
+    monkeypatch.setattr(src.main, "BOT_ROLE", "standalone")
+    monkeypatch.setattr(src.main, "JOB_LIMITER", limiter or JobLimiter(1))
+    pipeline = AsyncMock()
+    monkeypatch.setattr(src.main, "_download_and_send", pipeline)
+    status_msg = MagicMock(delete=AsyncMock())
+    bot = MagicMock(send_message=AsyncMock(return_value=status_msg))
+    return bot, status_msg, pipeline
+
+
+@pytest.mark.asyncio
+async def test_inline_fetch_uploads_into_the_cache_chat(monkeypatch):
+    bot, status_msg, pipeline = _fetch_setup(monkeypatch)
+
+    await _inline_fetch(bot, URL, 42)
+
+    assert bot.send_message.await_args.kwargs["chat_id"] == -100123
+    assert pipeline.await_args.args[:3] == (status_msg, status_msg, URL)
+
+
+@pytest.mark.asyncio
+async def test_inline_fetch_respects_the_askers_quota(monkeypatch):
+    limiter = JobLimiter(1)
+    limiter.check_quota = MagicMock(side_effect=QuotaExceeded(5))
+    bot, _, pipeline = _fetch_setup(monkeypatch, limiter)
+
+    await _inline_fetch(bot, URL, 42)
+
+    assert limiter.check_quota.call_args.args[0].user_id == 42
+    bot.send_message.assert_not_awaited()
+    pipeline.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_inline_fetch_gives_up_when_the_cache_chat_is_unreachable(monkeypatch, caplog):
+    bot, _, pipeline = _fetch_setup(monkeypatch)
+    bot.send_message.side_effect = Forbidden("bot was kicked from the channel chat")
+
+    await _inline_fetch(bot, URL, 42)
+
+    pipeline.assert_not_awaited()
+    assert "Cannot fetch" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_non_youtube_query_gets_no_results():
+    update, query = _inline_update("hello")
+
+    await handle_inline_query(update, MagicMock())
+
+    query.answer.assert_awaited_once()
+    assert query.answer.await_args.args[0] == []
+    assert src.main._inline_fetches == {}
+
+
+@pytest.mark.asyncio
+async def test_upload_records_file_id_for_inline_queries(isolated_job_queue, monkeypatch):
+    def fake_download(url, download_folder, **kwargs):
+        path = os.path.join(download_folder, "Title.mp4")
+        with open(path, "wb") as handle:
+            handle.write(b"video")
+        return path, None, "Title", "Author"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    sent = Message(
+        message_id=5,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=1, type="private"),
+        document=Document(file_id="NEWFILE", file_unique_id="u1"),
+    )
+    msg = MagicMock(reply_document=AsyncMock(return_value=sent))
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL)
+
+    assert src.main._uploaded_media["dQw4w9WgXcQ"].file_id == "NEWFILE"
+    assert isolated_job_queue.uploaded_media("dQw4w9WgXcQ") == UploadedMedia(
+        "dQw4w9WgXcQ", "NEWFILE", "Title", "Author")
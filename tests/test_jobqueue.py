@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from src.jobqueue import DownloadJob, SqliteJobQueue
+from src.main import handle_download
+from src.worker import Worker, run_download_job
+
+
+def _job(index: int = 0) -> DownloadJob:
+    return DownloadJob(
+        chat_id=100 + index,
+        chat_type="private",
+        message_id=10,
+        status_message_id=11,
+        url=f"https://youtu.be/video{index}",
+        user_id=42,
+    )
+
+
+def test_each_job_is_claimed_by_exactly_one_worker(tmp_path):
+    queue = SqliteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    for index in range(40):
+        queue.enqueue(_job(index))
+
+    claimed: list[str] = []
+    lock = threading.Lock()
+
+    def drain(worker_id: str):
+        # Each thread uses its own connections, like separate processes would.
+        while (job := queue.claim(worker_id)) is not None:
+            with lock:
+                claimed.append(job.job_id)
+            queue.complete(job.job_id)
+
+    threads = [threading.Thread(target=drain, args=(f"w{i}",)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 40
+    assert len(set(claimed)) == 40
+    assert queue.counts() == {"done": 40}
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(tmp_path):
+    queue = SqliteJobQueue(str(tmp_path / "jobs.sqlite3"),
+                           lease_seconds=0.01, max_attempts=2)
+    queue.enqueue(_job())
+
+    first = queue.claim("crashed-worker")
+    time.sleep(0.02)
+    second = queue.claim("other-worker")
+    time.sleep(0.02)
+    third = queue.claim("other-worker")
+
+    assert first is not None and second is not None
+    assert second.job_id == first.job_id
+    assert second.attempts == 2
+    assert third is None
+    assert queue.counts() == {"failed": 1}
+
+
+def _run_workers(path: str, worker_count: int, jobs: int) -> float:
+    queue = SqliteJobQueue(path)
+    for index in range(jobs):
+        queue.enqueue(_job(index))
+
+    async def handler(job: DownloadJob):
+        await asyncio.sleep(0.1)
+
+    async def run():
+        stop = asyncio.Event()
+        workers = [
+            Worker(SqliteJobQueue(path), handler, worker_id=f"w{i}",
+                   concurrency=1, poll_interval=0.01)
+            for i in range(worker_count)
+        ]
+        tasks = [asyncio.create_task(worker.run(stop)) for worker in workers]
+        started = time.perf_counter()
+        while sum(worker.completed for worker in workers) < jobs:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*tasks)
+        return elapsed
+
+    return asyncio.run(run())
+
+
+def test_throughput_scales_with_worker_count(tmp_path):
+    single = _run_workers(str(tmp_path / "one.sqlite3"), worker_count=1, jobs=8)
+    several = _run_workers(str(tmp_path / "four.sqlite3"), worker_count=4, jobs=8)
+
+    assert several < single / 2
+
+
+@pytest.mark.asyncio
+async def test_ingress_role_enqueues_instead_of_downloading(tmp_path, monkeypatch):
+    queue = SqliteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr("src.main.BOT_ROLE", "ingress")
+    monkeypatch.setattr("src.main.get_job_queue", lambda: queue)
+    download = MagicMock()
+    monkeypatch.setattr("src.main.download_video", download)
+
+    update = AsyncMock(spec=Update)
+    message = AsyncMock(spec=Message)
+    message.text = "https://youtu.be/abc123"
+    message.message_id = 5
+    message.reply_text = AsyncMock(return_value=MagicMock(message_id=6))
+    update.effective_message = message
+    update.effective_chat = MagicMock(spec=Chat, id=77, type="group")
+    update.effective_user = MagicMock(spec=User, id=9, username="someone")
+
+    await handle_download(update, AsyncMock())
+
+    message.reply_text.assert_awaited_once_with("⏳ Queued for download...")
+    download.assert_not_called()
+    job = queue.claim("worker")
+    assert job is not None
+    assert (job.chat_id, job.chat_type, job.message_id, job.status_message_id) == (
+        77, "group", 5, 6)
+    assert job.url == "https://youtu.be/abc123"
+
+
+@pytest.mark.asyncio
+async def test_worker_job_replies_to_original_message(monkeypatch):
+    pipeline = AsyncMock()
+    monkeypatch.setattr("src.worker._download_and_send", pipeline)
+    bot = MagicMock()
+    bot.send_chat_action = AsyncMock()
+    bot.edit_message_text = AsyncMock()
+
+    await run_download_job(bot, _job())
+
+    msg, status_msg, url = pipeline.await_args.args
+    assert (msg.chat.id, msg.message_id) == (100, 10)
+    assert status_msg.message_id == 11
+    assert url == "https://youtu.be/video0"
+    bot.send_chat_action.assert_awaited_once()
@@ -0,0 +1,153 @@
+import asyncio
+import sqlite3
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.jobqueue import STAGE_DOWNLOADED, STAGE_UPLOADING, DownloadJob, SqliteJobQueue
+from src.main import PROCESS_ID, _download_and_send, _resume_unfinished_jobs
+
+
+def _job() -> DownloadJob:
+    return DownloadJob(
+        chat_id=100,
+        chat_type="private",
+        message_id=10,
+        status_message_id=11,
+        url="https://youtu.be/abc123",
+    )
+
+
+def _stages(queue: SqliteJobQueue) -> dict[str, tuple]:
+    conn = sqlite3.connect(queue.path)
+    try:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT job_id, status, stage, file_path FROM jobs")}
+    finally:
+        conn.close()
+
+
+def test_recover_requeues_only_this_instances_running_jobs(tmp_path):
+    queue = SqliteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    mine = queue.start(_job(), "bot-a:host:1")
+    queue.update_stage(mine, STAGE_DOWNLOADED, "/tmp/video.mp4", "Title", "Author")
+    queue.start(_job(), "bot-b:host:1")
+    queue.start(_job(), "bot-aa:host:1")
+
+    # Started jobs are leased, so other workers do not steal them.
+    assert queue.claim("other") is None
+    assert queue.recover("bot-a", lambda worker_id: worker_id == "bot-a:host:1") == 1
+
+    resumed = queue.claim("bot-a:host:2")
+    assert resumed is not None
+    assert resumed.job_id == mine.job_id
+    assert (resumed.stage, resumed.file_path, resumed.title, resumed.author) == (
+        STAGE_DOWNLOADED, "/tmp/video.mp4", "Title", "Author")
+    assert resumed.attempts == 2
+
+
+def test_recover_leaves_live_workers_of_the_same_instance_alone(tmp_path):
+    queue = SqliteJobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60)
+    queue.enqueue(_job())
+    claimed = queue.claim("bot_1:host:1")
+    assert claimed is not None
+
+    # A second worker with the same INSTANCE_NAME starts up.
+    assert queue.recover("bot_1", lambda worker_id: False) == 0
+    assert queue.recover("bot%", lambda worker_id: True) == 0
+    assert queue.claim("bot_1:host:2") is None
+    assert queue.heartbeat(claimed.job_id, "bot_1:host:1")
+    assert queue.lease_ends("bot_1", "bot_1:host:2") is not None
+    assert queue.lease_ends("bot_1", "bot_1:host:1") is None
+
+    # Once the lease lapses the job is recovered.
+    expired = SqliteJobQueue(queue.path, lease_seconds=-1)
+    expired.heartbeat(claimed.job_id, "bot_1:host:1")
+    assert queue.recover("bot_1", lambda worker_id: False) == 1
+
+
+def test_old_journal_is_migrated(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (job_id TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, "
+        "chat_type TEXT NOT NULL, message_id INTEGER NOT NULL, "
+        "status_message_id INTEGER NOT NULL, url TEXT NOT NULL, user_id INTEGER, "
+        "status TEXT NOT NULL DEFAULT 'pending', worker_id TEXT, lease_until REAL, "
+        "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO jobs (job_id, chat_id, chat_type, message_id, "
+        "status_message_id, url, created_at, updated_at) "
+        "VALUES ('old', 1, 'private', 2, 3, 'https://youtu.be/x', 0, 0)"
+    )
+    conn.commit()
+    conn.close()
+
+    job = SqliteJobQueue(path).claim("worker")
+
+    assert job is not None
+    assert (job.job_id, job.stage, job.file_path) == ("old", "queued", None)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_records_stages_and_resumes_without_download(
+    tmp_path, monkeypatch, isolated_job_queue
+):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video")
+    download = MagicMock(return_value=(str(video), None, "Title", "Author"))
+    monkeypatch.setattr("src.main.download_video", download)
+    # Simulate a crash during the upload.
+    msg = MagicMock()
+    msg.reply_document = AsyncMock(side_effect=asyncio.CancelledError)
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    # Started by an earlier process on this host that has since exited.
+    job = isolated_job_queue.start(_job(), "bot:host:99999999-0a1b2c3d")
+    with pytest.raises(asyncio.CancelledError):
+        await _download_and_send(msg, status_msg, job.url, job=job)
+
+    assert _stages(isolated_job_queue)[job.job_id] == (
+        "running", STAGE_UPLOADING, str(video))
+
+    monkeypatch.setattr("src.main.INSTANCE_NAME", "bot")
+    monkeypatch.setattr("src.main.HOSTNAME", "host")
+    monkeypatch.setattr("src.main.WORKER_ID", "bot:host:2-4e5f6a7b")
+    msg.reply_document = AsyncMock()
+    bot = MagicMock()
+    bot.send_chat_action = AsyncMock()
+
+    async def run_resumed(bot, resumed):
+        await _download_and_send(msg, status_msg, resumed.url, job=resumed)
+
+    monkeypatch.setattr("src.worker.run_download_job", run_resumed)
+    task = await _resume_unfinished_jobs(bot)
+    assert task is not None
+    await task
+
+    download.assert_called_once()
+    msg.reply_document.assert_awaited_once()
+    assert _stages(isolated_job_queue)[job.job_id][0] == "done"
+
+
+@pytest.mark.asyncio
+async def test_restart_with_the_same_pid_resumes_the_old_jobs(
+    monkeypatch, isolated_job_queue
+):
+    # A container restarted in place runs the bot as the same PID again.
+    job = isolated_job_queue.start(_job(), f"bot:host:{PROCESS_ID}-0a1b2c3d")
+    monkeypatch.setattr("src.main.INSTANCE_NAME", "bot")
+    monkeypatch.setattr("src.main.HOSTNAME", "host")
+    monkeypatch.setattr("src.main.WORKER_ID", f"bot:host:{PROCESS_ID}-4e5f6a7b")
+    resumed = []
+
+    async def run_resumed(bot, job):
+        resumed.append(job.job_id)
+
+    monkeypatch.setattr("src.worker.run_download_job", run_resumed)
+    await asyncio.wait_for(await _resume_unfinished_jobs(MagicMock()), timeout=5)
+
+    assert resumed == [job.job_id]
+    assert _stages(isolated_job_queue)[job.job_id][0] == "done"
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from src.loopwatch import LoopWatchdog
+
+
+def _block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_blocking_callback_is_reported_with_its_stack(caplog):
+    watchdog = LoopWatchdog(threshold_ms=100)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.3)
+        assert watchdog.stalls == 0
+        with caplog.at_level(logging.WARNING, logger="src.loopwatch"):
+            _block_the_loop(0.5)
+            await asyncio.sleep(0.25)
+    finally:
+        await watchdog.stop()
+
+    assert watchdog.stalls == 1
+    assert watchdog.stats()["max_lag_ms"] >= 400
+    assert "_block_the_loop" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_disabled_watchdog_does_not_start():
+    watchdog = LoopWatchdog(threshold_ms=0)
+    watchdog.start()
+    assert watchdog._task is None
+    await watchdog.stop()
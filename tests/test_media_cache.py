@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.main import _download_and_send
+from src.media_cache import MediaCache, video_id_from_url
+
+MB = 1024 * 1024
+
+
+def test_video_id_from_url():
+    assert video_id_from_url("https://youtu.be/dQw4w9WgXcQ?t=3") == "dQw4w9WgXcQ"
+    assert video_id_from_url(
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=x") == "dQw4w9WgXcQ"
+    assert video_id_from_url("https://youtube.com/shorts/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_id_from_url("https://youtu.be/abc123") is None
+    assert video_id_from_url("https://example.com/watch?v=dQw4w9WgXcQ") is None
+
+
+def _media(tmp_path, name: str, size: int) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_hit_links_file_into_workspace(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_mb=10)
+    source = _media(tmp_path, "Title.compressed.mp4", MB)
+    assert cache.put("dQw4w9WgXcQ", "50-50mb", source, "Title", "Author")
+    workspace = tmp_path / "job"
+    workspace.mkdir()
+
+    hit = cache.get("dQw4w9WgXcQ", "50-50mb", str(workspace))
+
+    assert hit is not None
+    assert hit.path == str(workspace / "Title.compressed.mp4")
+    assert (hit.title, hit.author) == ("Title", "Author")
+    assert os.path.getsize(hit.path) == MB
+    assert cache.get("dQw4w9WgXcQ", "2000-2000mb", str(workspace)) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_mb=3)
+    workspace = tmp_path / "job"
+    workspace.mkdir()
+    old = time.time() - 100
+    for index, video_id in enumerate(["aaaaaaaaaaa", "bbbbbbbbbbb"]):
+        cache.put(video_id, "p", _media(tmp_path, f"{index}.mp4", MB), None, None)
+        os.utime(os.path.join(cache.path, f"{video_id}.p"), (old + index, old + index))
+    # Reading "a" makes "b" the least recently used entry.
+    assert cache.get("aaaaaaaaaaa", "p", str(workspace)) is not None
+
+    cache.put("ccccccccccc", "p", _media(tmp_path, "2.mp4", int(1.5 * MB)), None, None)
+
+    assert sorted(os.listdir(cache.path)) == ["aaaaaaaaaaa.p", "ccccccccccc.p"]
+
+
+def test_concurrent_inserts_publish_one_complete_entry(tmp_path):
+    cache = MediaCache(str(tmp_path / "cache"), max_mb=100)
+    sources = [_media(tmp_path, f"{i}.mp4", MB) for i in range(8)]
+    results: list[bool] = []
+    threads = [
+        threading.Thread(target=lambda s=s: results.append(
+            cache.put("dQw4w9WgXcQ", "p", s, "Title", None)))
+        for s in sources
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert os.listdir(cache.path) == ["dQw4w9WgXcQ.p"]
+    assert sorted(os.listdir(os.path.join(cache.path, "dQw4w9WgXcQ.p"))) == [
+        "media.mp4", "meta.json"]
+
+
+@pytest.mark.asyncio
+async def test_repeat_request_is_served_from_cache(tmp_path, monkeypatch):
+    downloads = 0
+
+    def fake_download(url, download_folder, max_size_mb, admit, **kwargs):
+        nonlocal downloads
+        downloads += 1
+        path = os.path.join(download_folder, "Title.mp4")
+        with open(path, "wb") as handle:
+            handle.write(b"video")
+        return path, None, "Title", "Author"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+    url = "https://youtu.be/dQw4w9WgXcQ"
+
+    for _ in range(2):
+        msg = MagicMock(reply_document=AsyncMock())
+        await _download_and_send(msg, status_msg, url)
+        msg.reply_document.assert_awaited_once()
+        assert msg.reply_document.await_args.kwargs["caption"] == "🎬 Title\n👤 Author"
+
+    assert downloads == 1
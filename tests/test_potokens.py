@@ -0,0 +1,186 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+import pytest
+from yt_dlp.extractor.youtube.pot.provider import (
+    PoTokenContext,
+    PoTokenProviderRejectedRequest,
+    PoTokenRequest,
+)
+
+import src.pot_provider
+from src.pot_provider import PrefetchPTP
+from src.potokens import PoTokenPool
+
+
+class FakeProvider:
+    # bgutil's HTTP interface: GET /ping and POST /get_pot.
+    def __init__(self, lifetime: float = 3600):
+        self.lifetime = lifetime
+        self.healthy = True
+        self.requests: list[dict] = []
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/ping" and provider.healthy:
+                    self._reply({"version": "1.2.2", "server_uptime": 1})
+                else:
+                    self.send_error(503)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                provider.requests.append(body)
+                expires = datetime.fromtimestamp(time.time() + provider.lifetime, timezone.utc)
+                self._reply({
+                    "poToken": f"token-{len(provider.requests)}",
+                    "contentBinding": body["content_binding"],
+                    "expiresAt": expires.isoformat().replace("+00:00", "Z"),
+                })
+
+            def _reply(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_provider():
+    provider = FakeProvider()
+    yield provider
+    provider.close()
+
+
+def _pool(monkeypatch, provider, **kwargs):
+    pool = PoTokenPool(base_url=provider.base_url, size=2, **kwargs)
+    monkeypatch.setattr(src.pot_provider, "PO_TOKEN_POOL", pool)
+    return pool
+
+
+def _request(client="WEB", visitor_data="VISITOR", context=PoTokenContext.GVS):
+    return PoTokenRequest(
+        context=context,
+        innertube_context={"client": {"clientName": client, "clientVersion": "2.20250101"}},
+        visitor_data=visitor_data,
+        video_id="dQw4w9WgXcQ",
+    )
+
+
+def _provider():
+    return PrefetchPTP(MagicMock(), MagicMock(), {})
+
+
+def test_session_is_refilled_and_then_served(monkeypatch, fake_provider):
+    pool = _pool(monkeypatch, fake_provider)
+    provider = _provider()
+
+    # The first two uses of the session are minted inline by bgutil; after
+    # that it is worth keeping a token ready.
+    for _ in range(2):
+        with pytest.raises(PoTokenProviderRejectedRequest):
+            provider.request_pot(_request())
+    assert pool.refill()
+
+    response = provider.request_pot(_request())
+    assert response.po_token == "token-1"
+    assert response.expires_at > time.time() + 3000
+    assert fake_provider.requests[0]["content_binding"] == "VISITOR"
+    assert fake_provider.requests[0]["bypass_cache"] is True
+    assert pool.stats()["fresh_tokens"]["WEB"] == 1
+    assert pool.stats()["served"] == 1
+
+
+def test_tokens_near_expiry_are_replaced(monkeypatch, fake_provider):
+    fake_provider.lifetime = 60
+    pool = _pool(monkeypatch, fake_provider, margin=120)
+    for _ in range(2):
+        pool.take("WEB", "VISITOR", {"content_binding": "VISITOR"})
+    pool.refill()
+
+    assert pool.take("WEB", "VISITOR", {"content_binding": "VISITOR"}) is None
+    fake_provider.lifetime = 3600
+    pool.refill()
+    assert pool.take("WEB", "VISITOR", {"content_binding": "VISITOR"})[0] == "token-2"
+
+
+def test_video_bound_and_unknown_client_requests_are_rejected(monkeypatch, fake_provider):
+    pool = _pool(monkeypatch, fake_provider)
+    provider = _provider()
+
+    for request in (_request(context=PoTokenContext.PLAYER), _request(client="ANDROID")):
+        with pytest.raises(PoTokenProviderRejectedRequest):
+            provider.request_pot(request)
+    assert pool.stats()["sessions"] == 0
+
+
+def test_one_off_bindings_are_never_minted(monkeypatch, fake_provider):
+    # Without cookies every download brings a fresh visitor_data.
+    pool = _pool(monkeypatch, fake_provider)
+    provider = _provider()
+    for index in range(5):
+        with pytest.raises(PoTokenProviderRejectedRequest):
+            provider.request_pot(_request(visitor_data=f"VISITOR{index}"))
+
+    assert pool.refill()
+    assert fake_provider.requests == []
+    assert pool.stats()["minted"] == 0
+
+
+def test_least_recently_used_sessions_are_evicted(monkeypatch, fake_provider):
+    pool = _pool(monkeypatch, fake_provider)
+    for binding in ("A", "B", "C"):
+        for _ in range(2):
+            pool.take("WEB", binding, {"content_binding": binding})
+    for _ in range(2):
+        pool.take("MWEB", "A", {"content_binding": "A"})
+
+    pool.refill()
+    assert sorted(body["content_binding"] for body in fake_provider.requests) == ["A", "B", "C"]
+    assert pool.stats()["sessions"] == 3
+
+
+async def _until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_provider_backs_off(monkeypatch, fake_provider):
+    monkeypatch.setattr("src.potokens._MIN_BACKOFF_SECONDS", 0.01)
+    fake_provider.healthy = False
+    pool = _pool(monkeypatch, fake_provider, max_backoff=0.04)
+    task = asyncio.create_task(pool._run())
+    try:
+        pool._loop = asyncio.get_running_loop()
+        for _ in range(2):
+            pool.take("WEB", "VISITOR", {"content_binding": "VISITOR"})
+        await _until(lambda: pool.backoff == 0.04)
+        assert pool.provider_healthy is False
+        assert fake_provider.requests == []
+
+        fake_provider.healthy = True
+        await _until(lambda: pool.stats()["fresh_tokens"]["WEB"] == 1)
+        assert pool.backoff == 0.0
+    finally:
+        task.cancel()
@@ -0,0 +1,234 @@
+import asyncio
+import statistics
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+from src.jobs import JobLimiter, JobTicket, QuotaExceeded
+from src.main import _estimate_job_seconds, handle_download
+
+
+async def _run_order(limiter: JobLimiter, tickets: dict[str, JobTicket]) -> list[str]:
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def blocker():
+        async with limiter.slot(JobTicket(user_id=0)):
+            await release.wait()
+
+    async def job(name: str):
+        async with limiter.slot(tickets[name]):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    holder = asyncio.create_task(blocker())
+    await asyncio.sleep(0)
+    tasks = []
+    for name in tickets:
+        tasks.append(asyncio.create_task(job(name)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_shortest_waiting_job_runs_first():
+    order = await _run_order(JobLimiter(1), {
+        "long": JobTicket(user_id=1, cost=3600),
+        "medium": JobTicket(user_id=2, cost=300),
+        "short": JobTicket(user_id=3, cost=30),
+    })
+
+    assert order == ["short", "medium", "long"]
+
+
+@pytest.mark.asyncio
+async def test_user_with_running_job_yields_to_others():
+    limiter = JobLimiter(2)
+    releases = {name: asyncio.Event() for name in ("a", "b", "a-next", "c-next")}
+    order: list[str] = []
+
+    async def job(name: str, ticket: JobTicket):
+        async with limiter.slot(ticket):
+            order.append(name)
+            await releases[name].wait()
+
+    tasks = [
+        asyncio.create_task(job("a", JobTicket(user_id=1, cost=10))),
+        asyncio.create_task(job("b", JobTicket(user_id=2, cost=10))),
+    ]
+    await asyncio.sleep(0)
+    # User 1 already runs a job, so its cheaper one counts double.
+    tasks.append(asyncio.create_task(job("a-next", JobTicket(user_id=1, cost=60))))
+    tasks.append(asyncio.create_task(job("c-next", JobTicket(user_id=3, cost=100))))
+    await asyncio.sleep(0)
+    assert limiter.waiting == 2
+
+    releases["b"].set()
+    await asyncio.sleep(0.01)
+    assert order == ["a", "b", "c-next"]
+    for release in releases.values():
+        release.set()
+    await asyncio.gather(*tasks)
+    assert order == ["a", "b", "c-next", "a-next"]
+
+
+@pytest.mark.asyncio
+async def test_long_wait_ages_past_newer_short_jobs():
+    old = JobTicket(user_id=1, cost=3600, enqueued_at=time.monotonic() - 7200)
+    order = await _run_order(JobLimiter(1), {
+        "old-long": old,
+        "new-short": JobTicket(user_id=2, cost=30),
+    })
+
+    assert order == ["old-long", "new-short"]
+
+
+@pytest.mark.asyncio
+async def test_per_user_cap_lets_other_users_through():
+    limiter = JobLimiter(2, per_user_limit=1)
+    release = asyncio.Event()
+    started: list[str] = []
+
+    async def job(name: str, user_id: int):
+        async with limiter.slot(JobTicket(user_id=user_id)):
+            started.append(name)
+            await release.wait()
+
+    tasks = [asyncio.create_task(job(name, user))
+             for name, user in (("a1", 1), ("a2", 1), ("b1", 2))]
+    await asyncio.sleep(0)
+
+    assert started == ["a1", "b1"]
+    assert limiter.waiting == 1
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == ["a1", "b1", "a2"]
+
+
+@pytest.mark.asyncio
+async def test_estimate_runs_only_when_job_has_to_wait():
+    limiter = JobLimiter(1)
+    estimated: list[int] = []
+
+    async def estimate(ticket: JobTicket) -> None:
+        estimated.append(ticket.user_id)
+        ticket.cost = 5
+
+    release = asyncio.Event()
+
+    async def job(user_id: int):
+        async with limiter.slot(JobTicket(user_id=user_id), estimate=estimate):
+            await release.wait()
+
+    tasks = [asyncio.create_task(job(1)), asyncio.create_task(job(2))]
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert estimated == [2]
+
+
+@pytest.mark.asyncio
+async def test_sjf_lowers_median_completion_time():
+    costs = [0.08] * 3 + [0.005] * 9
+
+    async def median_completion(use_costs: bool) -> float:
+        limiter = JobLimiter(1, aging=0)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        finished: list[float] = []
+
+        async def job(user_id: int, cost: float):
+            ticket = JobTicket(user_id=user_id, cost=cost if use_costs else 1)
+            async with limiter.slot(ticket):
+                await asyncio.sleep(cost)
+            finished.append(loop.time() - started)
+
+        # One user submits the long videos first.
+        await asyncio.gather(*(job(1 if cost > 0.01 else 10 + index, cost)
+                               for index, cost in enumerate(costs)))
+        return statistics.median(finished)
+
+    fifo = await median_completion(use_costs=False)
+    sjf = await median_completion(use_costs=True)
+    assert sjf < fifo / 2
+
+
+@pytest.mark.asyncio
+async def test_pending_quota_is_per_user():
+    limiter = JobLimiter(1, max_pending_per_user=2)
+    release = asyncio.Event()
+
+    async def job(user_id: int):
+        async with limiter.slot(JobTicket(user_id=user_id)):
+            await release.wait()
+
+    tasks = [asyncio.create_task(job(1)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(QuotaExceeded):
+        async with limiter.slot(JobTicket(user_id=1)):
+            pass
+    limiter.check_quota(JobTicket(user_id=2))
+    release.set()
+    await asyncio.gather(*tasks)
+    assert limiter.pending_for_user(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_finished_users_and_chats_are_forgotten():
+    limiter = JobLimiter(2)
+
+    async def job(user_id: int):
+        async with limiter.slot(JobTicket(user_id=user_id, chat_id=-user_id)):
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(job(user_id) for user_id in range(1, 50)))
+
+    assert not limiter._active_users
+    assert not limiter._active_chats
+    assert not limiter._pending_users
+
+
+@pytest.mark.asyncio
+async def test_over_quota_user_is_answered_immediately(monkeypatch):
+    limiter = JobLimiter(1, max_pending_per_user=1)
+    monkeypatch.setattr("src.main.JOB_LIMITER", limiter)
+    download = MagicMock()
+    monkeypatch.setattr("src.main.download_video", download)
+    update = AsyncMock(spec=Update)
+    message = AsyncMock(spec=Message)
+    message.text = "https://youtu.be/abc123"
+    update.effective_message = message
+    update.effective_chat = MagicMock(spec=Chat, id=77, type="private")
+    update.effective_user = MagicMock(spec=User, id=9, username="someone")
+    release = asyncio.Event()
+
+    async def running_job():
+        async with limiter.slot(JobTicket(user_id=9)):
+            await release.wait()
+
+    task = asyncio.create_task(running_job())
+    await asyncio.sleep(0)
+
+    await asyncio.wait_for(handle_download(update, AsyncMock()), timeout=1)
+
+    message.reply_text.assert_awaited_once()
+    assert "already have 1 download" in message.reply_text.await_args.args[0]
+    download.assert_not_called()
+    release.set()
+    await task
+
+
+def test_estimate_uses_size_and_duration():
+    small = {"duration": 30, "filesize": 5 * 1024 * 1024}
+    large = {"duration": 3600, "filesize": 4 * 1024 * 1024 * 1024}
+
+    assert _estimate_job_seconds(small) < _estimate_job_seconds(large)
+    assert _estimate_job_seconds({"duration": 600}) == 600
+    assert _estimate_job_seconds({}) is None
+    assert _estimate_job_seconds(None) is None
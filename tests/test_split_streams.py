@@ -0,0 +1,79 @@
+import os
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from yt_dlp.utils import DownloadCancelled, DownloadError
+
+from src.downloader import _download_streams, download_video
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+INFO = {
+    "title": "T",
+    "ext": "mp4",
+    "requested_formats": [
+        {"format_id": "137", "ext": "mp4", "protocol": "https",
+         "vcodec": "avc1", "acodec": "none"},
+        {"format_id": "140", "ext": "m4a", "protocol": "https",
+         "vcodec": "none", "acodec": "mp4a"},
+    ],
+}
+
+
+def _fake_ydl(tmp_path, stream_download, created=None):
+    def make(opts):
+        ydl = MagicMock()
+        ydl.__enter__.return_value = ydl
+        if created is not None:
+            created.append(ydl)
+        if opts["format"] in ("137", "140"):
+            path = tmp_path / f"T.f{opts['format']}"
+            ydl.process_ie_result.side_effect = (
+                lambda info, download: stream_download(opts, path, info))
+            ydl.prepare_filename.return_value = str(path)
+        else:
+            ydl.extract_info.return_value = dict(INFO)
+            ydl.prepare_filename.return_value = str(tmp_path / "T.mp4")
+        return ydl
+
+    return make
+
+
+def test_split_streams_download_at_once_then_merge(tmp_path):
+    both_running = threading.Barrier(2, timeout=5)
+
+    def stream_download(opts, path, info):
+        assert "requested_formats" not in info
+        assert "match_filter" not in opts
+        both_running.wait()
+        path.write_bytes(b"stream")
+        return info
+
+    created = []
+    merger = MagicMock(available=True)
+    merger.run.side_effect = lambda info: open(info["filepath"], "wb").close()
+    with patch("yt_dlp.YoutubeDL", side_effect=_fake_ydl(tmp_path, stream_download, created)), \
+            patch("yt_dlp.postprocessor.FFmpegMergerPP", return_value=merger):
+        file_path, error, title, _ = download_video(
+            URL, download_folder=str(tmp_path), parallel_streams=True)
+
+    assert error is None
+    assert file_path == str(tmp_path / "T.mp4")
+    # yt-dlp only selected the formats; the streams were fetched separately.
+    created[0].extract_info.assert_called_once_with(URL, download=False)
+    merged = merger.run.call_args.args[0]
+    assert merged["__files_to_merge"] == [str(tmp_path / "T.f137"), str(tmp_path / "T.f140")]
+    assert [fmt["filepath"] for fmt in merged["requested_formats"]] == merged["__files_to_merge"]
+    assert not os.path.exists(tmp_path / "T.f137")
+
+
+def test_stream_failure_reports_the_failing_stream(tmp_path):
+    def stream_download(opts, path, info):
+        if opts["format"] == "137":
+            raise DownloadError("ERROR: HTTP Error 429: Too Many Requests")
+        raise DownloadCancelled("Another stream of this download failed")
+
+    with patch("yt_dlp.YoutubeDL", side_effect=_fake_ydl(tmp_path, stream_download)):
+        with pytest.raises(DownloadError, match="429"):
+            _download_streams({"outtmpl": f"{tmp_path}/%(title)s.%(ext)s",
+                               "progress_hooks": []}, INFO)
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+STARTUP_BUDGET_SECONDS = 3.0
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure_import(module: str) -> tuple[float, list[str]]:
+    code = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - started\n"
+        "heavy = [name for name in ('yt_dlp', 'flask') if name in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "FAST_START": "1"},
+    )
+    elapsed, _, heavy = result.stdout.strip().partition(" ")
+    return float(elapsed), [name for name in heavy.split(",") if name]
+
+
+def test_webhook_import_defers_heavy_modules():
+    elapsed, heavy = _measure_import("src.webhook")
+
+    assert heavy == []
+    assert elapsed < STARTUP_BUDGET_SECONDS
@@ -0,0 +1,139 @@
+import os
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Chat, InlineQueryResultCachedVideo, Message, Video
+
+import src.main
+from src.downloader import media_details
+from src.jobqueue import MEDIA_VIDEO, UploadedMedia
+from src.main import _download_and_send, _remux_faststart, handle_inline_query
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+INFO = {
+    "duration": 212.4,
+    "width": 1920,
+    "height": 1080,
+    "thumbnails": [
+        {"url": "https://i.ytimg.com/vi/x/default.jpg", "width": 120, "height": 90},
+        {"url": "https://i.ytimg.com/vi/x/mqdefault.jpg", "width": 320, "height": 180},
+        {"url": "https://i.ytimg.com/vi_webp/x/mqdefault.webp", "width": 320, "height": 180},
+        {"url": "https://i.ytimg.com/vi/x/hqdefault.jpg?sqp=1", "width": 480, "height": 360},
+        {"url": "https://i.ytimg.com/vi/x/maxresdefault.jpg"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def stream_delivery(monkeypatch):
+    monkeypatch.setattr("src.main.VIDEO_DELIVERY", "stream")
+    monkeypatch.setattr(src.main, "_uploaded_media", type(src.main._uploaded_media)())
+
+
+def _fake_download(monkeypatch, tmp_path):
+    def fake_download(url, download_folder, **kwargs):
+        kwargs["media_info"].update(media_details(INFO))
+        path = os.path.join(download_folder, "Title.mp4")
+        with open(path, "wb") as handle:
+            handle.write(b"video")
+        return path, None, "Title", "Author"
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+
+
+def test_media_details_picks_a_thumbnail_telegram_accepts():
+    assert media_details(INFO) == {
+        "duration": 212.4,
+        "width": 1920,
+        "height": 1080,
+        "thumbnail": "https://i.ytimg.com/vi/x/mqdefault.jpg",
+    }
+    assert media_details({"thumbnails": INFO["thumbnails"][2:]}) == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_delivery_sends_remuxed_video_with_metadata(
+        isolated_job_queue, tmp_path, monkeypatch):
+    _fake_download(monkeypatch, tmp_path)
+    remuxed = []
+
+    async def fake_remux(file_path):
+        remuxed.append(file_path)
+        path = file_path.replace(".mp4", ".faststart.mp4")
+        with open(path, "wb") as handle:
+            handle.write(b"faststart")
+        return path
+
+    monkeypatch.setattr("src.main._remux_faststart", fake_remux)
+    monkeypatch.setattr("src.main._download_thumbnail", lambda url: b"jpeg")
+    sent = Message(
+        message_id=5,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=1, type="private"),
+        video=Video(file_id="VID", file_unique_id="u1", width=1920, height=1080,
+                    duration=212),
+    )
+    msg = MagicMock(reply_video=AsyncMock(return_value=sent), reply_document=AsyncMock())
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL)
+
+    msg.reply_document.assert_not_awaited()
+    kwargs = msg.reply_video.await_args.kwargs
+    assert kwargs["supports_streaming"] is True
+    assert (kwargs["width"], kwargs["height"], kwargs["duration"]) == (1920, 1080, 212)
+    assert kwargs["thumbnail"] == b"jpeg"
+    assert kwargs["video"].filename == "Title.faststart.mp4"
+    assert not os.path.exists(remuxed[0])
+    assert isolated_job_queue.uploaded_media("dQw4w9WgXcQ").kind == MEDIA_VIDEO
+
+
+@pytest.mark.asyncio
+async def test_failed_remux_falls_back_to_a_document(tmp_path, monkeypatch):
+    _fake_download(monkeypatch, tmp_path)
+    monkeypatch.setattr("src.main._remux_faststart", AsyncMock(return_value=None))
+    msg = MagicMock(reply_video=AsyncMock(), reply_document=AsyncMock())
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    await _download_and_send(msg, status_msg, URL)
+
+    msg.reply_video.assert_not_awaited()
+    msg.reply_document.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_remux_copies_streams_with_faststart(tmp_path, monkeypatch):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"video")
+    calls = []
+
+    async def fake_exec(*args, **kwargs):
+        calls.append(args)
+        with open(args[-1], "wb") as handle:
+            handle.write(b"remuxed")
+        process = MagicMock(returncode=0)
+        process.wait = AsyncMock(return_value=0)
+        return process
+
+    monkeypatch.setattr("src.main.asyncio.create_subprocess_exec", fake_exec)
+
+    remuxed = await _remux_faststart(str(source))
+
+    assert remuxed == str(tmp_path / "clip.faststart.mp4")
+    args = calls[0]
+    assert args[args.index("-c") + 1] == "copy"
+    assert args[args.index("-movflags") + 1] == "+faststart"
+
+
+@pytest.mark.asyncio
+async def test_inline_query_answers_streamed_uploads_as_videos(isolated_job_queue):
+    isolated_job_queue.record_upload(
+        UploadedMedia("dQw4w9WgXcQ", "VID", "Title", "Author", MEDIA_VIDEO))
+    query = MagicMock(query=URL, answer=AsyncMock())
+
+    await handle_inline_query(MagicMock(inline_query=query), MagicMock())
+
+    result = query.answer.await_args.args[0][0]
+    assert isinstance(result, InlineQueryResultCachedVideo)
+    assert result.video_file_id == "VID"
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from telegram import InputFile
+from telegram.request import RequestData
+from telegram.request._requestparameter import RequestParameter
+
+from src.telegram_requests import RoutingRequest, _build_httpx_request
+
+UPLOAD_DELAY_SECONDS = 0.5
+
+
+class _FakeBotApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        self.rfile.read(length)
+        if self.path.endswith("/sendDocument"):
+            time.sleep(UPLOAD_DELAY_SECONDS)
+        body = json.dumps({"ok": True, "result": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def fake_bot_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeBotApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/botTEST"
+    server.shutdown()
+    server.server_close()
+
+
+def _request(pool_size: int):
+    return _build_httpx_request(
+        pool_size=pool_size,
+        http_version="1.1",
+        keepalive_expiry=30,
+        read_timeout=10,
+        write_timeout=10,
+        connect_timeout=10,
+        pool_timeout=10,
+    )
+
+
+async def _small_call_latencies(request, base_url: str) -> list[float]:
+    upload_data = RequestData([
+        RequestParameter.from_input(
+            "document", InputFile(b"x" * 64 * 1024, filename="video.mp4"))
+    ])
+    assert upload_data.contains_files
+
+    uploads = [
+        asyncio.create_task(
+            request.do_request(f"{base_url}/sendDocument", "POST", upload_data)
+        )
+        for _ in range(4)
+    ]
+    await asyncio.sleep(0.05)
+
+    latencies = []
+    for _ in range(5):
+        started = time.perf_counter()
+        await request.do_request(f"{base_url}/sendChatAction", "POST", RequestData())
+        latencies.append(time.perf_counter() - started)
+    await asyncio.gather(*uploads)
+    return latencies
+
+
+@pytest.mark.asyncio
+async def test_small_calls_stay_fast_during_parallel_uploads(fake_bot_api):
+    shared = _request(pool_size=2)
+    await shared.initialize()
+    try:
+        shared_latencies = await _small_call_latencies(shared, fake_bot_api)
+    finally:
+        await shared.shutdown()
+
+    routed = RoutingRequest(api_request=_request(pool_size=2),
+                            media_request=_request(pool_size=2))
+    await routed.initialize()
+    try:
+        routed_latencies = await _small_call_latencies(routed, fake_bot_api)
+    finally:
+        await routed.shutdown()
+
+    assert max(shared_latencies) >= UPLOAD_DELAY_SECONDS * 0.8
+    assert max(routed_latencies) < UPLOAD_DELAY_SECONDS / 2
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from telegram import InputFile
+from telegram.request import RequestData
+from telegram.request._requestparameter import RequestParameter
+
+from src.telegram_requests import _build_httpx_request
+from src.upload import MmapUploadReader
+
+CHUNK = 64 * 1024
+
+
+class _SinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received: list[bytes] = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        _SinkHandler.received.append(self.rfile.read(length))
+        body = json.dumps({"ok": True, "result": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_reads_fixed_size_views_and_tracks_sent_bytes(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)) * 1000)
+
+    with open(path, "rb") as handle, MmapUploadReader(handle, chunk_size=CHUNK) as body:
+        first = body.read(10)
+        assert isinstance(first, memoryview)
+        assert len(first) == CHUNK
+        # Nothing counts as sent until the caller comes back for more.
+        assert body.bytes_sent == 0
+        body.read()
+        assert body.bytes_sent == CHUNK
+        body.seek(0)
+        data = b"".join(bytes(chunk) for chunk in iter(body.read, memoryview(b"")))
+        assert data == path.read_bytes()
+        assert body.bytes_sent == body.total_bytes == 256000
+        del first
+
+
+def test_open_owns_the_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"x" * 300000)
+
+    body = MmapUploadReader.open(str(path), chunk_size=CHUNK)
+    data = b"".join(bytes(chunk) for chunk in iter(body.read, memoryview(b"")))
+    stream = body._stream
+    body.close()
+
+    assert data == path.read_bytes()
+    assert stream.closed
+
+
+@pytest.mark.asyncio
+async def test_streams_file_through_telegram_request(tmp_path):
+    path = tmp_path / "video.mp4"
+    payload = bytes(range(256)) * 20000
+    path.write_bytes(payload)
+    _SinkHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SinkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    request = _build_httpx_request(
+        pool_size=1, http_version="1.1", keepalive_expiry=30, read_timeout=10,
+        write_timeout=10, connect_timeout=10, pool_timeout=10,
+    )
+    await request.initialize()
+    try:
+        with open(path, "rb") as handle, MmapUploadReader(handle, chunk_size=CHUNK) as body:
+            progress: list[int] = []
+
+            async def sample():
+                while True:
+                    progress.append(body.bytes_sent)
+                    await asyncio.sleep(0)
+
+            sampler = asyncio.create_task(sample())
+            data = RequestData([RequestParameter.from_input(
+                "document",
+                InputFile(body, filename="video.mp4", read_file_handle=False),
+            )])
+            await request.do_request(
+                f"http://127.0.0.1:{server.server_address[1]}/botTEST/sendDocument",
+                "POST", data)
+            sampler.cancel()
+    finally:
+        await request.shutdown()
+        server.shutdown()
+        server.server_close()
+
+    assert payload in _SinkHandler.received[0]
+    assert body.bytes_sent == len(payload)
+    assert progress == sorted(progress)
@@ -0,0 +1,98 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from src.health import health_check
+from src.http_server import HttpServer
+from src.webhook import UpdateIngress
+
+
+def _update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "text": "https://youtu.be/abc123",
+        },
+    }
+
+
+@pytest.fixture
+def application():
+    application = MagicMock()
+    application.bot = None
+    application.process_update = AsyncMock()
+    return application
+
+
+async def _serve(ingress: UpdateIngress) -> HttpServer:
+    server = HttpServer("127.0.0.1", 0)
+    server.add_route("/", health_check)
+    server.add_route("/hook", ingress.handle_webhook, methods=("POST",))
+    await server.start()
+    return server
+
+
+@pytest.mark.asyncio
+async def test_webhook_processes_update_and_drops_duplicates(application):
+    ingress = UpdateIngress(application, secret_token="s3cret", workers=2)
+    server = await _serve(ingress)
+    ingress.start()
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.bound_port}") as client:
+            headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+            first = await client.post("/hook", json=_update(7), headers=headers)
+            second = await client.post("/hook", json=_update(7), headers=headers)
+            health = await client.get("/")
+        await ingress.queue.join()
+    finally:
+        await ingress.stop()
+        await server.stop()
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert "Everything is operational" in health.text
+    assert ingress.duplicates_dropped == 1
+    application.process_update.assert_awaited_once()
+    assert application.process_update.call_args.args[0].update_id == 7
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret_token(application):
+    ingress = UpdateIngress(application, secret_token="s3cret")
+    server = await _serve(ingress)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.bound_port}") as client:
+            response = await client.post(
+                "/hook",
+                json=_update(1),
+                headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+            )
+    finally:
+        await server.stop()
+
+    assert response.status_code == 403
+    assert ingress.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_webhook_applies_backpressure_when_queue_is_full(application):
+    ingress = UpdateIngress(application, secret_token=None, queue_size=1)
+    server = await _serve(ingress)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.bound_port}") as client:
+            accepted = await client.post("/hook", json=_update(1))
+            rejected = await client.post("/hook", json=_update(2))
+            ingress.queue.get_nowait()
+            retried = await client.post("/hook", json=_update(2))
+    finally:
+        await server.stop()
+
+    assert accepted.status_code == 200
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
+    assert retried.status_code == 200
+    assert ingress.queue.qsize() == 1
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.downloader import download_video
+from src.jobqueue import DownloadJob
+from src.main import _download_and_send
+from src.workspace import (
+    DiskBudget,
+    expected_download_bytes,
+    job_workspace,
+    remove_workspace,
+    sweep_stale_files,
+)
+
+MB = 1024 * 1024
+
+
+def _budget(tmp_path, free_mb: int) -> DiskBudget:
+    budget = DiskBudget(str(tmp_path), reserve_mb=0, timeout=5)
+    budget._free_bytes = lambda: free_mb * MB
+    return budget
+
+
+def test_expected_bytes_account_for_merge():
+    merged = {"requested_formats": [{"filesize": 30 * MB},
+                                    {"filesize_approx": 5 * MB}]}
+    assert expected_download_bytes(merged, fallback_bytes=1) == 70 * MB
+    assert expected_download_bytes({"filesize": 10 * MB}, 1) == 10 * MB
+    assert expected_download_bytes({"requested_formats": [{}]}, 7) == 7
+
+
+def test_jobs_wait_for_disk_instead_of_failing(tmp_path):
+    budget = _budget(tmp_path, free_mb=100)
+    first = str(tmp_path / "first")
+    second = str(tmp_path / "second")
+    os.makedirs(first)
+    os.makedirs(second)
+
+    assert budget.admit(first, 80 * MB) is None
+    result: list = []
+    waiter = threading.Thread(
+        target=lambda: result.append(budget.admit(second, 50 * MB)))
+    waiter.start()
+    time.sleep(0.2)
+    assert result == [] and budget.waiting == 1
+
+    budget.release(first)
+    waiter.join(timeout=5)
+    assert result == [None]
+    assert budget.reserved_bytes == 50 * MB
+
+
+def test_download_on_disk_is_not_counted_twice(tmp_path):
+    budget = _budget(tmp_path, free_mb=100)
+    first = tmp_path / "first"
+    first.mkdir()
+    assert budget.admit(str(first), 60 * MB) is None
+    # The first job has written 40MB, so real free space shrank by as much.
+    (first / "video.mp4.part").write_bytes(b"x" * 40 * MB)
+    budget._free_bytes = lambda: 60 * MB
+
+    assert budget.available_bytes() == 40 * MB
+
+
+def test_video_larger_than_disk_is_rejected(tmp_path):
+    budget = _budget(tmp_path, free_mb=100)
+
+    error = budget.admit(str(tmp_path / "job"), 500 * MB)
+
+    assert error is not None and "disk space" in error
+
+
+def test_download_video_reports_rejected_admission(tmp_path):
+    info = {"title": "Big", "requested_formats": [{"filesize": MB}, {"filesize": MB}]}
+
+    with patch("yt_dlp.YoutubeDL") as MockYDL:
+        instance = MockYDL.return_value.__enter__.return_value
+
+        def extract_info(url, download):
+            opts = MockYDL.call_args.args[0]
+            opts["match_filter"](info, incomplete=False)
+            return info
+
+        instance.extract_info.side_effect = extract_info
+        admit = MagicMock(return_value="Not enough disk space")
+        file_path, error, title, _ = download_video(
+            "https://youtu.be/abc", download_folder=str(tmp_path), admit=admit)
+
+    assert file_path is None
+    assert error == "Not enough disk space"
+    assert title == "Big"
+    admit.assert_called_once_with(info)
+
+
+def test_sweeper_removes_only_stale_leftovers(tmp_path):
+    root = tmp_path / "jobs"
+    old = time.time() - 7200
+    orphan = root / "crashed"
+    orphan.mkdir(parents=True)
+    (orphan / "video.mp4.part").write_bytes(b"x")
+    os.utime(orphan / "video.mp4.part", (old, old))
+    fresh = root / "running"
+    fresh.mkdir()
+    (fresh / "video.mp4.part").write_bytes(b"x")
+    active = job_workspace("active", root=str(root))
+    stale_active = os.path.join(active, "video.f137.mp4.part")
+    open(stale_active, "wb").close()
+    os.utime(stale_active, (old, old))
+    legacy = tmp_path / "Old_Title.compressed.mp4"
+    legacy.write_bytes(b"x")
+    os.utime(legacy, (old, old))
+    keep = tmp_path / "jobs.sqlite3"
+    keep.write_bytes(b"x")
+    os.utime(keep, (old, old))
+
+    removed = sweep_stale_files(str(tmp_path), str(root), max_age=3600)
+
+    assert removed == 2
+    assert not orphan.exists() and not legacy.exists()
+    assert fresh.exists() and keep.exists() and os.path.exists(stale_active)
+    remove_workspace(active)
+
+
+def test_sweeper_keeps_workspaces_of_jobs_in_the_journal(tmp_path, isolated_job_queue):
+    # Another worker on the shared volume: a slow upload, and a handed-off
+    # job whose resumable file waits in the queue.
+    root = tmp_path / "jobs"
+    old = time.time() - 7200
+    queued = isolated_job_queue.enqueue(DownloadJob(
+        chat_id=1, chat_type="private", message_id=2, status_message_id=3,
+        url="https://youtu.be/abc123"))
+    running = isolated_job_queue.start(DownloadJob(
+        chat_id=1, chat_type="private", message_id=4, status_message_id=5,
+        url="https://youtu.be/def456"), "other:host:1-0a1b2c3d")
+    for job in (queued, running, DownloadJob(1, "private", 6, 7, "x")):
+        workspace = root / job.job_id
+        workspace.mkdir(parents=True)
+        (workspace / "video.compressed.mp4").write_bytes(b"x")
+        os.utime(workspace / "video.compressed.mp4", (old, old))
+
+    removed = sweep_stale_files(str(tmp_path), str(root), max_age=3600,
+                                live_jobs=isolated_job_queue.unfinished_job_ids())
+
+    assert removed == 1
+    assert sorted(os.listdir(root)) == sorted([queued.job_id, running.job_id])
+    assert all(os.listdir(root / job_id) for job_id in os.listdir(root))
+
+
+@pytest.mark.asyncio
+async def test_same_title_jobs_use_separate_workspaces(monkeypatch, isolated_workspaces):
+    folders: list[str] = []
+    uploaded: list[bytes] = []
+
+    def fake_download(url, download_folder, max_size_mb, admit, **kwargs):
+        folders.append(download_folder)
+        path = os.path.join(download_folder, "Same_Title.mp4")
+        with open(path, "wb") as handle:
+            handle.write(url.encode())
+        time.sleep(0.05)
+        return path, None, "Same Title", None
+
+    async def reply_document(document, **kwargs):
+        uploaded.append(bytes(document.input_file_content.read()))
+
+    monkeypatch.setattr("src.main.download_video", fake_download)
+
+    def message():
+        msg = MagicMock()
+        msg.reply_document = AsyncMock(side_effect=reply_document)
+        return msg
+
+    status_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+    await asyncio.gather(
+        _download_and_send(message(), status_msg, "https://youtu.be/a"),
+        _download_and_send(message(), status_msg, "https://youtu.be/b"),
+    )
+
+    assert len(set(folders)) == 2
+    assert sorted(uploaded) == [b"https://youtu.be/a", b"https://youtu.be/b"]
+    assert os.listdir(isolated_workspaces) == []
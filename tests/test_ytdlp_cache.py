@@ -0,0 +1,57 @@
+from unittest.mock import patch
+
+import pytest
+
+import src.downloader
+from src.downloader import _build_ydl_opts, _CacheStats, _open_ydl, warm_up_cache
+
+
+@pytest.fixture
+def cache_stats(monkeypatch):
+    stats = _CacheStats()
+    monkeypatch.setattr(src.downloader, "YTDLP_CACHE_STATS", stats)
+    return stats
+
+
+def test_ydl_options_use_the_shared_cache_dir(monkeypatch):
+    monkeypatch.setattr(src.downloader, "YTDLP_CACHE_DIR", "/volume/yt-dlp-cache")
+    assert _build_ydl_opts(max_size_mb=50, cookiefile=None)["cachedir"] == "/volume/yt-dlp-cache"
+
+    monkeypatch.setattr(src.downloader, "YTDLP_CACHE_DIR", "")
+    assert _build_ydl_opts(max_size_mb=50, cookiefile=None)["cachedir"] is False
+
+
+def test_cache_lookups_are_counted_across_instances(tmp_path, cache_stats):
+    opts = {"quiet": True, "cachedir": str(tmp_path)}
+    with _open_ydl(opts) as first:
+        assert first.cache.load("youtube-sigfuncs", "player1") is None
+        first.cache.store("youtube-sigfuncs", "player1", {"spec": [1, 2]})
+    # A later YoutubeDL (another job or worker) finds the entry on disk.
+    with _open_ydl(opts) as second:
+        assert second.cache.load("youtube-sigfuncs", "player1") == {"spec": [1, 2]}
+        assert second.cache.load("challenge-solver", "lib", default={}) == {}
+
+    stats = cache_stats.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.333
+    assert stats["sections"]["youtube-sigfuncs"] == {"hits": 1, "misses": 1, "writes": 1}
+
+
+def test_disabled_cache_is_not_counted(cache_stats):
+    with _open_ydl({"quiet": True, "cachedir": False}) as ydl:
+        assert ydl.cache.load("youtube-sigfuncs", "player1") is None
+
+    assert cache_stats.stats()["hit_rate"] is None
+
+
+def test_warm_up_probes_the_configured_video(monkeypatch):
+    monkeypatch.setattr(src.downloader, "YTDLP_CACHE_WARMUP_URL", "https://youtu.be/jNQXAC9IVRw")
+    with patch("src.downloader.probe_video", return_value={"id": "jNQXAC9IVRw"}) as probe:
+        warm_up_cache()
+    probe.assert_called_once_with("https://youtu.be/jNQXAC9IVRw")
+
+    monkeypatch.setattr(src.downloader, "YTDLP_CACHE_WARMUP_URL", "")
+    with patch("src.downloader.probe_video") as probe:
+        warm_up_cache()
+    probe.assert_not_called()